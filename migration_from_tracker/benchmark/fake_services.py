@@ -0,0 +1,515 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+# Начало отсчета дат создания синтетических задач (задача i создана через i минут)
+BASE_DATE = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+# Синтетический набор данных. Задачи не хранятся в памяти, а строятся по номеру,
+# поэтому объем может достигать миллионов задач.
+class Dataset:
+    def __init__(self, issues=10000, projects=4, users=50, comments=2, attachment_every=0,
+                 attachment_size=64 * 1024, link_every=10, seed=1):
+        self.issues = issues
+        self.projects = max(1, projects)
+        self.users = max(1, users)
+        self.comments = comments
+        self.attachment_every = attachment_every
+        self.attachment_size = attachment_size
+        self.link_every = link_every
+        self.seed = seed
+        self.per_project = -(-issues // self.projects)
+
+    def project_key(self, project):
+        return f"P{project}"
+
+    def project_range(self, project):
+        start = project * self.per_project
+        return range(start, min(start + self.per_project, self.issues))
+
+    def user(self, index):
+        return f"user{index % self.users}"
+
+    def uid(self, index):
+        return str(1000 + index % self.users)
+
+    def created(self, index):
+        return BASE_DATE + timedelta(minutes=index)
+
+    def has_attachment(self, index):
+        return bool(self.attachment_every) and index % self.attachment_every == 0
+
+    def attachment_bytes(self, index):
+        return bytes([index % 251]) * self.attachment_size
+
+
+# Общая модель поведения сервиса: задержка ответа, ограничение частоты (429 с Retry-After)
+# и доля случайных ошибок 503. Считает обращения по методам API.
+class ServiceBehaviour:
+    def __init__(self, latency=0.0, rate_limit=0.0, error_rate=0.0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.tokens = rate_limit
+        self.updated = time.monotonic()
+        self.calls = Counter()
+        self.faults = Counter()
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.faults.clear()
+
+    def record(self, route):
+        with self.lock:
+            self.calls[route] += 1
+
+    # Возвращает код ошибки, которую нужно отдать вместо ответа, или None
+    def admit(self):
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+        if self.rate_limit:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate_limit, self.tokens + (now - self.updated) * self.rate_limit)
+                self.updated = now
+                if self.tokens < 1:
+                    self.faults["throttled"] += 1
+                    return 429
+                self.tokens -= 1
+        if self.error_rate and random.random() < self.error_rate:
+            with self.lock:
+                self.faults["errors"] += 1
+            return 503
+        return None
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    routes = ()
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def behaviour(self):
+        return self.server.behaviour
+
+    @property
+    def dataset(self):
+        return self.server.dataset
+
+    @property
+    def base_url(self):
+        return f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PATCH(self):
+        self.dispatch("PATCH")
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+        for route_method, pattern, name in self.routes:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                self.behaviour.record(name)
+                error = self.behaviour.admit()
+                if error:
+                    headers = {"Retry-After": "1"}
+                    return self.send_json({"errors": {}, "errorMessages": ["fake error"]}, error, headers)
+                return getattr(self, name)(*match.groups())
+        self.behaviour.record(f"unknown {method} {url.path}")
+        self.send_json({"errors": {}, "errorMessages": [f"unknown route {method} {url.path}"]}, 404)
+
+    def json_body(self):
+        return json.loads(self.body) if self.body else {}
+
+    def send_json(self, value, status=200, headers=None):
+        data = json.dumps(value).encode()
+        self.send_bytes(data, status, "application/json", headers)
+
+    def send_bytes(self, data, status=200, content_type="application/octet-stream", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+# Jira REST API v2: serverInfo, проекты, поиск по JQL и содержимое вложений
+class FakeJiraHandler(FakeHandler):
+    routes = (
+        ("GET", r"/rest/api/2/serverInfo", "server_info"),
+        ("GET", r"/rest/api/2/field", "fields"),
+        ("GET", r"/rest/api/2/myself", "myself"),
+        ("GET", r"/rest/api/2/project", "projects"),
+        ("GET", r"/rest/api/2/search", "search"),
+        ("GET", r"/attachment/(\d+)", "attachment_content"),
+    )
+    max_results = 1000
+
+    def server_info(self):
+        self.send_json({"baseUrl": self.base_url, "version": "9.4.0", "versionNumbers": [9, 4, 0],
+                        "deploymentType": "Server", "buildNumber": 940000, "serverTitle": "Fake Jira"})
+
+    def fields(self):
+        self.send_json([])
+
+    def myself(self):
+        self.send_json({"name": "benchmark", "key": "benchmark", "timeZone": "UTC"})
+
+    def projects(self):
+        self.send_json([{"id": str(project), "key": self.dataset.project_key(project), "name": f"Project {project}",
+                         "self": f"{self.base_url}/rest/api/2/project/{project}"}
+                        for project in range(self.dataset.projects)])
+
+    # Поддерживаются условия project = "KEY", created >= / < и updated >= "YYYY/MM/DD HH:MM"
+    # и ORDER BY created (дата обновления синтетической задачи совпадает с датой создания)
+    def search(self):
+        jql = self.query.get("jql", "")
+        start_at = int(self.query.get("startAt", 0))
+        max_results = min(int(self.query.get("maxResults", 50)), self.max_results)
+        project = re.search(r'project = "P(\d+)"', jql)
+        indexes = self.dataset.project_range(int(project.group(1))) if project else range(self.dataset.issues)
+        for operator, value in re.findall(r'(?:created|updated) (>=|<) "([^"]+)"', jql):
+            bound = datetime.strptime(value, "%Y/%m/%d %H:%M").replace(tzinfo=timezone.utc)
+            minutes = max(0, min(len(indexes), int((bound - self.dataset.created(indexes.start)).total_seconds() // 60)))
+            indexes = indexes[minutes:] if operator == ">=" else indexes[:minutes]
+        if "DESC" in jql:
+            indexes = indexes[::-1]
+        page = indexes[start_at:start_at + max_results]
+        self.send_json({"startAt": start_at, "maxResults": max_results, "total": len(indexes),
+                        "issues": [self.issue(index) for index in page]})
+
+    def issue(self, index):
+        dataset = self.dataset
+        project = index // dataset.per_project
+        key = f"{dataset.project_key(project)}-{index - project * dataset.per_project + 1}"
+        created = dataset.created(index).strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+        attachments = []
+        if dataset.has_attachment(index):
+            attachments.append({"id": str(index), "filename": f"file-{index}.bin", "size": dataset.attachment_size,
+                                "content": f"{self.base_url}/attachment/{index}",
+                                "self": f"{self.base_url}/rest/api/2/attachment/{index}"})
+        links = []
+        if dataset.link_every and index % dataset.link_every == 0 and index + 1 < dataset.issues:
+            target = index + 1
+            target_project = target // dataset.per_project
+            target_key = f"{dataset.project_key(target_project)}-{target - target_project * dataset.per_project + 1}"
+            links.append({"id": str(index), "type": {"name": "Blocks", "inward": "is blocked by", "outward": "blocks"},
+                          "outwardIssue": {"id": str(target), "key": target_key,
+                                           "self": f"{self.base_url}/rest/api/2/issue/{target}"}})
+        return {
+            "id": str(index),
+            "key": key,
+            "self": f"{self.base_url}/rest/api/2/issue/{index}",
+            "fields": {
+                "summary": f"Synthetic issue {index}",
+                "description": f"h2. Synthetic issue {index}\n*Steps* to reproduce with {{{{config_{index % 7}}}}} "
+                               f"and [docs|{self.base_url}/docs/{index}]:\n# first step\n# second step\n\n"
+                               f"Regards,\n_Synthetic team_",
+                "assignee": {"key": dataset.user(index), "name": dataset.user(index)},
+                "reporter": {"key": dataset.user(index + 1), "name": dataset.user(index + 1)},
+                "status": {"name": "Open"},
+                "project": {"key": dataset.project_key(project)},
+                "comment": {"comments": [{"author": {"key": dataset.user(index + number)},
+                                          "body": f"*Comment* {number} on issue {index}"}
+                                         for number in range(dataset.comments)], "total": dataset.comments},
+                "priority": {"name": "Major"},
+                "created": created,
+                "updated": created,
+                "labels": [f"label{index % 7}"],
+                "attachment": attachments,
+                "issuelinks": links,
+            },
+        }
+
+    def attachment_content(self, index):
+        self.send_bytes(self.dataset.attachment_bytes(int(index)))
+
+
+# Asana API 1.0: проекты, задачи проекта, комментарии, вложения и их скачивание
+class FakeAsanaHandler(FakeHandler):
+    routes = (
+        ("GET", r"/projects", "projects"),
+        ("GET", r"/projects/(\d+)/tasks", "tasks"),
+        ("GET", r"/tasks", "find_tasks"),
+        ("GET", r"/tasks/(\d+)/stories", "stories"),
+        ("GET", r"/tasks/(\d+)/attachments", "attachments"),
+        ("GET", r"/download/(\d+)", "download"),
+    )
+
+    def paginated(self, path, items, total):
+        offset = int(self.query.get("offset", 0))
+        limit = int(self.query.get("limit", 100))
+        data = [items(index) for index in range(offset, min(offset + limit, total))]
+        next_page = None
+        if offset + limit < total:
+            query = urlencode(dict(self.query, offset=offset + limit))
+            next_page = {"offset": str(offset + limit), "path": f"{path}?{query}",
+                         "uri": f"{self.base_url}{path}?{query}"}
+        self.send_json({"data": data, "next_page": next_page})
+
+    def projects(self):
+        self.paginated("/projects", lambda project: {"gid": str(project + 1), "name": f"Project {project}"},
+                       self.dataset.projects)
+
+    def tasks(self, project_gid):
+        indexes = self.dataset.project_range(int(project_gid) - 1)
+        self.paginated(f"/projects/{project_gid}/tasks", lambda offset: self.task(indexes[offset], project_gid),
+                       len(indexes))
+
+    # Поиск задач проекта, измененных после modified_since
+    def find_tasks(self):
+        project_gid = self.query.get("project", "1")
+        indexes = self.dataset.project_range(int(project_gid) - 1)
+        if self.query.get("modified_since"):
+            bound = datetime.strptime(self.query["modified_since"][:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+            minutes = -(-(bound - self.dataset.created(indexes.start)).total_seconds() // 60)
+            indexes = indexes[max(0, min(len(indexes), int(minutes))):]
+        self.paginated("/tasks", lambda offset: self.task(indexes[offset], project_gid), len(indexes))
+
+    def task(self, index, project_gid):
+        dataset = self.dataset
+        created = dataset.created(index).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        return {
+            "gid": str(index + 1),
+            "name": f"Synthetic task {index}",
+            "notes": f"Notes of synthetic task {index}",
+            "html_notes": f"<body><strong>Notes</strong> of synthetic task {index}<ul><li>first</li>"
+                          f"<li>second</li></ul><em>Synthetic team</em></body>",
+            "assignee": {"gid": dataset.uid(index)},
+            "created_by": {"gid": dataset.uid(index + 1)},
+            "completed": index % 3 == 0,
+            "projects": [{"gid": project_gid}],
+            "created_at": created,
+            "modified_at": created,
+            "tags": [{"name": f"tag{index % 5}"}],
+            "followers": [{"gid": dataset.uid(index + 2)}],
+        }
+
+    def stories(self, task_gid):
+        index = int(task_gid) - 1
+        self.paginated(f"/tasks/{task_gid}/stories",
+                       lambda number: {"gid": f"{task_gid}{number}", "type": "comment",
+                                       "text": f"Comment {number} on task {index}",
+                                       "html_text": f"<body><strong>Comment</strong> {number} on task {index}</body>",
+                                       "created_by": {"gid": self.dataset.uid(index + number)},
+                                       "created_at": "2020-01-01T00:00:00.000Z"},
+                       self.dataset.comments)
+
+    def attachments(self, task_gid):
+        index = int(task_gid) - 1
+        total = 1 if self.dataset.has_attachment(index) else 0
+        self.paginated(f"/tasks/{task_gid}/attachments",
+                       lambda number: {"gid": task_gid, "name": f"file-{index}.bin",
+                                       "download_url": f"{self.base_url}/download/{index}",
+                                       "size": self.dataset.attachment_size},
+                       total)
+
+    def download(self, index):
+        self.send_bytes(self.dataset.attachment_bytes(int(index)))
+
+
+# Яндекс Трекер API v2: пользователи, очереди, создание и поиск задач, комментарии,
+# вложения, связи, наблюдатели, обновление задач и массовые операции
+class FakeTrackerHandler(FakeHandler):
+    routes = (
+        ("GET", r"/v2/users/?", "users"),
+        ("GET", r"/v2/users/([^/]+)", "user"),
+        ("GET", r"/v2/myself/?", "myself"),
+        ("GET", r"/v2/fields/?", "fields"),
+        ("GET", r"/v2/queues/?", "queues"),
+        ("GET", r"/v2/queues/([^/]+)", "queue"),
+        ("POST", r"/v2/queues/?", "create_queue"),
+        ("POST", r"/v2/issues/?", "create_issue"),
+        ("POST", r"/v2/issues/_findByUnique", "find_by_unique"),
+        ("POST", r"/v2/issues/_search", "search"),
+        ("GET", r"/v2/issues/([^/_]+)", "get_issue"),
+        ("PATCH", r"/v2/issues/([^/_]+)", "update_issue"),
+        ("POST", r"/v2/issues/([^/]+)/comments/?", "create_comment"),
+        ("POST", r"/v2/issues/([^/]+)/attachments/?", "create_attachment"),
+        ("POST", r"/v2/issues/([^/]+)/links/?", "create_link"),
+        ("POST", r"/v2/issues/([^/]+)/followers/?", "update_followers"),
+        ("PATCH", r"/v2/issues/([^/]+)/followers/?", "update_followers"),
+        ("POST", r"/v2/bulkchange/_update", "bulk_update"),
+        ("GET", r"/v2/bulkchange/([^/]+)", "bulk_status"),
+        ("GET", r"/v2/bulkchange/([^/]+)/fails", "bulk_fails"),
+    )
+
+    def users(self):
+        self.send_json([{"self": f"{self.base_url}/v2/users/{uid}", "uid": uid, "login": f"user{number}",
+                         "email": f"user{number}@example.com", "display": f"User {number}"}
+                        for number in range(self.dataset.users) for uid in [self.dataset.uid(number)]])
+
+    def user(self, user):
+        self.send_json({"self": f"{self.base_url}/v2/users/{user}", "uid": user, "login": user})
+
+    def myself(self):
+        self.send_json({"self": f"{self.base_url}/v2/users/benchmark", "uid": "benchmark", "login": "benchmark"})
+
+    def fields(self):
+        self.send_json([])
+
+    # Очереди существуют только после создания (до сброса состояния)
+    def queue_json(self, key):
+        return {"self": f"{self.base_url}/v2/queues/{key}", "id": key, "key": key, "name": key}
+
+    def queues(self):
+        self.send_json([self.queue_json(key) for key in sorted(self.server.state["queues"])])
+
+    def queue(self, key):
+        if key not in self.server.state["queues"]:
+            return self.send_json({"errors": {}, "errorMessages": ["queue not found"]}, 404)
+        self.send_json(self.queue_json(key))
+
+    def create_queue(self):
+        key = self.json_body().get("key")
+        with self.server.state["lock"]:
+            if key in self.server.state["queues"]:
+                return self.send_json({"errors": {}, "errorMessages": ["queue already exists"]}, 409)
+            self.server.state["queues"].add(key)
+        self.send_json(self.queue_json(key), 201)
+
+    def issue_json(self, key, **fields):
+        return dict({"self": f"{self.base_url}/v2/issues/{key}", "id": key, "key": key}, **fields)
+
+    def create_issue(self):
+        data = self.json_body()
+        state = self.server.state
+        with state["lock"]:
+            unique = data.get("unique")
+            if unique and unique in state["unique"]:
+                return self.send_json({"errors": {}, "errorMessages": ["duplicate unique"]}, 409)
+            state["sequence"] += 1
+            key = f"{data.get('queue', 'Q')}-{state['sequence']}"
+            if unique:
+                state["unique"][unique] = key
+        self.send_json(self.issue_json(key, summary=data.get("summary")), 201)
+
+    def find_by_unique(self):
+        key = self.server.state["unique"].get(self.query.get("unique"))
+        if key is None:
+            return self.send_json({"errors": {}, "errorMessages": ["not found"]}, 404)
+        self.send_json(self.issue_json(key))
+
+    # Поиск для замены UID: задача i с исполнителем, автором и подписчиком из набора пользователей
+    def search(self):
+        data = self.json_body()
+        (field, values), = (data.get("filter") or {"key": []}).items()
+        values = set(values if isinstance(values, list) else [values])
+        offsets = {"assignee": 0, "createdBy": 1, "followers": 2}.get(field)
+        per_page = int(self.query.get("perPage") or 50)
+        page = int(self.query.get("page") or 1)
+        # Задача i попадает в выборку, если uid(i + offset) входит в фильтр
+        users = [number for number in range(self.dataset.users) if self.dataset.uid(number) in values]
+        if offsets is None or not users:
+            return self.send_json([], headers={"X-Total-Count": "0", "X-Total-Pages": "0"})
+        matches = [index for index in range(self.dataset.issues)
+                   if (index + offsets) % self.dataset.users in users] if len(users) < self.dataset.users \
+            else range(self.dataset.issues)
+        total_pages = max(1, -(-len(matches) // per_page))
+        headers = {"X-Total-Count": str(len(matches)), "X-Total-Pages": str(total_pages)}
+        if page < total_pages:
+            headers["Link"] = f'<{self.base_url}/v2/issues/_search?perPage={per_page}&page={page + 1}>; rel="next"'
+        dataset = self.dataset
+        self.send_json([self.issue_json(f"Q-{index + 1}",
+                                        assignee={"id": dataset.uid(index)},
+                                        createdBy={"id": dataset.uid(index + 1)},
+                                        followers=[{"id": dataset.uid(index + 2)}])
+                        for index in matches[(page - 1) * per_page:page * per_page]], headers=headers)
+
+    def get_issue(self, key):
+        self.send_json(self.issue_json(key))
+
+    def update_issue(self, key):
+        self.send_json(self.issue_json(key))
+
+    def create_comment(self, key):
+        self.send_json({"self": f"{self.base_url}/v2/issues/{key}/comments/1", "id": 1}, 201)
+
+    def create_attachment(self, key):
+        self.send_json({"self": f"{self.base_url}/v2/attachments/1", "id": "1", "size": len(self.body)}, 201)
+
+    def create_link(self, key):
+        self.send_json({"self": f"{self.base_url}/v2/issues/{key}/links/1", "id": 1}, 201)
+
+    def update_followers(self, key):
+        self.send_json(self.issue_json(key))
+
+    def bulk_update(self):
+        with self.server.state["lock"]:
+            self.server.state["sequence"] += 1
+            bulk_id = f"bulk{self.server.state['sequence']}"
+        self.send_json({"self": f"{self.base_url}/v2/bulkchange/{bulk_id}", "id": bulk_id, "status": "CREATED"}, 201)
+
+    def bulk_status(self, bulk_id):
+        self.send_json({"self": f"{self.base_url}/v2/bulkchange/{bulk_id}", "id": bulk_id, "status": "COMPLETE"})
+
+    def bulk_fails(self, bulk_id):
+        self.send_json([])
+
+
+# HTTP-сервер имитатора. Очередь входящих соединений увеличена, чтобы сотни одновременных
+# соединений асинхронного клиента (--async-io) не отбрасывались, как и у настоящего сервиса.
+class FakeServer(ThreadingHTTPServer):
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+# Запуск трех серверов (Jira, Asana, Трекер) в фоновых потоках на свободных портах
+# или, если задан base_port, на портах base_port, base_port + 1 и base_port + 2
+class FakeServices:
+    def __init__(self, dataset, latency=0.0, rate_limit=0.0, error_rate=0.0, host="127.0.0.1", base_port=0):
+        self.servers = {}
+        for offset, (name, handler) in enumerate((("jira", FakeJiraHandler), ("asana", FakeAsanaHandler),
+                                                  ("tracker", FakeTrackerHandler))):
+            server = FakeServer((host, base_port + offset if base_port else 0), handler)
+            server.dataset = dataset
+            server.behaviour = ServiceBehaviour(latency, rate_limit, error_rate)
+            server.state = {"lock": threading.Lock(), "sequence": 0, "unique": {}, "queues": set()}
+            self.servers[name] = server
+
+    def url(self, name):
+        host, port = self.servers[name].server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        for name, server in self.servers.items():
+            threading.Thread(target=server.serve_forever, name=f"fake-{name}", daemon=True).start()
+        return self
+
+    def reset(self):
+        for server in self.servers.values():
+            server.behaviour.reset()
+            server.state.update(sequence=0, unique={}, queues=set())
+
+    def calls(self):
+        return {name: dict(server.behaviour.calls) for name, server in self.servers.items()}
+
+    # Количество ответов 429 и 503, отданных каждым имитатором
+    def faults(self):
+        return {name: dict(server.behaviour.faults) for name, server in self.servers.items()}
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
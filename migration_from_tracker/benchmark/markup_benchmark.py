@@ -0,0 +1,93 @@
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from markup_converter import jira_to_markdown, asana_to_markdown, clear_cache, cache_stats  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Повторяющиеся фрагменты (шаблоны и подписи), которые встречаются в части текстов
+JIRA_TEMPLATES = [
+    "h3. Environment\n* OS: Linux\n* Browser: *Firefox*\n* Build: {{release-42}}",
+    "Regards,\n_Support team_\n[Knowledge base|https://example.com/kb]",
+    "||Step||Expected||Actual||\n|Open page|Page opens|-Error-|",
+]
+ASANA_TEMPLATES = [
+    "<strong>Definition of done</strong><ul><li>Reviewed</li><li>Tested</li></ul>",
+    "<em>Regards, support team</em> <a href=\"https://example.com/kb\">Knowledge base</a>",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Микробенчмарк преобразования разметки Jira и Asana в YFM: скорость в МБ/с с кэшем и без него.")
+    parser.add_argument("--texts", type=int, default=20000, help="Количество синтетических текстов каждого вида.")
+    parser.add_argument("--paragraphs", type=int, default=4, help="Количество уникальных абзацев в тексте.")
+    parser.add_argument("--template-share", type=float, default=0.5,
+                        help="Доля текстов с повторяющимся шаблоном или подписью.")
+    parser.add_argument("--seed", type=int, default=1, help="Начальное значение генератора случайных чисел.")
+    return parser.parse_args()
+
+
+def jira_text(number, paragraphs, rng, template_share):
+    parts = [f"h2. Issue {number}"]
+    for paragraph in range(paragraphs):
+        parts.append(f"Paragraph {paragraph} of issue {number}: *bold {rng.random():.6f}* with _emphasis_, "
+                     f"{{{{value_{number}}}}} and [link|https://example.com/{number}/{paragraph}].\n"
+                     f"* item {paragraph}\n** nested -{number}-")
+    parts.append(f"{{code:python}}\nprint({number})\n{{code}}")
+    if rng.random() < template_share:
+        parts.append(rng.choice(JIRA_TEMPLATES))
+    return "\n\n".join(parts)
+
+
+def asana_text(number, paragraphs, rng, template_share):
+    parts = ["<body>", f"<h2>Task {number}</h2>"]
+    for paragraph in range(paragraphs):
+        parts.append(f"Paragraph {paragraph} of task {number}: <strong>bold {rng.random():.6f}</strong> with "
+                     f"<em>emphasis</em>, <code>value_{number}</code> and "
+                     f"<a href=\"https://example.com/{number}/{paragraph}\">link</a>\n")
+    if rng.random() < template_share:
+        parts.append(rng.choice(ASANA_TEMPLATES))
+    parts.append("</body>")
+    return "".join(parts)
+
+
+# Время преобразования набора текстов; при повторе те же тексты берутся из кэша
+def measure(convert, texts):
+    started = time.perf_counter()
+    for text in texts:
+        convert(text)
+    return time.perf_counter() - started
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    datasets = {
+        "jira": (jira_to_markdown, [jira_text(number, args.paragraphs, rng, args.template_share)
+                                    for number in range(args.texts)]),
+        "asana": (asana_to_markdown, [asana_text(number, args.paragraphs, rng, args.template_share)
+                                      for number in range(args.texts)]),
+    }
+    header = f"{'markup':<8}{'texts':>8}{'MB':>8}{'cold MB/s':>12}{'warm MB/s':>12}{'cache hits':>12}"
+    print(header)
+    print("-" * len(header))
+    for name, (convert, texts) in datasets.items():
+        size = sum(len(text.encode("utf-8")) for text in texts) / (1024 * 1024)
+        clear_cache()
+        cold = measure(convert, texts)
+        hits, misses = cache_stats()
+        warm = measure(convert, texts)
+        print(f"{name:<8}{len(texts):>8}{size:>8.1f}{size / cold:>12.2f}{size / warm:>12.2f}"
+              f"{hits / (hits + misses) if hits + misses else 0:>12.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_services import Dataset, FakeServices
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+# Скрипты миграции и ответ на интерактивный вопрос (если он есть)
+SCRIPTS = {
+    "jira": ("import_jira_tracker.py", None),
+    "asana": ("import_assana_tracker.py", None),
+    "cloudorg": ("import_cloudorg_org_tracker.py", "1\n"),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Офлайн-бенчмарк скриптов миграции на синтетических данных с имитацией Jira, Asana и Яндекс Трекера.")
+    parser.add_argument("--issues", type=int, default=10000, help="Количество задач в синтетическом наборе.")
+    parser.add_argument("--projects", type=int, default=4, help="Количество проектов (очередей).")
+    parser.add_argument("--users", type=int, default=50, help="Количество пользователей.")
+    parser.add_argument("--comments", type=int, default=2, help="Количество комментариев в каждой задаче.")
+    parser.add_argument("--attachment-every", type=int, default=0,
+                        help="Добавлять вложение в каждую N-ю задачу (0 - без вложений).")
+    parser.add_argument("--attachment-kb", type=int, default=64, help="Размер вложения, КБ.")
+    parser.add_argument("--link-every", type=int, default=10, help="Добавлять связь в каждую N-ю задачу Jira.")
+    parser.add_argument("--scripts", default="jira,asana,cloudorg",
+                        help="Какие скрипты запускать, через запятую: " + ", ".join(SCRIPTS) + ".")
+    parser.add_argument("--latency", type=float, default=0.0, help="Средняя задержка ответа имитаторов, секунд.")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Ограничение частоты запросов к каждому имитатору (запросов в секунду, 0 - без ограничения).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля запросов, на которые отвечать 503.")
+    parser.add_argument("--workers", type=int, default=8, help="Значение WORKERS для скриптов.")
+    parser.add_argument("--timeout", type=float, default=3600, help="Максимальное время работы одного скрипта, секунд.")
+    parser.add_argument("--base-port", type=int, default=0,
+                        help="Порты имитаторов Jira, Asana и Трекера: N, N+1, N+2 (по умолчанию свободные). "
+                             "Постоянные порты нужны, чтобы импортировать снимок, выгруженный предыдущим запуском.")
+    parser.add_argument("--output", help="Файл для сохранения результатов в формате JSON.")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER,
+                        help="Дополнительные аргументы скриптов (после --), например: -- --pipeline.")
+    return parser.parse_args()
+
+
+# Рабочий каталог скрипта с файлами сопоставления пользователей.
+# В Jira пользователи задаются логином, в Asana - идентификатором (gid).
+def prepare_workdir(name, dataset):
+    workdir = tempfile.mkdtemp(prefix=f"migration-benchmark-{name}-")
+    with open(os.path.join(workdir, "user_mapping.csv"), "w") as file:
+        file.write(f"{name}_user,tracker_user\n")
+        for number in range(dataset.users):
+            source = dataset.uid(number) if name == "asana" else dataset.user(number)
+            file.write(f"{source},{dataset.uid(number)}\n")
+    with open(os.path.join(workdir, "to.txt"), "w") as file:
+        for number in range(dataset.users):
+            file.write(f"{dataset.uid(number)} {int(dataset.uid(number)) + 100000}\n")
+    return workdir
+
+
+def script_env(services, workers):
+    env = dict(os.environ)
+    env.update({
+        "JIRA_URL": services.url("jira"),
+        "JIRA_USER": "benchmark",
+        "JIRA_API_TOKEN": "benchmark",
+        "ASANA_ACCESS_TOKEN": "benchmark",
+        "ASANA_API_URL": services.url("asana"),
+        "ORG_ID": "1",
+        "CLOUD_ORG_ID": "1",
+        "TOKEN": "benchmark",
+        "TRACKER_API_URL": services.url("tracker"),
+        "TRACKER_RATE_LIMIT": "0",
+        "WORKERS": str(workers),
+        "METRICS_FILE": "-",
+        "JOURNAL_FILE": "",
+        "OAUTHLIB_INSECURE_TRANSPORT": "1",
+        "PYTHONUNBUFFERED": "1",
+    })
+    # Режим по умолчанию (per-uid) листает результаты поиска по номерам страниц, которых
+    # имитатор Трекера не отдает, поэтому замена UID измеряется в режиме merged
+    env.setdefault("UPDATE_MODE", "merged")
+    return env
+
+
+# Последний снимок метрик, выведенный скриптом строкой JSON
+def last_metrics(output):
+    snapshot = None
+    for line in output.splitlines():
+        # Строка может начинаться с текста интерактивного вопроса, выведенного без перевода строки
+        start = line.find('{"type": "metrics"')
+        if start < 0:
+            continue
+        try:
+            snapshot = json.loads(line[start:])
+        except ValueError:
+            continue
+    return snapshot
+
+
+# Запуск одного скрипта миграции с замером времени и пикового потребления памяти
+def run_script(name, services, dataset, args):
+    script, stdin = SCRIPTS[name]
+    workdir = prepare_workdir(name, dataset)
+    services.reset()
+    command = [sys.executable, os.path.abspath(os.path.join(SCRIPTS_DIR, script))] + args.script_args
+    env = script_env(services, args.workers)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.abspath(SCRIPTS_DIR), env.get("PYTHONPATH")]))
+    logger.info(f"Запуск {name}: {' '.join(command)}")
+    started = time.monotonic()
+    with open(os.path.join(workdir, "stdout.log"), "w+") as stdout, \
+            open(os.path.join(workdir, "stderr.log"), "w+") as stderr:
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdin=subprocess.PIPE,
+                                   stdout=stdout, stderr=stderr, text=True)
+        if stdin:
+            process.stdin.write(stdin)
+        process.stdin.close()
+        deadline = started + args.timeout
+        while True:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if time.monotonic() > deadline:
+                process.kill()
+                pid, status, usage = os.wait4(process.pid, 0)
+                logger.error(f"{name}: превышено время ожидания {args.timeout} с.")
+                break
+            time.sleep(0.05)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        elapsed = time.monotonic() - started
+        stdout.seek(0)
+        snapshot = last_metrics(stdout.read())
+    done = snapshot["progress"]["done"] if snapshot else 0
+    calls = services.calls()
+    result = {
+        "script": name,
+        "exit_code": process.returncode,
+        "seconds": round(elapsed, 2),
+        "issues": done,
+        "issues_per_second": round(done / elapsed, 2) if elapsed else 0.0,
+        # ru_maxrss в Linux измеряется в килобайтах
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "api_calls": {service: sum(routes.values()) for service, routes in calls.items()},
+        "api_routes": calls,
+        "faults": services.faults(),
+        "stages": snapshot["stages"] if snapshot else {},
+        "workdir": workdir,
+    }
+    if process.returncode:
+        logger.error(f"{name}: скрипт завершился с кодом {process.returncode}, журнал: {workdir}/stderr.log")
+    return result
+
+
+def print_report(results):
+    header = f"{'script':<10}{'exit':>6}{'issues':>10}{'seconds':>10}{'issues/s':>11}{'RSS, MB':>10}" \
+             f"{'jira':>9}{'asana':>9}{'tracker':>9}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        calls = result["api_calls"]
+        print(f"{result['script']:<10}{result['exit_code']:>6}{result['issues']:>10}{result['seconds']:>10}"
+              f"{result['issues_per_second']:>11}{result['peak_rss_mb']:>10}"
+              f"{calls['jira']:>9}{calls['asana']:>9}{calls['tracker']:>9}")
+
+
+def main():
+    args = parse_args()
+    if args.script_args[:1] == ["--"]:
+        args.script_args = args.script_args[1:]
+    names = [name.strip() for name in args.scripts.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCRIPTS]
+    if unknown:
+        raise SystemExit(f"Неизвестные скрипты: {', '.join(unknown)}")
+    dataset = Dataset(args.issues, args.projects, args.users, args.comments, args.attachment_every,
+                      args.attachment_kb * 1024, args.link_every)
+    services = FakeServices(dataset, args.latency, args.rate_limit, args.error_rate,
+                            base_port=args.base_port).start()
+    logger.info(f"Имитаторы запущены: Jira {services.url('jira')}, Asana {services.url('asana')}, "
+                f"Трекер {services.url('tracker')}; задач: {args.issues}.")
+    try:
+        results = [run_script(name, services, dataset, args) for name in names]
+    finally:
+        services.stop()
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"dataset": vars(dataset), "latency": args.latency, "rate_limit": args.rate_limit,
+                       "error_rate": args.error_rate, "workers": args.workers, "results": results},
+                      file, ensure_ascii=False, indent=2)
+        logger.info(f"Результаты сохранены в {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
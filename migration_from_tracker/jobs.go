@@ -0,0 +1,500 @@
+package main
+
+import (
+	"bufio"
+	"context"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"io"
+	"log"
+	"net/http"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"strconv"
+	"strings"
+	"sync"
+	"time"
+)
+
+// Скрипты миграции, которые можно запустить как задание
+var migrationScripts = map[string]string{
+	"jira":     "scripts/import_jira_tracker.py",
+	"asana":    "scripts/import_assana_tracker.py",
+	"cloudorg": "scripts/import_cloudorg_org_tracker.py",
+}
+
+// Статусы задания
+const (
+	JobQueued    = "queued"
+	JobRunning   = "running"
+	JobSucceeded = "succeeded"
+	JobFailed    = "failed"
+	JobCancelled = "cancelled"
+)
+
+var (
+	ErrQueueFull         = errors.New("job queue is full")
+	ErrUnknownScript     = errors.New("unknown migration script")
+	ErrDirectionRequired = errors.New("cloudorg jobs need a direction (--direction 1|2 or MIGRATION_DIRECTION)")
+)
+
+// Скрипт cloudorg спрашивает направление переноса в консоли, а у задания нет stdin,
+// поэтому направление должно быть задано аргументом --direction или переменной окружения
+func directionMissing(script string, args []string) bool {
+	if script != "cloudorg" || os.Getenv("MIGRATION_DIRECTION") != "" {
+		return false
+	}
+	for _, arg := range args {
+		if arg == "--direction" || strings.HasPrefix(arg, "--direction=") {
+			return false
+		}
+	}
+	return true
+}
+
+// Кольцевой буфер последних строк вывода задания.
+// Каждая строка получает сквозной номер, по которому клиент запрашивает продолжение.
+type LogBuffer struct {
+	mu      sync.Mutex
+	lines   []string
+	first   int // номер самой старой строки в буфере
+	next    int // номер следующей строки
+	updated chan struct{}
+}
+
+func NewLogBuffer(capacity int) *LogBuffer {
+	return &LogBuffer{lines: make([]string, 0, capacity), updated: make(chan struct{})}
+}
+
+func (b *LogBuffer) Append(line string) {
+	b.mu.Lock()
+	if len(b.lines) < cap(b.lines) {
+		b.lines = append(b.lines, line)
+	} else {
+		b.lines[b.next%cap(b.lines)] = line
+		b.first++
+	}
+	b.next++
+	close(b.updated)
+	b.updated = make(chan struct{})
+	b.mu.Unlock()
+}
+
+// Строки начиная с номера since, номер следующей строки и канал, который закроется при появлении новых строк.
+// Номер больше номера следующей строки (например, после перезапуска сервера) означает, что новых строк нет.
+func (b *LogBuffer) Since(since int) ([]string, int, <-chan struct{}) {
+	b.mu.Lock()
+	defer b.mu.Unlock()
+	if since < b.first {
+		since = b.first
+	}
+	if since > b.next {
+		since = b.next
+	}
+	result := make([]string, 0, b.next-since)
+	for i := since; i < b.next; i++ {
+		result = append(result, b.lines[i%cap(b.lines)])
+	}
+	return result, b.next, b.updated
+}
+
+// Уведомление ожидающих клиентов без добавления строки (например, при смене статуса)
+func (b *LogBuffer) Notify() {
+	b.mu.Lock()
+	close(b.updated)
+	b.updated = make(chan struct{})
+	b.mu.Unlock()
+}
+
+// Сведения о задании миграции, которые отдаются клиенту
+type JobInfo struct {
+	ID         string     `json:"id"`
+	Script     string     `json:"script"`
+	Args       []string   `json:"args"`
+	Status     string     `json:"status"`
+	Error      string     `json:"error,omitempty"`
+	LogFile    string     `json:"log_file"`
+	CreatedAt  time.Time  `json:"created_at"`
+	StartedAt  *time.Time `json:"started_at,omitempty"`  // nil, пока задание не запущено
+	FinishedAt *time.Time `json:"finished_at,omitempty"` // nil, пока задание не завершено
+}
+
+// Задание миграции: запуск одного скрипта Python в фоне.
+// Статус и функция отмены меняются под mu вместе, поэтому отмена не разминется с запуском.
+type Job struct {
+	JobInfo
+
+	mu     sync.Mutex
+	log    *LogBuffer
+	cancel context.CancelFunc // отмена выполняемого скрипта; nil, пока задание в очереди
+}
+
+// Копия сведений о задании для ответа в JSON
+func (j *Job) Snapshot() JobInfo {
+	j.mu.Lock()
+	defer j.mu.Unlock()
+	return j.JobInfo
+}
+
+func (j *Job) setStatusLocked(status string, err error) {
+	now := time.Now()
+	j.Status = status
+	switch status {
+	case JobRunning:
+		j.StartedAt = &now
+	case JobSucceeded, JobFailed, JobCancelled:
+		j.FinishedAt = &now
+	}
+	if err != nil {
+		j.Error = err.Error()
+	}
+}
+
+// Смена статуса, только если текущий статус равен from; возвращает, сменился ли статус
+func (j *Job) transition(from, to string, err error) bool {
+	j.mu.Lock()
+	changed := j.Status == from
+	if changed {
+		j.setStatusLocked(to, err)
+	}
+	j.mu.Unlock()
+	if changed {
+		j.log.Notify()
+	}
+	return changed
+}
+
+// Перевод задания из очереди в работу с функцией отмены скрипта. Возвращает false, если
+// задание уже отменено: тогда скрипт не запускается.
+func (j *Job) start(cancel context.CancelFunc) bool {
+	j.mu.Lock()
+	started := j.Status == JobQueued
+	if started {
+		j.cancel = cancel
+		j.setStatusLocked(JobRunning, nil)
+	}
+	j.mu.Unlock()
+	if started {
+		j.log.Notify()
+	}
+	return started
+}
+
+func (j *Job) finished() bool {
+	j.mu.Lock()
+	defer j.mu.Unlock()
+	return j.Status == JobSucceeded || j.Status == JobFailed || j.Status == JobCancelled
+}
+
+// Менеджер заданий: ограниченная очередь и фиксированное число одновременно выполняемых миграций.
+// Вывод скрипта построчно пишется в файл журнала задания и в кольцевой буфер,
+// поэтому память не растет на длинных миграциях.
+type JobManager struct {
+	mu       sync.Mutex
+	jobs     map[string]*Job
+	order    []string
+	queue    chan *Job
+	logDir   string
+	logLines int
+	sequence int
+	maxKeep  int
+}
+
+func NewJobManager(workers, queueSize, logLines int, logDir string) (*JobManager, error) {
+	if err := os.MkdirAll(logDir, 0o755); err != nil {
+		return nil, fmt.Errorf("failed to create job log directory: %w", err)
+	}
+	m := &JobManager{
+		jobs:     make(map[string]*Job),
+		queue:    make(chan *Job, queueSize),
+		logDir:   logDir,
+		logLines: logLines,
+		maxKeep:  100,
+	}
+	for i := 0; i < workers; i++ {
+		go m.worker()
+	}
+	return m, nil
+}
+
+// Постановка скрипта в очередь. Возвращает ErrQueueFull, если очередь заполнена.
+func (m *JobManager) Submit(script string, args []string) (*Job, error) {
+	scriptPath, ok := migrationScripts[script]
+	if !ok {
+		return nil, ErrUnknownScript
+	}
+	if directionMissing(script, args) {
+		return nil, ErrDirectionRequired
+	}
+	m.mu.Lock()
+	m.sequence++
+	id := fmt.Sprintf("%s-%d", time.Now().Format("20060102-150405"), m.sequence)
+	m.mu.Unlock()
+
+	job := &Job{
+		JobInfo: JobInfo{
+			ID:        id,
+			Script:    scriptPath,
+			Args:      args,
+			Status:    JobQueued,
+			LogFile:   filepath.Join(m.logDir, id+".log"),
+			CreatedAt: time.Now(),
+		},
+		log: NewLogBuffer(m.logLines),
+	}
+	select {
+	case m.queue <- job:
+	default:
+		return nil, ErrQueueFull
+	}
+	m.mu.Lock()
+	m.jobs[id] = job
+	m.order = append(m.order, id)
+	m.evictLocked()
+	m.mu.Unlock()
+	log.Printf("Job %s queued: %s %s", id, scriptPath, strings.Join(args, " "))
+	return job, nil
+}
+
+// Удаление самых старых завершенных заданий сверх maxKeep. Незавершенные задания
+// пропускаются, поэтому одно долгое задание не останавливает удаление более новых завершенных.
+func (m *JobManager) evictLocked() {
+	kept := m.order[:0]
+	excess := len(m.order) - m.maxKeep
+	for _, id := range m.order {
+		if job := m.jobs[id]; excess > 0 && (job == nil || job.finished()) {
+			delete(m.jobs, id)
+			excess--
+			continue
+		}
+		kept = append(kept, id)
+	}
+	m.order = kept
+}
+
+func (m *JobManager) Get(id string) *Job {
+	m.mu.Lock()
+	defer m.mu.Unlock()
+	return m.jobs[id]
+}
+
+func (m *JobManager) List() []JobInfo {
+	m.mu.Lock()
+	defer m.mu.Unlock()
+	result := make([]JobInfo, 0, len(m.order))
+	for _, id := range m.order {
+		result = append(result, m.jobs[id].Snapshot())
+	}
+	return result
+}
+
+func (m *JobManager) worker() {
+	for job := range m.queue {
+		m.run(job)
+	}
+}
+
+// Запуск скрипта с построчной записью stdout и stderr в журнал задания.
+// Задание, отмененное в очереди, не запускается.
+func (m *JobManager) run(job *Job) {
+	ctx, cancel := context.WithCancel(context.Background())
+	defer cancel()
+	if !job.start(cancel) {
+		return
+	}
+	log.Printf("Job %s started", job.ID)
+
+	logFile, err := os.Create(job.LogFile)
+	if err != nil {
+		job.transition(JobRunning, JobFailed, fmt.Errorf("failed to create log file: %w", err))
+		return
+	}
+	defer logFile.Close()
+
+	cmd := exec.CommandContext(ctx, "python3", append([]string{job.Script}, job.Args...)...)
+	cmd.Env = append(os.Environ(), "PYTHONUNBUFFERED=1")
+	reader, writer := io.Pipe()
+	cmd.Stdout = writer
+	cmd.Stderr = writer
+
+	if err := cmd.Start(); err != nil {
+		writer.Close()
+		if ctx.Err() != nil {
+			job.transition(JobRunning, JobCancelled, ctx.Err())
+		} else {
+			job.transition(JobRunning, JobFailed, fmt.Errorf("error starting script: %w", err))
+		}
+		return
+	}
+
+	copied := make(chan struct{})
+	go func() {
+		defer close(copied)
+		scanner := bufio.NewScanner(reader)
+		scanner.Buffer(make([]byte, 64*1024), 1024*1024)
+		for scanner.Scan() {
+			line := scanner.Text()
+			fmt.Fprintln(logFile, line)
+			job.log.Append(line)
+		}
+		io.Copy(io.Discard, reader)
+	}()
+
+	err = cmd.Wait()
+	writer.Close()
+	<-copied
+
+	// Контекст отменяется только из Cancel, поэтому его ошибка означает отмену задания
+	switch {
+	case ctx.Err() != nil:
+		job.transition(JobRunning, JobCancelled, ctx.Err())
+		log.Printf("Job %s cancelled", job.ID)
+	case err != nil:
+		job.transition(JobRunning, JobFailed, fmt.Errorf("error executing script: %w", err))
+		log.Printf("Job %s failed: %v", job.ID, err)
+	default:
+		job.transition(JobRunning, JobSucceeded, nil)
+		log.Printf("Job %s completed", job.ID)
+	}
+}
+
+// Отмена задания: задание в очереди сразу отмечается отмененным и не будет запущено,
+// у выполняемого задания останавливается скрипт, а статус выставляет run после его завершения
+func (m *JobManager) Cancel(id string) bool {
+	job := m.Get(id)
+	if job == nil {
+		return false
+	}
+	if job.transition(JobQueued, JobCancelled, context.Canceled) {
+		log.Printf("Job %s cancelled before start", job.ID)
+		return true
+	}
+	job.mu.Lock()
+	cancel := job.cancel
+	job.mu.Unlock()
+	if cancel != nil {
+		cancel()
+	}
+	return true
+}
+
+func writeJSON(w http.ResponseWriter, statusCode int, value interface{}) {
+	w.Header().Set("Content-Type", "application/json; charset=utf-8")
+	w.WriteHeader(statusCode)
+	if err := json.NewEncoder(w).Encode(value); err != nil {
+		log.Printf("Error writing JSON response: %v", err)
+	}
+}
+
+// HTTP-обработчики заданий:
+//
+//	POST   /jobs                  - запуск скрипта (поля формы script, args и для cloudorg direction), ответ 202 с идентификатором
+//	GET    /jobs                  - список заданий
+//	GET    /jobs/{id}?since=N     - статус и строки журнала начиная с номера N (для опроса)
+//	GET    /jobs/{id}/events      - статус и журнал в реальном времени (Server-Sent Events)
+//	DELETE /jobs/{id}             - отмена задания
+func (m *JobManager) Handler() http.Handler {
+	mux := http.NewServeMux()
+	mux.HandleFunc("/jobs", m.handleJobs)
+	mux.HandleFunc("/jobs/", m.handleJob)
+	return mux
+}
+
+func (m *JobManager) handleJobs(w http.ResponseWriter, r *http.Request) {
+	switch r.Method {
+	case http.MethodGet:
+		writeJSON(w, http.StatusOK, m.List())
+	case http.MethodPost:
+		args := strings.Fields(r.FormValue("args"))
+		if direction := r.FormValue("direction"); direction != "" {
+			args = append(args, "--direction", direction)
+		}
+		job, err := m.Submit(r.FormValue("script"), args)
+		switch {
+		case errors.Is(err, ErrUnknownScript), errors.Is(err, ErrDirectionRequired):
+			writeJSON(w, http.StatusBadRequest, map[string]string{"error": err.Error()})
+		case errors.Is(err, ErrQueueFull):
+			w.Header().Set("Retry-After", "30")
+			writeJSON(w, http.StatusServiceUnavailable, map[string]string{"error": err.Error()})
+		default:
+			w.Header().Set("Location", "/jobs/"+job.ID)
+			writeJSON(w, http.StatusAccepted, job.Snapshot())
+		}
+	default:
+		w.Header().Set("Allow", "GET, POST")
+		http.Error(w, "method not allowed", http.StatusMethodNotAllowed)
+	}
+}
+
+func (m *JobManager) handleJob(w http.ResponseWriter, r *http.Request) {
+	path := strings.TrimPrefix(r.URL.Path, "/jobs/")
+	id, events := path, false
+	if strings.HasSuffix(path, "/events") {
+		id, events = strings.TrimSuffix(path, "/events"), true
+	}
+	job := m.Get(id)
+	if job == nil {
+		writeJSON(w, http.StatusNotFound, map[string]string{"error": "job not found"})
+		return
+	}
+	switch {
+	case r.Method == http.MethodDelete && !events:
+		m.Cancel(id)
+		writeJSON(w, http.StatusOK, job.Snapshot())
+	case r.Method == http.MethodGet && events:
+		m.streamEvents(w, r, job)
+	case r.Method == http.MethodGet:
+		since, _ := strconv.Atoi(r.URL.Query().Get("since"))
+		lines, next, _ := job.log.Since(since)
+		writeJSON(w, http.StatusOK, map[string]interface{}{"job": job.Snapshot(), "lines": lines, "next": next})
+	default:
+		http.Error(w, "method not allowed", http.StatusMethodNotAllowed)
+	}
+}
+
+// Поток событий: строки журнала (событие log) и статус задания (событие status).
+// Клиент может продолжить с места обрыва по заголовку Last-Event-ID.
+func (m *JobManager) streamEvents(w http.ResponseWriter, r *http.Request, job *Job) {
+	flusher, ok := w.(http.Flusher)
+	if !ok {
+		http.Error(w, "streaming unsupported", http.StatusInternalServerError)
+		return
+	}
+	w.Header().Set("Content-Type", "text/event-stream")
+	w.Header().Set("Cache-Control", "no-cache")
+	w.Header().Set("Connection", "keep-alive")
+
+	since, _ := strconv.Atoi(r.Header.Get("Last-Event-ID"))
+	if since == 0 {
+		since, _ = strconv.Atoi(r.URL.Query().Get("since"))
+	}
+	lastStatus := ""
+	keepAlive := time.NewTicker(15 * time.Second)
+	defer keepAlive.Stop()
+	for {
+		lines, next, updated := job.log.Since(since)
+		for i, line := range lines {
+			fmt.Fprintf(w, "id: %d\nevent: log\ndata: %s\n\n", next-len(lines)+i+1, line)
+		}
+		since = next
+		snapshot := job.Snapshot()
+		if snapshot.Status != lastStatus {
+			data, _ := json.Marshal(snapshot)
+			fmt.Fprintf(w, "event: status\ndata: %s\n\n", data)
+			lastStatus = snapshot.Status
+		}
+		flusher.Flush()
+		if job.finished() {
+			return
+		}
+		select {
+		case <-updated:
+		case <-keepAlive.C:
+			fmt.Fprint(w, ": keep-alive\n\n")
+		case <-r.Context().Done():
+			return
+		}
+	}
+}
@@ -9,8 +9,7 @@ import (
 	"log"
 	"net/http"
 	"os"
-	"os/exec"
-	"strings"
+	"strconv"
 	"time"
 
 	jira "github.com/andygrunwald/go-jira"
@@ -75,14 +74,12 @@ func selectSourceHandler(w http.ResponseWriter, r *http.Request) {
 	}
 }
 
-// Функция для запуска скриптов Python
-func runScriptWithArgs(scriptPath string, args ...string) (string, error) {
-	cmd := exec.Command("python3", append([]string{scriptPath}, args...)...)
-	output, err := cmd.CombinedOutput()
-	if err != nil {
-		return "", fmt.Errorf("error executing script: %v, output: %s", err, output)
+// Целое число из переменной окружения или значение по умолчанию
+func envInt(name string, fallback int) int {
+	if value, err := strconv.Atoi(os.Getenv(name)); err == nil && value > 0 {
+		return value
 	}
-	return string(output), nil
+	return fallback
 }
 
 // Инициализация клиента Jira
@@ -217,6 +214,19 @@ func main() {
 	http.HandleFunc("/", homeHandler)
 	http.HandleFunc("/select", selectSourceHandler)
 
+	// Скрипты миграции выполняются в фоне как задания (см. jobs.go)
+	logDir := os.Getenv("JOB_LOG_DIR")
+	if logDir == "" {
+		logDir = "jobs"
+	}
+	jobManager, err := NewJobManager(envInt("JOB_WORKERS", 1), envInt("JOB_QUEUE_SIZE", 10), envInt("JOB_LOG_LINES", 1000), logDir)
+	if err != nil {
+		log.Fatalf("Error initializing job manager: %v", err)
+	}
+	jobsHandler := jobManager.Handler()
+	http.Handle("/jobs", jobsHandler)
+	http.Handle("/jobs/", jobsHandler)
+
 	port := os.Getenv("PORT")
 	if port == "" {
 		port = "8080"
@@ -0,0 +1,231 @@
+import itertools
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from tracker_throttle import backoff_delay, retryable_failure
+from http_pool import configure_session, log_session_stats
+from migration_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024  # Размер блока при передаче вложений
+SPOOL_MEMORY = 8 * 1024 * 1024  # Сколько байт вложения неизвестного размера держать в памяти до записи на диск
+SPOOL_LIMIT = int(os.getenv('ATTACHMENT_SPOOL_MB', '2048')) * 1024 * 1024  # Наибольший размер вложения неизвестного размера (временный файл на диске)
+
+_download_session = requests.Session()
+
+
+# Потоковое скачивание файла по ссылке блоками
+def download_chunks(url, chunk_size=CHUNK_SIZE):
+    response = _download_session.get(url, stream=True, timeout=60)
+    response.raise_for_status()
+    return response.iter_content(chunk_size)
+
+
+# Размер вложения не совпал с заявленным источником или превысил SPOOL_LIMIT
+class AttachmentSizeError(ValueError):
+    pass
+
+
+# Запись вложения неизвестного размера во временный файл: первые SPOOL_MEMORY байт
+# остаются в памяти, остальное пишется на диск, но не больше SPOOL_LIMIT байт, поэтому
+# на диске одновременно занято не больше SPOOL_LIMIT на каждый поток передачи вложений.
+# Возвращает временный файл (его закрывает вызывающий код) и размер вложения.
+def spool_chunks(open_chunks):
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+    size = 0
+    try:
+        for chunk in open_chunks():
+            size += len(chunk)
+            if size > SPOOL_LIMIT:
+                raise AttachmentSizeError(f"Вложение больше {SPOOL_LIMIT // (1024 * 1024)} МБ "
+                                          f"(ATTACHMENT_SPOOL_MB) нельзя передать через временный файл.")
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    return spool, size
+
+
+# Тело запроса multipart/form-data, которое читается блоками из источника.
+# Длина известна заранее, поэтому запрос уходит с Content-Length без буферизации файла.
+# Источник отдает ровно size байт, иначе чтение прерывается ошибкой AttachmentSizeError
+# до отправки конца тела, и Трекер не получает обрезанный файл.
+# Если источник можно прочитать повторно (rewindable), соединение может повторить запрос.
+class MultipartBody:
+    def __init__(self, size, open_chunks, rewindable=False):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.head = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="file"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n').encode()
+        self.tail = f"\r\n--{boundary}--\r\n".encode()
+        self.size = size
+        self.len = len(self.head) + size + len(self.tail)
+        self.open_chunks = open_chunks
+        self.rewindable = rewindable
+        self.sent = 0
+        self._start()
+
+    def _start(self):
+        self.parts = itertools.chain([self.head], self._counted(self.open_chunks()), [self.tail])
+        self.buffer = b""
+        self.sent = 0
+
+    def _counted(self, chunks):
+        received = 0
+        for chunk in chunks:
+            received += len(chunk)
+            if received > self.size:
+                raise AttachmentSizeError(f"Источник отдал больше заявленных {self.size} байт.")
+            yield chunk
+        if received != self.size:
+            raise AttachmentSizeError(f"Источник отдал {received} байт вместо заявленных {self.size}.")
+
+    def rewind(self):
+        if not self.rewindable:
+            raise ValueError("Источник вложения нельзя прочитать повторно.")
+        self._start()
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.parts, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        if size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        self.sent += len(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(CHUNK_SIZE)
+            if not data:
+                return
+            yield data
+
+
+# Перенос вложений из источника в Яндекс Трекер.
+# Вложения передаются отдельным пулом потоков, а суммарный размер одновременно
+# передаваемых файлов ограничен max_bytes_in_flight (файл больше лимита передается один).
+# Если размер файла известен, данные идут из источника в Трекер напрямую блоками;
+# иначе, или если источник отдал не заявленное число байт, файл сначала пишется во
+# временный файл (см. spool_chunks).
+# Тело из временного файла повторяет соединение клиента; потоковое тело соединение
+# повторить не может, поэтому его передача повторяется здесь, но только если запрос
+# не дошел до Трекера или получил ответ 429, чтобы не создать вложение дважды.
+class AttachmentTransfer:
+    def __init__(self, tracker_client, workers=4, max_bytes_in_flight=256 * 1024 * 1024, retries=3):
+        self.tracker_client = tracker_client
+        self.max_bytes_in_flight = max_bytes_in_flight
+        self.retries = retries
+        self.executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="attachment")
+        # Вложения по ссылкам скачиваются одновременно всеми потоками передачи
+        configure_session(_download_session, workers)
+        self.condition = threading.Condition()
+        self.bytes_in_flight = 0
+        self.stats = {"files": 0, "bytes": 0, "seconds": 0.0, "spooled": 0}
+        self.started = time.monotonic()
+
+    # Постановка вложения в очередь; open_chunks() должен возвращать итератор блоков файла
+    def submit(self, issue_key, filename, size, open_chunks):
+        return self.executor.submit(self._transfer, issue_key, filename, size, open_chunks)
+
+    def _reserve(self, cost):
+        with self.condition:
+            while self.bytes_in_flight and self.bytes_in_flight + cost > self.max_bytes_in_flight:
+                self.condition.wait()
+            self.bytes_in_flight += cost
+
+    def _release(self, cost):
+        with self.condition:
+            self.bytes_in_flight -= cost
+            self.condition.notify_all()
+
+    @metrics.timed("attachment")
+    def _transfer(self, issue_key, filename, size, open_chunks):
+        cost = min(size or SPOOL_MEMORY, self.max_bytes_in_flight)
+        self._reserve(cost)
+        started = time.monotonic()
+        try:
+            sent = None
+            if size:
+                try:
+                    sent = self._stream_and_upload(issue_key, filename, size, open_chunks)
+                except AttachmentSizeError as e:
+                    logger.warning(f"Вложение {filename} задачи {issue_key} передается через временный файл: {e}")
+            if sent is None:
+                sent = self._spool_and_upload(issue_key, filename, open_chunks)
+        finally:
+            self._release(cost)
+        with self.condition:
+            self.stats["files"] += 1
+            self.stats["bytes"] += sent
+            self.stats["seconds"] += time.monotonic() - started
+        metrics.count("attachment_bytes", sent)
+        return sent
+
+    def _stream_and_upload(self, issue_key, filename, size, open_chunks):
+        for attempt in range(self.retries + 1):
+            try:
+                self._upload(issue_key, filename, MultipartBody(size, open_chunks))
+                return size
+            except Exception as e:
+                if attempt >= self.retries or not retryable_failure(e):
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"Ошибка передачи вложения {filename} для задачи {issue_key}: {e}. "
+                               f"Повтор через {delay:.1f} с.")
+                time.sleep(delay)
+
+    def _spool_and_upload(self, issue_key, filename, open_chunks):
+        spool, size = spool_chunks(open_chunks)
+        with spool:
+            with self.condition:
+                self.stats["spooled"] += 1
+
+            def read_spool():
+                spool.seek(0)
+                return iter(lambda: spool.read(CHUNK_SIZE), b"")
+
+            self._upload(issue_key, filename, MultipartBody(size, read_spool, rewindable=True))
+            return size
+
+    # Загрузка тела запроса в Трекер. Публичный метод attachments.create читает файл
+    # целиком в память (так формирует multipart библиотека requests), поэтому запрос
+    # отправляется напрямую через соединение клиента с потоковым телом.
+    def _upload(self, issue_key, filename, body):
+        connection = self.tracker_client._connection
+        url = connection.build_url(f"/{connection.api_version}/issues/{issue_key}/attachments/")
+        connection._try_request(
+            method="POST",
+            url=url,
+            data=body,
+            params={"filename": filename},
+            headers={"Content-Type": body.content_type},
+            timeout=connection.timeout,
+            stream=False,
+        )
+
+    def log_stats(self):
+        with self.condition:
+            stats = dict(self.stats)
+        elapsed = time.monotonic() - self.started
+        megabytes = stats["bytes"] / (1024 * 1024)
+        rate = megabytes / elapsed if elapsed else 0.0
+        logger.info(f"Вложений передано: {stats['files']} ({megabytes:.1f} МБ, через временный файл: "
+                    f"{stats['spooled']}), скорость {rate:.2f} МБ/с.")
+        log_session_stats("источником вложений", _download_session)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.log_stats()
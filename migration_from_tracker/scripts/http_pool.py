@@ -0,0 +1,69 @@
+import logging
+import socket
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+logger = logging.getLogger(__name__)
+
+# TCP keep-alive для соединений пула: соединение, которое простаивает между пачками
+# запросов (например, пока выгружается следующая страница), не закрывается молча
+# промежуточными узлами и не требует нового TLS-рукопожатия
+KEEPALIVE_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+if hasattr(socket, "TCP_KEEPIDLE"):
+    KEEPALIVE_OPTIONS += [(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60),
+                          (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 30)]
+
+
+# Адаптер requests с пулом из pool_size соединений на хост и TCP keep-alive.
+# По умолчанию requests держит 10 соединений на хост: при большем числе потоков
+# лишние соединения закрываются после каждого запроса и открываются заново.
+class PooledAdapter(HTTPAdapter):
+    def __init__(self, pool_size):
+        super().__init__(pool_maxsize=pool_size)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault("socket_options", HTTPConnection.default_socket_options + KEEPALIVE_OPTIONS)
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+
+    # Число запросов и открытых соединений по всем хостам пула
+    def stats(self):
+        stats = {"requests": 0, "connections": 0}
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                stats["requests"] += pool.num_requests
+                stats["connections"] += pool.num_connections
+        return stats
+
+
+# Настройка сессии requests клиента: пул соединений по числу потоков, которые
+# одновременно обращаются к сервису, keep-alive и сжатые ответы (gzip)
+def configure_session(session, pool_size):
+    adapter = PooledAdapter(max(int(pool_size), 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    if "gzip" not in session.headers.get("Accept-Encoding", ""):
+        session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+
+def session_stats(session):
+    stats = {"requests": 0, "connections": 0}
+    adapters = {id(adapter): adapter for adapter in session.adapters.values() if isinstance(adapter, PooledAdapter)}
+    for adapter in adapters.values():
+        for name, value in adapter.stats().items():
+            stats[name] += value
+    return stats
+
+
+# Отчет о повторном использовании соединений сессии
+def log_session_stats(name, session):
+    stats = session_stats(session)
+    if not stats["requests"]:
+        return
+    reused = 1 - stats["connections"] / stats["requests"]
+    logger.info(f"Соединения с {name}: запросов {stats['requests']}, открыто соединений {stats['connections']}, "
+                f"повторно использовано {reused:.1%}.")
@@ -1,9 +1,19 @@
 import os
 import logging
-import csv
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 from asana import Client
-from yandex_tracker_client import TrackerClient
-import tempfile
+from tracker_throttle import log_throttle_stats
+from http_pool import configure_session, log_session_stats
+from migration_journal import open_journal
+from attachment_transfer import download_chunks
+from markup_converter import asana_to_markdown
+from migration_engine import (SourceAdapter, TrackerSink, TrackerIssue, TrackerComment, init_tracker_client,
+                              read_user_mapping, report_unmapped_users, stream_source)
+from migration_metrics import metrics
+from migration_snapshot import SnapshotWriter, SnapshotReader
+from migration_plan import MigrationPlan, report_plan
+import math
 from dotenv import load_dotenv
 from datetime import datetime
 
@@ -12,77 +22,131 @@ load_dotenv()
 
 # Конфигурация
 ASANA_ACCESS_TOKEN = os.getenv('ASANA_ACCESS_TOKEN')
+ASANA_API_URL = os.getenv('ASANA_API_URL')  # Адрес API Asana (по умолчанию используется адрес библиотеки)
 ORG_ID = os.getenv('ORG_ID')  # Идентификатор обычной организации в Yandex Tracker
 CLOUD_ORG_ID = os.getenv('CLOUD_ORG_ID')  # Идентификатор облачной организации в Yandex Cloud
 TOKEN = os.getenv('TOKEN')  # Токен для доступа к Yandex Tracker
+TRACKER_API_URL = os.getenv('TRACKER_API_URL', 'https://api.tracker.yandex.net')  # Адрес API Яндекс Трекера
 PER_PAGE = 100  # Количество задач на странице (Asana по умолчанию ограничивает до 100)
-USER_MAPPING_FILE = 'user_mapping.csv'  # Файл для сопоставления пользователей
+# Поля, которые запрашиваются у Asana (клиент передает их как opt_fields)
+TASK_FIELDS = ['name', 'notes', 'html_notes', 'assignee', 'assignee.email', 'created_by', 'created_by.email',
+               'completed', 'projects', 'created_at', 'modified_at', 'tags.name', 'followers', 'followers.email']
+STORY_FIELDS = ['type', 'text', 'html_text', 'created_by', 'created_by.email', 'created_at']
+ATTACHMENT_FIELDS = ['name', 'download_url', 'size']
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '8'))  # Количество потоков для выгрузки комментариев и вложений из Asana
+USER_MAPPING_FILE = os.getenv('USER_MAPPING_FILE', 'user_mapping.csv')  # Файл для сопоставления пользователей (CSV или SQLite)
+# Столбцы ключей пользователя Asana в файле сопоставления, по порядку проверки
+USER_MAPPING_KEYS = ['asana_user', 'email']
+WORKERS = int(os.getenv('WORKERS', '1'))  # Количество потоков для параллельного создания задач
+TRACKER_RATE_LIMIT = float(os.getenv('TRACKER_RATE_LIMIT', '10'))  # Максимальная частота запросов к Яндекс Трекеру (запросов в секунду)
+TRACKER_MAX_RETRIES = int(os.getenv('TRACKER_MAX_RETRIES', '8'))  # Количество повторов запроса при 429/5xx
+ATTACHMENT_WORKERS = int(os.getenv('ATTACHMENT_WORKERS', '4'))  # Количество потоков для передачи вложений
+ATTACHMENT_MB_IN_FLIGHT = int(os.getenv('ATTACHMENT_MB_IN_FLIGHT', '256'))  # Суммарный размер одновременно передаваемых вложений, МБ
+COMMENT_WORKERS = int(os.getenv('COMMENT_WORKERS', '8'))  # Количество потоков для переноса комментариев
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '0'))  # Размер пула HTTP-соединений каждого клиента (0 - по числу потоков)
+TRACKER_ASYNC_CONCURRENCY = int(os.getenv('TRACKER_ASYNC_CONCURRENCY', '256'))  # Количество одновременных запросов к Яндекс Трекеру в режиме --async-io
+METRICS_FILE = os.getenv('METRICS_FILE', '')  # Куда выводить метрики строками JSON (путь к файлу, '-' - stdout; по умолчанию не выводятся)
+METRICS_PROMETHEUS_FILE = os.getenv('METRICS_PROMETHEUS_FILE', '')  # Текстовый файл метрик в формате Prometheus
+METRICS_INTERVAL = float(os.getenv('METRICS_INTERVAL', '30'))  # Период вывода метрик, секунд
+JOURNAL_FILE = os.getenv('JOURNAL_FILE', 'asana_journal.db')  # Журнал прогресса для возобновления миграции (пустое значение отключает)
+SNAPSHOT_FILE = os.getenv('SNAPSHOT_FILE', 'asana_snapshot.jsonl.gz')  # Файл снимка выгрузки для команд export и import
+PLAN_SAMPLE = int(os.getenv('PLAN_SAMPLE', '100'))  # Размер выборки задач проекта для оценки комментариев и вложений (--plan)
+PLAN_LATENCY = float(os.getenv('PLAN_LATENCY', '0.3'))  # Ожидаемая задержка запроса к Яндекс Трекеру, секунд (--plan)
+PLAN_BANDWIDTH_MB = float(os.getenv('PLAN_BANDWIDTH_MB', '10'))  # Ожидаемая скорость передачи вложений, МБ/с (--plan)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# Функция для инициализации клиента Asana
-def init_asana_client(access_token):
+# Функция для инициализации клиента Asana. Пул соединений рассчитан на pool_size
+# потоков, которые одновременно выгружают страницы задач, комментарии и вложения.
+def init_asana_client(access_token, pool_size=1):
     try:
         asana_client = Client.access_token(access_token)
+        configure_session(asana_client.session, pool_size)
+        if ASANA_API_URL:
+            asana_client.options['base_url'] = ASANA_API_URL
         logger.info("Asana client initialized successfully.")
         return asana_client
     except Exception as e:
         logger.error(f"Ошибка инициализации клиента Asana: {e}")
         raise
 
-# Функция для инициализации клиента Яндекс Трекера
-def init_tracker_client(org_id, cloud_org_id, token):
-    if not org_id and not cloud_org_id:
-        logger.error("Необходимо указать либо ORG_ID, либо CLOUD_ORG_ID.")
-        raise ValueError("Необходимо указать либо ORG_ID, либо CLOUD_ORG_ID.")
-    if org_id:
-        logger.info(f"Используется обычная организация с ID: {org_id}")
-        return TrackerClient(token=token, org_id=org_id)
-    elif cloud_org_id:
-        logger.info(f"Используется облачная организация с ID: {cloud_org_id}")
-        return TrackerClient(token=token, cloud_org_id=cloud_org_id)
-
-# Чтение файла сопоставления пользователей
-def read_user_mapping(file_path):
-    if not os.path.isfile(file_path):
-        logger.error(f"Файл сопоставления пользователей {file_path} не найден.")
-        raise FileNotFoundError(f"Файл сопоставления пользователей {file_path} не найден.")
-    try:
-        with open(file_path, "r") as file:
-            reader = csv.DictReader(file)
-            if 'asana_user' not in reader.fieldnames or 'tracker_user' not in reader.fieldnames:
-                logger.error(f"Файл {file_path} не содержит необходимых столбцов.")
-                raise ValueError(f"Файл {file_path} не содержит необходимых столбцов.")
-            user_mapping = {}
-            for row in reader:
-                if row['asana_user'] in user_mapping:
-                    logger.warning(f"Дублирующийся UID пользователя {row['asana_user']} в файле {file_path}.")
-                user_mapping[row['asana_user']] = row['tracker_user']
-        logger.info("Файл сопоставления пользователей загружен успешно.")
-        return user_mapping
-    except Exception as e:
-        logger.error(f"Ошибка чтения файла сопоставления пользователей {file_path}: {e}")
-        raise
+# Выгрузка комментариев и вложений одной задачи Asana (с постраничной загрузкой)
+@metrics.timed("export_task_details")
+def fetch_task_details(asana_client, task):
+    task['stories'] = [story for story in asana_client.stories.find_by_task(
+        task['gid'], fields=STORY_FIELDS, page_size=PER_PAGE) if story['type'] == 'comment']
+    task['attachments'] = list(asana_client.attachments.find_by_task(
+        task['gid'], fields=ATTACHMENT_FIELDS, page_size=PER_PAGE))
+    return task
+
+# Постраничная выгрузка задач проектов Asana: следующая страница запрашивается, только когда
+# задачи предыдущей разобраны. since - даты по gid проектов: выгружаются только задачи,
+# измененные после них (modified_since).
+def iterate_project_tasks(asana_client, projects, since=None):
+    for project in projects:
+        if since and since.get(project['gid']):
+            tasks = asana_client.tasks.find_all({'project': project['gid'], 'modified_since': since[project['gid']]},
+                                                fields=TASK_FIELDS, page_size=PER_PAGE)
+        else:
+            tasks = asana_client.tasks.find_by_project(project['gid'], fields=TASK_FIELDS, page_size=PER_PAGE)
+        count = 0
+        for task in tasks:
+            count += 1
+            metrics.add_total(1)
+            metrics.count("exported_issues")
+            yield task
+        logger.info(f"Проект {project['name']}: выгружено {count} задач.")
+
+# Выгрузка задач проектов Asana вместе с комментариями и вложениями. Задачи читаются
+# постранично, а детали загружаются пулом потоков, в работе одновременно не больше
+# export_workers * 2 задач; задачи отдаются по мере готовности. Память не растет
+# с размером рабочего пространства.
+def stream_tasks_from_asana(asana_client, projects, export_workers=EXPORT_WORKERS, since=None):
+    export_workers = max(export_workers, 1)
+    logger.info(f"Выгрузка задач {len(projects)} проектов, загрузка комментариев и вложений в {export_workers} потоков.")
+    pending = set()
+    with ThreadPoolExecutor(max_workers=export_workers, thread_name_prefix="asana-export") as executor:
+        try:
+            for task in iterate_project_tasks(asana_client, projects, since):
+                if len(pending) >= export_workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(executor.submit(fetch_task_details, asana_client, task))
+            for future in as_completed(pending):
+                yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
 
-# Экспорт данных из Asana
-def export_data_from_asana(asana_client):
+# Экспорт данных из Asana. Комментарии и вложения задач выгружаются здесь же
+# пулом потоков, чтобы преобразование не обращалось к сети.
+def export_data_from_asana(asana_client, export_workers=EXPORT_WORKERS):
     try:
-        projects = asana_client.projects.find_all()
-        tasks = []
-        for project in projects:
-            tasks.extend(asana_client.tasks.find_by_project(project['gid'], opt_fields=['name', 'notes', 'assignee', 'created_at', 'modified_at', 'tags', 'followers', 'attachments']))
+        projects = list(asana_client.projects.find_all())
+        tasks = list(stream_tasks_from_asana(asana_client, projects, export_workers))
         logger.info(f"Экспорт данных из Asana завершен: {len(projects)} проектов, {len(tasks)} задач.")
         return projects, tasks
     except Exception as e:
         logger.error(f"Ошибка экспорта данных из Asana: {e}")
         raise
 
-# Преобразование данных из Asana в формат Яндекс Трекера
-def transform_data(projects, tasks, user_mapping):
+# Выгрузка проектов и задач Asana в снимок без импорта в Трекер.
+# Задачи записываются по мере загрузки их комментариев и вложений.
+def export_snapshot(asana_client, snapshot_path, export_workers=EXPORT_WORKERS):
+    projects = list(asana_client.projects.find_all())
+    with SnapshotWriter(snapshot_path, "asana") as snapshot:
+        for project in projects:
+            snapshot.write_project(project)
+        for task in stream_tasks_from_asana(asana_client, projects, export_workers):
+            snapshot.write_issue(task)
+    return snapshot.counts["issues"]
+
+# Преобразование проектов Asana в очереди Яндекс Трекера
+def transform_projects(projects):
     tracker_queues = {}
-    tracker_issues = []
     for project in projects:
         queue_key = project['gid']
         tracker_queue = {
@@ -90,208 +154,269 @@ def transform_data(projects, tasks, user_mapping):
             "key": queue_key,
         }
         tracker_queues[queue_key] = tracker_queue
-    
-    for task in tasks:
-        assignee_key = task['assignee']['gid'] if 'assignee' in task and task['assignee'] else None
-        reporter_key = task['created_by']['gid'] if 'created_by' in task and task['created_by'] else None
-        
-        # Сопоставление пользователей
-        assignee_key = user_mapping.get(assignee_key, assignee_key)
-        reporter_key = user_mapping.get(reporter_key, reporter_key)
-        
-        tracker_issue = {
-            "summary": task['name'],
-            "description": task['notes'] if 'notes' in task else '',
-            "assignee": assignee_key,
-            "reporter": reporter_key,
-            "status": task['completed'] if 'completed' in task else False,
-            "queue": task['projects'][0]['gid'] if 'projects' in task and task['projects'] else None,
-            "comments": [{"author": story['created_by']['gid'] if 'created_by' in story else None, "body": story['text'] if 'text' in story else ''} 
-                         for story in asana_client.stories.find_by_task(task['gid']) if story['type'] == 'comment'],
-            "priority": None,  # Asana не предоставляет явное поле приоритета
-            "created": task['created_at'] if 'created_at' in task else None,
-            "updated": task['modified_at'] if 'modified_at' in task else None,
-            "labels": [tag['name'] for tag in task['tags']] if 'tags' in task else [],
-            "attachments": [attachment for attachment in asana_client.attachments.find_by_task(task['gid'])] if 'attachments' in task else [],
-            "followers": [follower['gid'] for follower in task['followers']] if 'followers' in task else []
-        }
-        tracker_issues.append(tracker_issue)
-    
+    return tracker_queues
+
+# Пользователь Трекера для пользователя Asana по сопоставлению (без сопоставления остается gid)
+def map_user(user, user_mapping):
+    if not user:
+        return None
+    return user_mapping.find(user['gid'], user.get('email')) or user['gid']
+
+# Преобразование одной задачи Asana в формат Яндекс Трекера (без обращений к сети)
+@metrics.timed("transform")
+def transform_task(task, user_mapping):
+    # Сопоставление пользователей по gid, а если его нет в файле сопоставления - по email
+    assignee_key = map_user(task.get('assignee'), user_mapping)
+    reporter_key = map_user(task.get('created_by'), user_mapping)
+
+    return TrackerIssue(
+        source_key=task['gid'],
+        summary=task['name'],
+        # Форматированный текст (html_notes, html_text) предпочтительнее простого: он преобразуется в YFM
+        description=task.get('html_notes') or task.get('notes', ''),
+        assignee=assignee_key,
+        reporter=reporter_key,
+        status=task['completed'] if 'completed' in task else False,
+        queue=task['projects'][0]['gid'] if 'projects' in task and task['projects'] else None,
+        comments=[TrackerComment(map_user(story.get('created_by'), user_mapping),
+                                 story.get('html_text') or story.get('text', ''))
+                  for story in task.get('stories', [])],
+        priority=None,  # Asana не предоставляет явное поле приоритета
+        created=task['created_at'] if 'created_at' in task else None,
+        updated=task['modified_at'] if 'modified_at' in task else None,
+        labels=[tag['name'] for tag in task['tags']] if 'tags' in task else [],
+        attachments=task.get('attachments', []),
+        followers=[map_user(follower, user_mapping) for follower in task.get('followers') or []],
+    )
+
+# Преобразование данных из Asana в формат Яндекс Трекера
+def transform_data(projects, tasks, user_mapping):
+    tracker_queues = transform_projects(projects)
+    tracker_issues = [transform_task(task, user_mapping) for task in tasks]
     logger.info(f"Преобразовано {len(tracker_issues)} задач в формат Яндекс Трекера.")
     return tracker_queues, tracker_issues
 
-# Функция для создания задачи в Яндекс Трекере
-def create_issue(tracker_client, tracker_issue, queue):
-    try:
-        issue = tracker_client.issues.create(
-            queue=queue.key,
-            summary=tracker_issue["summary"],
-            description=tracker_issue["description"],
-            assignee=tracker_issue["assignee"],
-            author=tracker_issue["reporter"],
-            status='open' if not tracker_issue['status'] else 'closed',
-            priority=tracker_issue.get("priority"),
-            created=tracker_issue.get("created"),
-            updated=tracker_issue.get("updated"),
-            tags=tracker_issue.get("labels", [])
-        )
-        logger.info(f"Задача {tracker_issue['summary']} создана успешно в очереди {queue.key}.")
-        return issue
-    except Exception as e:
-        logger.error(f"Ошибка создания задачи {tracker_issue['summary']} в очереди {queue.key}: {e}")
-        raise
+# Источник Asana для общего импорта в Трекер (migration_engine)
+class AsanaSource(SourceAdapter):
+    name = "asana"
 
-# Функция для добавления комментариев в задачу Яндекс Трекера
-def add_comments_to_issue(tracker_client, issue, comments):
-    for comment in comments:
-        comment_author = comment["author"]
-        if comment_author:
-            try:
-                tracker_client.users.get(comment_author)
-                logger.info(f"Пользователь {comment_author} найден в Яндекс Трекере.")
-            except Exception:
-                logger.warning(f"Пользователь {comment_author} не найден в Яндекс Трекере.")
-                comment_author = None
-        try:
-            tracker_client.issues[issue.key].comments.create(text=comment["body"], author=comment_author)
-            logger.info(f"Комментарий успешно добавлен к задаче {issue.key}.")
-        except Exception as e:
-            logger.error(f"Ошибка добавления комментария к задаче {issue.key}: {e}")
-            raise
-
-# Функция для добавления вложений в задачу Яндекс Трекера
-def add_attachments_to_issue(tracker_client, issue, attachments):
-    for attachment in attachments:
-        try:
-            # Скачивание вложения из Asana
-            attachment_content = asana_client.attachments.find_by_id(attachment['gid'])['download_url']
-            attachment_filename = attachment['name']
-
-            # Загрузка вложения в Яндекс Трекер без сохранения во временный файл
-            tracker_client.issues[issue.key].attachments.upload(attachment_filename, content=attachment_content)
-            logger.info(f"Вложение {attachment_filename} успешно загружено для задачи {issue.key}.")
-        except Exception as e:
-            logger.error(f"Ошибка загрузки вложения {attachment['name']} для задачи {issue.key}: {e}")
-            raise
-
-# Функция для добавления связей между задачами в Яндекс Трекере
-def add_links_to_issue(tracker_client, issue, followers):
-    for follower in followers:
-        try:
-            tracker_client.issues[issue.key].followers.update(add=[follower])
-            logger.info(f"Связь типа 'follows' создана для задачи {issue.key} с пользователем {follower}.")
-        except Exception as e:
-            logger.error(f"Ошибка создания связи для задачи {issue.key}: {e}")
-            raise
-
-# Импорт данных в Яндекс Трекер
-def import_data_to_tracker(tracker_client, tracker_queues, tracker_issues, user_mapping):
-    created_queues = {}
-    created_users = set()
-
-    # Создание очередей
-    for tracker_queue in tracker_queues.values():
-        try:
-            queue = tracker_client.queues.get(tracker_queue["key"])
-            created_queues[tracker_queue["key"]] = queue
-            logger.info(f"Очередь {tracker_queue['name']} уже существует.")
-        except Exception:
-            try:
-                queue = tracker_client.queues.create(
-                    name=tracker_queue["name"],
-                    key=tracker_queue["key"]
-                )
-                created_queues[tracker_queue["key"]] = queue
-                logger.info(f"Создана очередь: {tracker_queue['name']}")
-            except Exception as e:
-                logger.error(f"Ошибка создания очереди {tracker_queue['name']}: {e}")
-                raise
-
-    # Создание задач
+    def __init__(self, asana_client, export_workers=EXPORT_WORKERS):
+        self.asana_client = asana_client
+        self.export_workers = export_workers
+
+    def projects(self):
+        return list(self.asana_client.projects.find_all())
+
+    def read(self, projects, since=None):
+        return stream_tasks_from_asana(self.asana_client, projects, self.export_workers, since)
+
+    def transform_projects(self, projects):
+        return transform_projects(projects)
+
+    def transform(self, items, user_mapping):
+        return (transform_task(task, user_mapping) for task in items)
+
+    def create_fields(self, tracker_issue):
+        return dict(status='open' if not tracker_issue.status else 'closed')
+
+    # Вложения скачиваются из Asana по ссылке download_url
+    def open_attachment(self, attachment):
+        return attachment['name'], attachment.get('size'), lambda url=attachment['download_url']: download_chunks(url)
+
+    def convert_markup(self, text):
+        return asana_to_markdown(text)
+
+# Импорт из снимка: задачи читаются из файла потоково и преобразуются по одной,
+# к Asana не обращаются (вложения скачиваются по ссылкам из снимка). Пользователи задач
+# без сопоставления перечисляются до импорта отдельным проходом по снимку.
+def run_snapshot_import(sink, user_mapping, snapshot_path):
+    with SnapshotReader(snapshot_path, "asana") as snapshot:
+        report_unmapped_users((transform_task(task, user_mapping) for task in snapshot.issues(progress=False)),
+                              user_mapping)
+    with SnapshotReader(snapshot_path, "asana") as snapshot:
+        tracker_queues = transform_projects(snapshot.projects)
+        tracker_issues = (transform_task(task, user_mapping) for task in snapshot.issues())
+        return sink.run(tracker_queues, tracker_issues, users_checked=True)
+
+# Учет наибольшей даты изменения задач по очередям (проектам Asana).
+# Asana отдает даты в UTC в одном формате, поэтому их можно сравнивать как строки.
+def track_watermarks(tracker_issues, watermarks):
     for tracker_issue in tracker_issues:
-        try:
-            queue_key = tracker_issue["queue"]
-            if queue_key not in created_queues:
-                logger.warning(f"Очередь {queue_key} не найдена. Пропускаем задачу {tracker_issue['summary']}.")
-                continue
-            
-            queue = created_queues[queue_key]
-            
-            # Проверка существования пользователей
-            assignee = tracker_issue["assignee"]
-            reporter = tracker_issue["reporter"]
-            if assignee and assignee not in created_users:
-                try:
-                    tracker_client.users.get(assignee)
-                    created_users.add(assignee)
-                    logger.info(f"Пользователь {assignee} найден в Яндекс Трекере.")
-                except Exception:
-                    logger.warning(f"Пользователь {assignee} не найден в Яндекс Трекере.")
-                    assignee = None
-            
-            if reporter and reporter not in created_users:
-                try:
-                    tracker_client.users.get(reporter)
-                    created_users.add(reporter)
-                    logger.info(f"Пользователь {reporter} найден в Яндекс Трекере.")
-                except Exception:
-                    logger.warning(f"Пользователь {reporter} не найден в Яндекс Трекере.")
-                    reporter = None
-
-            issue = tracker_client.issues.create(
-                queue=queue.key,
-                summary=tracker_issue["summary"],
-                description=tracker_issue["description"],
-                assignee=assignee,
-                author=reporter,
-                status='open' if not tracker_issue['status'] else 'closed'
-            )
-
-            # Добавление комментариев
-            if hasattr(tracker_issue, 'comments'):
-                add_comments_to_issue(tracker_client, issue, tracker_issue["comments"])
-
-            # Добавление вложений
-            if hasattr(tracker_issue, 'attachments'):
-                add_attachments_to_issue(tracker_client, issue, tracker_issue["attachments"])
-
-            # Добавление связей между задачами
-            if hasattr(tracker_issue, 'followers'):
-                add_links_to_issue(tracker_client, issue, tracker_issue["followers"])
-
-            logger.info(f"Задача {tracker_issue['summary']} успешно создана.")
-        except Exception as e:
-            logger.error(f"Ошибка создания задачи {tracker_issue['summary']}: {e}")
-            raise
+        updated, queue = tracker_issue.updated, tracker_issue.queue
+        if updated and queue and updated > watermarks.get(queue, ""):
+            watermarks[queue] = updated
+        yield tracker_issue
+
+# Дельта-синхронизация: из Asana выгружаются только задачи, измененные после прошлой
+# синхронизации проекта (дата хранится в журнале), новые задачи создаются, а уже
+# перенесенные обновляются по соответствию ключей из журнала. Даты в журнале сдвигаются
+# только после успешного импорта, поэтому при сбое изменения не теряются.
+def run_delta_sync(source, sink, user_mapping, journal):
+    projects = source.projects()
+    since = journal.get_watermarks()
+    logger.info(f"Дельта-синхронизация {len(projects)} проектов, из них синхронизировались ранее: {len(since)}.")
+
+    updated_marks = {}
+    tracker_issues = track_watermarks(stream_source(source, projects, user_mapping, since=since), updated_marks)
+    processed = sink.run(source.transform_projects(projects), tracker_issues, delta=True)
+    for project, updated in updated_marks.items():
+        journal.set_watermark(project, updated)
+    logger.info(f"Дельта-синхронизация завершена, обновлены отметки {len(updated_marks)} проектов.")
+    return processed
+
+# Сбор плана миграции без импорта. Список задач проекта с основными полями - дешевый
+# запрос (до PER_PAGE задач за раз), он дает точное число задач и пользователей.
+# Комментарии и вложения в Asana загружаются отдельными запросами по каждой задаче,
+# поэтому для оценки они загружаются только для первых sample задач проекта.
+def plan_migration(asana_client, sample=PLAN_SAMPLE, export_workers=EXPORT_WORKERS):
+    projects = list(asana_client.projects.find_all())
+    plan = MigrationPlan("asana")
+    plan.add_source_calls("projects")
+    with ThreadPoolExecutor(max_workers=max(export_workers, 1), thread_name_prefix="asana-plan") as executor:
+        for project in projects:
+            tasks = list(asana_client.tasks.find_by_project(project['gid'], fields=TASK_FIELDS, page_size=PER_PAGE))
+            plan.add_project(project['gid'], len(tasks))
+            plan.add_source_calls("tasks", max(math.ceil(len(tasks) / PER_PAGE), 1))
+            plan.add_source_calls("stories", len(tasks))
+            plan.add_source_calls("attachments", len(tasks))
+            for task in tasks:
+                plan.add_users((task.get('assignee') or {}).get('gid'), (task.get('created_by') or {}).get('gid'),
+                               *(follower['gid'] for follower in task.get('followers') or []))
+            for task in executor.map(lambda task: fetch_task_details(asana_client, task), tasks[:sample]):
+                plan.add_sample(project['gid'], len(task['stories']),
+                                [attachment.get('size') for attachment in task['attachments']])
+                plan.add_users(*((story.get('created_by') or {}).get('gid') for story in task['stories']))
+    plan.add_source_calls("attachment_download", plan.totals()["attachments"])
+    return plan
+
+# Разбор аргументов командной строки
+def parse_args():
+    parser = argparse.ArgumentParser(description="Миграция задач из Asana в Яндекс Трекер.")
+    parser.add_argument("command", nargs="?", choices=["migrate", "export", "import"], default="migrate",
+                        help="migrate - выгрузка и импорт за один запуск (по умолчанию), export - только выгрузка "
+                             "из Asana в снимок, import - импорт в Трекер из снимка.")
+    parser.add_argument("--snapshot", default=SNAPSHOT_FILE,
+                        help="Файл снимка для команд export и import (по умолчанию %(default)s).")
+    parser.add_argument("--delta", action="store_true",
+                        help="Дельта-синхронизация: переносить только задачи, измененные после прошлого запуска с --delta, "
+                             "и обновлять уже перенесенные задачи (требуется журнал).")
+    parser.add_argument("--plan", action="store_true",
+                        help="Только оценить миграцию: число задач, запросов к Яндекс Трекеру по типам, объем вложений "
+                             "и время импорта при заданных --rate-limit и числе потоков. В Трекер ничего не записывается.")
+    parser.add_argument("--plan-sample", type=int, default=PLAN_SAMPLE,
+                        help="Для скольких задач каждого проекта загружать комментарии и вложения для оценки (по умолчанию %(default)s).")
+    parser.add_argument("--plan-latency", type=float, default=PLAN_LATENCY,
+                        help="Ожидаемая задержка одного запроса к Яндекс Трекеру для оценки времени, секунд (по умолчанию %(default)s).")
+    parser.add_argument("--plan-output", help="Файл для сохранения плана в формате JSON.")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Количество потоков для параллельного создания задач (по умолчанию %(default)s).")
+    parser.add_argument("--export-workers", type=int, default=EXPORT_WORKERS,
+                        help="Количество потоков для выгрузки комментариев и вложений из Asana (по умолчанию %(default)s).")
+    parser.add_argument("--rate-limit", type=float, default=TRACKER_RATE_LIMIT,
+                        help="Максимальная частота запросов к Яндекс Трекеру, запросов в секунду (по умолчанию %(default)s, 0 - без ограничения).")
+    parser.add_argument("--max-retries", type=int, default=TRACKER_MAX_RETRIES,
+                        help="Количество повторов запроса к Яндекс Трекеру при ответах 429/5xx (по умолчанию %(default)s).")
+    parser.add_argument("--no-adaptive", action="store_true",
+                        help="Не снижать частоту и параллельность запросов при ответах 429.")
+    parser.add_argument("--async-io", action="store_true",
+                        help="Переносить задачи в Яндекс Трекер асинхронно (asyncio и aiohttp): одновременно выполняется "
+                             "до --async-concurrency запросов без потока на каждый; --workers и --comment-workers не используются.")
+    parser.add_argument("--async-concurrency", type=int, default=TRACKER_ASYNC_CONCURRENCY,
+                        help="Количество одновременных запросов и задач в работе в режиме --async-io (по умолчанию %(default)s).")
+    parser.add_argument("--attachment-workers", type=int, default=ATTACHMENT_WORKERS,
+                        help="Количество потоков для передачи вложений (по умолчанию %(default)s).")
+    parser.add_argument("--attachment-mb-in-flight", type=int, default=ATTACHMENT_MB_IN_FLIGHT,
+                        help="Суммарный размер одновременно передаваемых вложений, МБ (по умолчанию %(default)s).")
+    parser.add_argument("--comment-workers", type=int, default=COMMENT_WORKERS,
+                        help="Количество потоков для переноса комментариев; комментарии одной задачи переносятся "
+                             "по порядку (по умолчанию %(default)s).")
+    parser.add_argument("--no-markup", action="store_true",
+                        help="Не преобразовывать форматированный текст Asana (HTML) в описаниях и комментариях в разметку "
+                             "Яндекс Трекера (YFM).")
+    parser.add_argument("--http-pool-size", type=int, default=HTTP_POOL_SIZE,
+                        help="Размер пула HTTP-соединений каждого клиента (по умолчанию %(default)s - по числу потоков, "
+                             "которые обращаются к сервису).")
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help="Файл, в который периодически выводятся метрики строками JSON ('-' - stdout, "
+                             "где они смешиваются с выводом скрипта); по умолчанию метрики не выводятся.")
+    parser.add_argument("--metrics-prometheus", default=METRICS_PROMETHEUS_FILE,
+                        help="Текстовый файл метрик в формате Prometheus (по умолчанию не записывается).")
+    parser.add_argument("--metrics-interval", type=float, default=METRICS_INTERVAL,
+                        help="Период вывода метрик в секундах (по умолчанию %(default)s).")
+    parser.add_argument("--journal", default=JOURNAL_FILE,
+                        help="Файл журнала прогресса для возобновления миграции (по умолчанию %(default)s, пустая строка отключает).")
+    return parser.parse_args()
 
 # Основная функция
 def main():
+    args = parse_args()
     start_time = datetime.now()
     logger.info("Начало миграции данных из Asana в Яндекс Трекер.")
+    metrics.configure("asana", args.metrics_file, args.metrics_prometheus, args.metrics_interval,
+                      progress_stage="snapshot_write" if args.command == "export" else "issue")
 
+    journal = None
     try:
-        asana_client = init_asana_client(ASANA_ACCESS_TOKEN)
-        tracker_client = init_tracker_client(ORG_ID, CLOUD_ORG_ID, TOKEN)
+        asana_client = init_asana_client(ASANA_ACCESS_TOKEN, args.http_pool_size or args.export_workers + 1)
+        if args.command == "export":
+            exported = export_snapshot(asana_client, args.snapshot, args.export_workers)
+            logger.info(f"Выгрузка в снимок завершена за {(datetime.now() - start_time).total_seconds()} секунд, "
+                        f"выгружено {exported} задач.")
+            return
+        if args.plan:
+            plan = plan_migration(asana_client, args.plan_sample, args.export_workers)
+            report_plan(plan.estimate(read_user_mapping(USER_MAPPING_FILE, USER_MAPPING_KEYS), args.workers, args.attachment_workers,
+                                      args.comment_workers, args.rate_limit, args.plan_latency, PLAN_BANDWIDTH_MB),
+                        args.plan_output)
+            return
+
+        tracker_client = init_tracker_client(ORG_ID, CLOUD_ORG_ID, TOKEN, TRACKER_API_URL, args.rate_limit,
+                                             max(args.workers, 1) + args.attachment_workers + args.comment_workers,
+                                             args.max_retries, not args.no_adaptive, args.http_pool_size)
 
         if not asana_client or not tracker_client:
             logger.error("Не удалось инициализировать клиенты.")
             return
 
-        user_mapping = read_user_mapping(USER_MAPPING_FILE)
-        projects, tasks = export_data_from_asana(asana_client)
-        if not projects or not tasks:
-            logger.error("Не удалось получить данные из Asana.")
-            return
+        user_mapping = read_user_mapping(USER_MAPPING_FILE, USER_MAPPING_KEYS)
+        journal = open_journal(args.journal)
+        source = AsanaSource(asana_client, args.export_workers)
+        sink_class, sink_options = TrackerSink, {"workers": args.workers, "comment_workers": args.comment_workers}
+        if args.async_io:
+            # aiohttp нужен только в асинхронном режиме, поэтому модуль импортируется здесь
+            from tracker_async import AsyncTrackerSink
+            sink_class, sink_options = AsyncTrackerSink, {"concurrency": args.async_concurrency}
+        sink = sink_class(tracker_client, source, journal, attachment_workers=args.attachment_workers,
+                          attachment_mb_in_flight=args.attachment_mb_in_flight, markup=not args.no_markup,
+                          user_mapping=user_mapping, **sink_options)
+        if args.delta:
+            if not journal:
+                raise ValueError("Для дельта-синхронизации нужен журнал миграции (--journal).")
+            processed = run_delta_sync(source, sink, user_mapping, journal)
+        elif args.command == "import":
+            processed = run_snapshot_import(sink, user_mapping, args.snapshot)
+        else:
+            projects, tasks = export_data_from_asana(asana_client, args.export_workers)
+            if not projects or not tasks:
+                logger.error("Не удалось получить данные из Asana.")
+                return
 
-        tracker_queues, tracker_issues = transform_data(projects, tasks, user_mapping)
-        import_data_to_tracker(tracker_client, tracker_queues, tracker_issues, user_mapping)
+            tracker_queues, tracker_issues = transform_data(projects, tasks, user_mapping)
+            processed = sink.run(tracker_queues, tracker_issues)
 
         end_time = datetime.now()
         logger.info(f"Миграция завершена за {(end_time - start_time).total_seconds()} секунд.")
-        logger.info(f"Обработано {len(tracker_issues)} задач.")
+        logger.info(f"Обработано {processed} задач.")
+        log_throttle_stats(tracker_client)
+        log_session_stats("Asana", asana_client.session)
+        log_session_stats("Яндекс Трекером", tracker_client._connection.session)
     except Exception as e:
         logger.critical(f"Ошибка при выполнении миграции: {e}")
         raise
+    finally:
+        if journal:
+            journal.close()
+        metrics.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
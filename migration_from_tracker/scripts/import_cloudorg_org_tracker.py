@@ -1,13 +1,41 @@
-from yandex_tracker_client import TrackerClient
+from yandex_tracker_client.exceptions import NotFound
+from tracker_throttle import log_throttle_stats, backoff_delay
+from http_pool import log_session_stats
+from migration_engine import init_tracker_client
+from migration_metrics import metrics
+from tracker_users import UserCache
+from user_mapping_index import UserMapping
 import os
+import json
+import time
 import logging
-from collections import OrderedDict
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Конфигурация
-ORG_ID = ''  # Идентификатор обычной организации в Yandex Tracker
-CLOUD_ORG_ID = ''  # Идентификатор облачной организации в Yandex Cloud
-TOKEN = ''  # Токен для доступа к Yandex Tracker
+ORG_ID = os.getenv('ORG_ID', '')  # Идентификатор обычной организации в Yandex Tracker
+CLOUD_ORG_ID = os.getenv('CLOUD_ORG_ID', '')  # Идентификатор облачной организации в Yandex Cloud
+TOKEN = os.getenv('TOKEN', '')  # Токен для доступа к Yandex Tracker
+TRACKER_API_URL = os.getenv('TRACKER_API_URL', 'https://api.tracker.yandex.net')  # Адрес API Яндекс Трекера
 PER_PAGE = 1000  # Количество задач на странице
+TRACKER_RATE_LIMIT = float(os.getenv('TRACKER_RATE_LIMIT', '10'))  # Максимальная частота запросов к Яндекс Трекеру (запросов в секунду, 0 - без ограничения)
+TRACKER_MAX_RETRIES = int(os.getenv('TRACKER_MAX_RETRIES', '8'))  # Количество повторов запроса при 429/5xx
+WORKERS = int(os.getenv('WORKERS', '8'))  # Количество потоков для обновления задач
+UID_BATCH_SIZE = 100  # Количество UID в одном поисковом запросе
+SEARCH_RETRIES = int(os.getenv('SEARCH_RETRIES', '3'))  # Количество повторов поиска группы UID при ошибке (после них обработка останавливается)
+BULK_SIZE = 1000  # Максимальное количество задач в одной массовой операции
+BULK_POLL_INTERVAL = 2.0  # Интервал опроса статуса массовой операции, секунд
+MIGRATION_DIRECTION = os.getenv('MIGRATION_DIRECTION', '')  # Направление переноса: '1' - из обычной организации в облачную, '2' - обратно (пустое значение - спросить)
+BULK_TIMEOUT = float(os.getenv('BULK_TIMEOUT', '600'))  # Максимальное время ожидания массовой операции, секунд (после него задачи группы обновляются по одной)
+# Режим замены UID:
+# 'per-uid' - отдельные проходы для каждого UID (по умолчанию);
+# 'merged' - один проход по задачам сразу для всех UID из to.txt, одно объединенное обновление на задачу;
+# 'bulk' - тот же проход, но задачи с одинаковыми изменениями обновляются массовыми операциями (bulkchange)
+UPDATE_MODE = os.getenv('UPDATE_MODE', 'per-uid')
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '0'))  # Размер пула HTTP-соединений каждого клиента (0 - по числу потоков)
+METRICS_FILE = os.getenv('METRICS_FILE', '')  # Куда выводить метрики строками JSON (путь к файлу, '-' - stdout; по умолчанию не выводятся)
+METRICS_PROMETHEUS_FILE = os.getenv('METRICS_PROMETHEUS_FILE', '')  # Текстовый файл метрик в формате Prometheus
+METRICS_INTERVAL = float(os.getenv('METRICS_INTERVAL', '30'))  # Период вывода метрик, секунд
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -20,26 +48,10 @@ def write_to_file(file_path, content):
     except Exception as e:
         logging.error(f"Ошибка записи в файл {file_path}: {e}")
 
-# Функция для чтения данных из файла
-def read_file(file_path):
-    if not os.path.isfile(file_path):
-        logging.warning(f"Файл {file_path} не найден.")
-        return []
-    try:
-        with open(file_path, "r") as file:
-            return file.readlines()
-    except Exception as e:
-        logging.error(f"Ошибка чтения файла {file_path}: {e}")
-        return []
-
-# Инициализация клиента
+# Инициализация клиента (запросы проходят через ограничитель частоты с повторами)
 def init_client(org_id, cloud_org_id, token):
-    if org_id:
-        return TrackerClient(token=token, org_id=org_id)
-    elif cloud_org_id:
-        return TrackerClient(token=token, cloud_org_id=cloud_org_id)
-    else:
-        raise ValueError("Either ORG_ID or CLOUD_ORG_ID must be provided.")
+    return init_tracker_client(org_id, cloud_org_id, token, TRACKER_API_URL, TRACKER_RATE_LIMIT, WORKERS,
+                               TRACKER_MAX_RETRIES, pool_size=HTTP_POOL_SIZE)
 
 # Экспорт пользователей в файл from.txt
 def export_users(client, file_path):
@@ -111,12 +123,244 @@ def process_issues(client_from, client_to, old_uid, new_uid):
     logging.info("------ Задачи с подписчиками ------")
     update_issues("followers")
 
+# Идентификатор пользователя из ссылки в задаче
+def user_id(reference):
+    if not reference:
+        return None
+    user = reference.id if hasattr(reference, "id") else reference.get("id")
+    return str(user) if user is not None else None
+
+# Вычисление всех изменений задачи по словарю замен: исполнитель, автор и подписчики
+def compute_changes(issue, uid_mapping):
+    changes = {}
+    assignee = user_id(getattr(issue, "assignee", None))
+    if assignee in uid_mapping:
+        changes["assignee"] = uid_mapping[assignee]
+    author = user_id(getattr(issue, "createdBy", None))
+    if author in uid_mapping:
+        changes["author"] = uid_mapping[author]
+    followers = [user_id(follower) for follower in getattr(issue, "followers", None) or []]
+    replaced = [follower for follower in followers if follower in uid_mapping]
+    if replaced:
+        changes["followers"] = {
+            'add': [uid_mapping[follower] for follower in replaced],
+            'remove': replaced
+        }
+    return changes
+
+# Поиск задач, в которых любой из UID встречается в поле filter_key.
+# UID передаются в фильтре списком, поэтому один проход покрывает до UID_BATCH_SIZE пользователей.
+# Следующие страницы клиент загружает сам по ссылке next при переборе результата,
+# поэтому страницы не запрашиваются повторно по номеру. Если страницу загрузить не удалось,
+# поиск группы UID повторяется с начала (уже просмотренные задачи пропускает scan_changes),
+# а после SEARCH_RETRIES повторов ошибка останавливает обработку: иначе часть задач
+# осталась бы без замены, а запуск считался бы успешным.
+def find_issues_by_uids(client, filter_key, uids):
+    for start in range(0, len(uids), UID_BATCH_SIZE):
+        batch = uids[start:start + UID_BATCH_SIZE]
+        for attempt in range(SEARCH_RETRIES + 1):
+            try:
+                with metrics.timer("search_page"):
+                    issues = client.issues.find(filter={filter_key: batch}, per_page=PER_PAGE)
+                found = 0
+                for issue in issues:
+                    found += 1
+                    metrics.count("scanned_issues")
+                    yield issue
+                logging.info(f"Фильтр '{filter_key}', UID {start + 1}-{start + len(batch)}: найдено задач: {found}")
+                break
+            except Exception as e:
+                if attempt >= SEARCH_RETRIES:
+                    logging.error(f"Ошибка загрузки задач по фильтру '{filter_key}' для UID "
+                                  f"{start + 1}-{start + len(batch)}, обработка остановлена: {e}")
+                    raise
+                delay = backoff_delay(attempt)
+                logging.warning(f"Ошибка загрузки задач по фильтру '{filter_key}' для UID "
+                                f"{start + 1}-{start + len(batch)}: {e}. Повтор через {delay:.1f} с.")
+                time.sleep(delay)
+
+# Обновление одной задачи всеми изменениями сразу. Задача уже загружена поиском, поэтому
+# изменения отправляются одним PATCH по ключу, без повторного запроса задачи.
+def apply_changes(client_to, issue_key, changes):
+    connection = client_to._connection
+    try:
+        with metrics.timer("issue_update"):
+            connection.patch(path=f"/{connection.api_version}/issues/{issue_key}", data=changes)
+        logging.info(f"Задача {issue_key}: обновлены поля {', '.join(changes)}.")
+        return True
+    except Exception as e:
+        logging.error(f"Ошибка обновления задачи {issue_key}: {e}")
+        return False
+
+# Поиск задач сразу для всех UID из to.txt общими запросами по исполнителю, автору и подписчикам.
+# Для каждой задачи один раз вычисляются все изменения; задача, найденная несколькими
+# запросами, возвращается один раз. Ключи просмотренных задач добавляются в seen.
+def scan_changes(client_from, uid_mapping, seen):
+    uids = list(uid_mapping)
+    for filter_key in ("assignee", "createdBy", "followers"):
+        logging.info(f"------ Поиск задач по полю '{filter_key}' для {len(uids)} UID ------")
+        for issue in find_issues_by_uids(client_from, filter_key, uids):
+            if issue.key in seen:
+                continue
+            seen.add(issue.key)
+            changes = compute_changes(issue, uid_mapping)
+            if changes:
+                yield issue.key, changes
+
+# Замена сразу всех UID: все изменения задачи применяются одним обновлением пулом потоков
+def process_issues_merged(client_from, client_to, uid_mapping, workers=WORKERS):
+    seen = set()
+    stats = {"updated": 0, "failed": 0}
+    pending = set()
+
+    def collect(done):
+        for future in done:
+            stats["updated" if future.result() else "failed"] += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for issue_key, changes in scan_changes(client_from, uid_mapping, seen):
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(apply_changes, client_to, issue_key, changes))
+        collect(wait(pending).done)
+    logging.info(f"Просмотрено задач: {len(seen)}, обновлено: {stats['updated']}, с ошибкой: {stats['failed']}.")
+    return stats
+
+# Ожидание завершения массовой операции. Метод bulkchange.wait библиотеки перед опросом
+# статуса всегда делает десять запросов подряд, поэтому статус опрашивается здесь.
+# Если операция не завершилась за timeout секунд, выбрасывается TimeoutError.
+def wait_bulk_change(client_to, bulk, timeout=BULK_TIMEOUT, interval=BULK_POLL_INTERVAL):
+    deadline = time.monotonic() + timeout
+    while bulk.status not in ('COMPLETE', 'FAILED'):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"массовая операция {bulk.id} не завершилась за {timeout:g} с (статус {bulk.status})")
+        time.sleep(min(interval, remaining))
+        try:
+            bulk = client_to.bulkchange[bulk.id]
+        except NotFound:
+            logging.warning(f"Массовая операция {bulk.id} еще не найдена, повтор.")
+    return bulk
+
+# Ключи задач, которые массовая операция не смогла изменить. Если список ошибок
+# получить не удалось, а операция завершилась не полностью, неуспешными считаются все задачи.
+def bulk_failures(client_to, bulk, issue_keys):
+    if bulk.status == 'COMPLETE':
+        return []
+    connection = client_to._connection
+    try:
+        fails = connection.get(path=f"/{connection.api_version}/bulkchange/{bulk.id}/fails")
+        failed = set()
+        for fail in fails:
+            issue = fail.get("issue") if isinstance(fail, dict) else getattr(fail, "issue", None)
+            key = issue.get("key") if isinstance(issue, dict) else getattr(issue, "key", issue)
+            if key:
+                failed.add(str(key))
+        return [key for key in issue_keys if key in failed]
+    except Exception as e:
+        logging.warning(f"Не удалось получить ошибки массовой операции {bulk.id}: {e}")
+        return list(issue_keys)
+
+# Массовое изменение группы задач с одинаковыми изменениями: создание операции,
+# ожидание ее завершения и повтор по одной задаче только для неуспешных задач. Если
+# операция не завершилась за timeout секунд, по одной обновляются все задачи группы.
+@metrics.timed("bulk_change")
+def run_bulk_change(client_to, issue_keys, values, timeout=BULK_TIMEOUT):
+    stats = {"updated": 0, "failed": 0, "fallback": 0}
+    try:
+        bulk = client_to.bulkchange.update(issue_keys, **values)
+        bulk = wait_bulk_change(client_to, bulk, timeout)
+        failed = bulk_failures(client_to, bulk, issue_keys)
+        logging.info(f"Массовая операция {bulk.id} ({', '.join(values)}): статус {bulk.status}, "
+                     f"задач {len(issue_keys)}, неуспешных {len(failed)}.")
+    except TimeoutError as e:
+        logging.warning(f"Ожидание прервано: {e}. Задачи группы ({len(issue_keys)}) будут обновлены по одной.")
+        failed = list(issue_keys)
+    except Exception as e:
+        logging.error(f"Ошибка массовой операции для {len(issue_keys)} задач: {e}")
+        failed = list(issue_keys)
+    stats["updated"] = len(issue_keys) - len(failed)
+    metrics.count("bulk_updated_issues", stats["updated"])
+    for issue_key in failed:
+        stats["fallback"] += 1
+        stats["updated" if apply_changes(client_to, issue_key, values) else "failed"] += 1
+    return stats
+
+# Изменения задачи, разбитые на операции для массового изменения: поле и значение.
+# Замена подписчиков разбивается по одному заменяемому UID (add нового, remove старого),
+# чтобы задачи с разными наборами подписчиков попадали в общие группы.
+def bulk_operations(changes):
+    for field, value in changes.items():
+        if field == "followers":
+            for old_uid, new_uid in zip(value['remove'], value['add']):
+                yield field, {'add': [new_uid], 'remove': [old_uid]}
+        else:
+            yield field, value
+
+# Замена сразу всех UID массовыми операциями. Изменения задачи разбиваются на операции
+# (bulk_operations), задачи с одинаковой операцией собираются в группы до BULK_SIZE задач, и каждая
+# заполненная группа сразу отправляется массовой операцией. Статусы операций опрашиваются
+# пулом потоков параллельно с поиском задач.
+def process_issues_bulk(client_from, client_to, uid_mapping, workers=WORKERS, bulk_timeout=BULK_TIMEOUT):
+    seen = set()
+    groups = {}
+    stats = {"updated": 0, "failed": 0, "fallback": 0, "jobs": 0}
+    pending = set()
+
+    def collect(done):
+        for future in done:
+            for key, value in future.result().items():
+                stats[key] += value
+
+    def submit(issue_keys, values):
+        nonlocal pending
+        if len(pending) >= workers * 2:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+        stats["jobs"] += 1
+        pending.add(executor.submit(run_bulk_change, client_to, issue_keys, values, bulk_timeout))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for issue_key, changes in scan_changes(client_from, uid_mapping, seen):
+            for field, value in bulk_operations(changes):
+                group = json.dumps([field, value], sort_keys=True)
+                issue_keys = groups.setdefault(group, [])
+                issue_keys.append(issue_key)
+                if len(issue_keys) >= BULK_SIZE:
+                    submit(groups.pop(group), {field: value})
+        for group, issue_keys in groups.items():
+            field, value = json.loads(group)
+            submit(issue_keys, {field: value})
+        collect(wait(pending).done)
+    logging.info(f"Просмотрено задач: {len(seen)}, массовых операций: {stats['jobs']}, "
+                 f"изменений применено: {stats['updated']}, из них по одной задаче: {stats['fallback']}, "
+                 f"с ошибкой: {stats['failed']}.")
+    return stats
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Замена UID пользователей в задачах при переносе между организациями Яндекс Трекера.")
+    parser.add_argument("--direction", choices=["1", "2"], default=MIGRATION_DIRECTION or None,
+                        help="Направление переноса без вопроса в консоли: 1 - из обычной организации в облачную, "
+                             "2 - из облачной в обычную (нужно при запуске без терминала, например заданием веб-интерфейса).")
+    parser.add_argument("--bulk-timeout", type=float, default=BULK_TIMEOUT,
+                        help="Максимальное время ожидания одной массовой операции в режиме UPDATE_MODE=bulk, секунд "
+                             "(по умолчанию %(default)s); после него задачи группы обновляются по одной.")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    choice = args.direction
     while True:
-        print("Выберите источник и цель:")
-        print("1. Из обычной организации в облачную")
-        print("2. Из облачной организации в обычную")
-        choice = input("Введите ваш выбор (1/2): ")
+        if not choice:
+            print("Выберите источник и цель:")
+            print("1. Из обычной организации в облачную")
+            print("2. Из облачной организации в обычную")
+            try:
+                choice = input("Введите ваш выбор (1/2): ")
+            except EOFError:
+                logging.error("Направление переноса не задано: укажите --direction 1|2 или MIGRATION_DIRECTION.")
+                raise SystemExit(2)
         if choice == '1':
             source_client = init_client(ORG_ID, None, TOKEN)
             target_client = init_client(None, CLOUD_ORG_ID, TOKEN)
@@ -127,6 +371,7 @@ def main():
             break
         else:
             logging.warning("Неверный выбор. Пожалуйста, выберите 1 или 2.")
+            choice = None
 
     # Экспорт пользователей из источника
     export_users(source_client, "from.txt")
@@ -135,25 +380,33 @@ def main():
     if not os.path.isfile("to.txt"):
         logging.error("Файл 'to.txt' не найден. Создайте файл и добавьте UID для замены.")
         return
-    lines = read_file("to.txt")
-    if not lines:
+    # Файл читается построчно, повторяющиеся UID учитываются один раз
+    uid_mapping = UserMapping("to.txt")
+    if not uid_mapping:
         logging.warning("Файл 'to.txt' пуст. Ничего не будет обработано.")
         return
-
-    # Удаление дубликатов в файле to.txt с сохранением порядка
-    unique_lines = list(OrderedDict.fromkeys(lines))
-    if len(unique_lines) != len(lines):
-        logging.warning("Дублирующиеся строки в файле 'to.txt' были удалены.")
-        lines = unique_lines
+    # Новые UID, которых нет в целевой организации, перечисляются до начала обработки задач
+    uid_mapping.check_targets(UserCache(target_client))
 
     # Обработка задач из файла to.txt
-    for line in lines:
-        line = line.partition("#")[0].strip()
-        parts = line.split(" ")
-        if len(parts) >= 2 and parts[1]:
-            old_uid, new_uid = parts[0], parts[1]
-            logging.info(f"Обработка задач для замены UID: {old_uid} -> {new_uid}")
-            process_issues(source_client, target_client, old_uid, new_uid)
+    metrics.configure("cloudorg", METRICS_FILE, METRICS_PROMETHEUS_FILE, METRICS_INTERVAL,
+                      progress_stage="bulk_change" if UPDATE_MODE == 'bulk' else "issue_update")
+    try:
+        if UPDATE_MODE == 'bulk':
+            logging.info(f"Замена {len(uid_mapping)} UID массовыми операциями по {BULK_SIZE} задач.")
+            process_issues_bulk(source_client, target_client, uid_mapping, bulk_timeout=args.bulk_timeout)
+        elif UPDATE_MODE == 'merged':
+            logging.info(f"Замена {len(uid_mapping)} UID объединенными обновлениями в {WORKERS} потоков.")
+            process_issues_merged(source_client, target_client, uid_mapping)
+        else:
+            for old_uid, new_uid in uid_mapping.items():
+                logging.info(f"Обработка задач для замены UID: {old_uid} -> {new_uid}")
+                process_issues(source_client, target_client, old_uid, new_uid)
+    finally:
+        metrics.close()
+    log_throttle_stats(target_client)
+    log_session_stats("исходной организацией", source_client._connection.session)
+    log_session_stats("целевой организацией", target_client._connection.session)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,11 +1,25 @@
 import os
 import logging
-import csv
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+import math
+import argparse
 from jira import JIRA
-from yandex_tracker_client import TrackerClient
-import tempfile
+from jira.resources import Project
+from tracker_throttle import log_throttle_stats
+from http_pool import configure_session, log_session_stats
+from migration_journal import open_journal
+from attachment_transfer import CHUNK_SIZE
+from markup_converter import jira_to_markdown
+from migration_engine import (SourceAdapter, TrackerSink, TrackerIssue, TrackerComment, init_tracker_client,
+                              read_user_mapping, report_unmapped_users, pipeline_stage, process_stage,
+                              stream_source)
+from migration_metrics import metrics
+from migration_snapshot import SnapshotWriter, SnapshotReader
+from migration_plan import MigrationPlan, report_plan
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 
 # Загрузка переменных окружения из файла .env
 load_dotenv()
@@ -17,87 +31,185 @@ JIRA_API_TOKEN = os.getenv('JIRA_API_TOKEN')
 ORG_ID = os.getenv('ORG_ID')  # Идентификатор обычной организации в Yandex Tracker
 CLOUD_ORG_ID = os.getenv('CLOUD_ORG_ID')  # Идентификатор облачной организации в Yandex Cloud
 TOKEN = os.getenv('TOKEN')  # Токен для доступа к Yandex Tracker
+TRACKER_API_URL = os.getenv('TRACKER_API_URL', 'https://api.tracker.yandex.net')  # Адрес API Яндекс Трекера
 PER_PAGE = 1000  # Количество задач на странице
-USER_MAPPING_FILE = 'user_mapping.csv'  # Файл для сопоставления пользователей
+# Поля задач Jira, которые используются при преобразовании (остальные не запрашиваются)
+EXPORT_FIELDS = ["summary", "description", "assignee", "reporter", "status", "project", "comment",
+                 "priority", "created", "updated", "labels", "attachment", "issuelinks"]
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '1'))  # Количество потоков для выгрузки из Jira
+SHARD_SIZE = int(os.getenv('SHARD_SIZE', '0'))  # Делить проекты больше указанного числа задач по дате создания (0 - не делить)
+# Соответствие типов связей Jira (по направлению outward) типам связей Яндекс Трекера
+LINK_TYPES = {
+    "Blocks": "is dependent by",
+    "Duplicate": "duplicates",
+}
+DEFAULT_LINK_TYPE = 'relates'
+USER_MAPPING_FILE = os.getenv('USER_MAPPING_FILE', 'user_mapping.csv')  # Файл для сопоставления пользователей (CSV или SQLite)
+# Столбцы ключей пользователя Jira в файле сопоставления, по порядку проверки
+USER_MAPPING_KEYS = ['jira_user', 'jira_account_id', 'email']
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '1000'))  # Размер очереди между этапами конвейера
+WORKERS = int(os.getenv('WORKERS', '1'))  # Количество потоков для параллельного создания задач
+TRACKER_RATE_LIMIT = float(os.getenv('TRACKER_RATE_LIMIT', '10'))  # Максимальная частота запросов к Яндекс Трекеру (запросов в секунду)
+TRACKER_MAX_RETRIES = int(os.getenv('TRACKER_MAX_RETRIES', '8'))  # Количество повторов запроса при 429/5xx
+ATTACHMENT_WORKERS = int(os.getenv('ATTACHMENT_WORKERS', '4'))  # Количество потоков для передачи вложений
+ATTACHMENT_MB_IN_FLIGHT = int(os.getenv('ATTACHMENT_MB_IN_FLIGHT', '256'))  # Суммарный размер одновременно передаваемых вложений, МБ
+TRANSFORM_WORKERS = int(os.getenv('TRANSFORM_WORKERS', '1'))  # Количество процессов для преобразования задач (1 - без отдельных процессов)
+COMMENT_WORKERS = int(os.getenv('COMMENT_WORKERS', '8'))  # Количество потоков для переноса комментариев
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '0'))  # Размер пула HTTP-соединений каждого клиента (0 - по числу потоков)
+TRACKER_ASYNC_CONCURRENCY = int(os.getenv('TRACKER_ASYNC_CONCURRENCY', '256'))  # Количество одновременных запросов к Яндекс Трекеру в режиме --async-io
+METRICS_FILE = os.getenv('METRICS_FILE', '')  # Куда выводить метрики строками JSON (путь к файлу, '-' - stdout; по умолчанию не выводятся)
+METRICS_PROMETHEUS_FILE = os.getenv('METRICS_PROMETHEUS_FILE', '')  # Текстовый файл метрик в формате Prometheus
+METRICS_INTERVAL = float(os.getenv('METRICS_INTERVAL', '30'))  # Период вывода метрик, секунд
+DELTA_TZ_MARGIN = 14  # Запас, часов, если часовой пояс пользователя Jira неизвестен (дельта-синхронизация)
+JOURNAL_FILE = os.getenv('JOURNAL_FILE', 'jira_journal.db')  # Журнал прогресса для возобновления миграции (пустое значение отключает)
+SNAPSHOT_FILE = os.getenv('SNAPSHOT_FILE', 'jira_snapshot.jsonl.gz')  # Файл снимка выгрузки для команд export и import
+PLAN_SAMPLE = int(os.getenv('PLAN_SAMPLE', '100'))  # Размер выборки задач проекта для оценки комментариев и вложений (--plan)
+PLAN_LATENCY = float(os.getenv('PLAN_LATENCY', '0.3'))  # Ожидаемая задержка запроса к Яндекс Трекеру, секунд (--plan)
+PLAN_BANDWIDTH_MB = float(os.getenv('PLAN_BANDWIDTH_MB', '10'))  # Ожидаемая скорость передачи вложений, МБ/с (--plan)
+# Поля задач, которые запрашиваются для выборки при планировании
+PLAN_FIELDS = ["assignee", "reporter", "comment", "attachment", "issuelinks"]
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# Функция для инициализации клиента Jira
-def init_jira_client(url, user, api_token):
+# Функция для инициализации клиента Jira.
+# get_server_info=False не обращается к серверу при создании (клиент нужен только для скачивания вложений).
+# Пул соединений рассчитан на pool_size потоков (выгрузка страниц и скачивание вложений).
+def init_jira_client(url, user, api_token, get_server_info=True, pool_size=1):
     try:
-        jira_client = JIRA(server=url, basic_auth=(user, api_token))
+        jira_client = JIRA(server=url, basic_auth=(user, api_token), get_server_info=get_server_info)
+        configure_session(jira_client._session, pool_size)
         logger.info("Jira client initialized successfully.")
         return jira_client
     except Exception as e:
         logger.error(f"Ошибка инициализации клиента Jira: {e}")
         raise
 
-# Функция для инициализации клиента Яндекс Трекера
-def init_tracker_client(org_id, cloud_org_id, token):
-    if not org_id and not cloud_org_id:
-        logger.error("Необходимо указать либо ORG_ID, либо CLOUD_ORG_ID.")
-        raise ValueError("Необходимо указать либо ORG_ID, либо CLOUD_ORG_ID.")
-    if org_id:
-        logger.info(f"Используется обычная организация с ID: {org_id}")
-        return TrackerClient(token=token, org_id=org_id)
-    elif cloud_org_id:
-        logger.info(f"Используется облачная организация с ID: {cloud_org_id}")
-        return TrackerClient(token=token, cloud_org_id=cloud_org_id)
-
-# Чтение файла сопоставления пользователей
-def read_user_mapping(file_path):
-    if not os.path.isfile(file_path):
-        logger.error(f"Файл сопоставления пользователей {file_path} не найден.")
-        raise FileNotFoundError(f"Файл сопоставления пользователей {file_path} не найден.")
-    try:
-        with open(file_path, "r") as file:
-            reader = csv.DictReader(file)
-            if 'jira_user' not in reader.fieldnames or 'tracker_user' not in reader.fieldnames:
-                logger.error(f"Файл {file_path} не содержит необходимых столбцов.")
-                raise ValueError(f"Файл {file_path} не содержит необходимых столбцов.")
-            user_mapping = {}
-            for row in reader:
-                if row['jira_user'] in user_mapping:
-                    logger.warning(f"Дублирующийся UID пользователя {row['jira_user']} в файле {file_path}.")
-                user_mapping[row['jira_user']] = row['tracker_user']
-        logger.info("Файл сопоставления пользователей загружен успешно.")
-        return user_mapping
-    except Exception as e:
-        logger.error(f"Ошибка чтения файла сопоставления пользователей {file_path}: {e}")
-        raise
+# Загрузка одной страницы задач из Jira с учетом в метриках
+def search_page(jira_client, jql_query, start_at, per_page):
+    with metrics.timer("export_page"):
+        page = jira_client.search_issues(jql_query, startAt=start_at, maxResults=per_page, fields=EXPORT_FIELDS)
+    if start_at == 0:
+        metrics.add_total(page.total)
+    metrics.count("exported_issues", len(page))
+    return page
 
-# Пагинация для получения задач из Jira
+# Пагинация для получения задач из Jira (страницы отдаются по мере загрузки).
+# Смещение увеличивается на размер полученной страницы, так как сервер может
+# ограничить maxResults меньшим значением, чем запрошено.
 def fetch_issues_with_pagination(jira_client, jql_query, per_page=1000):
-    issues = []
     start_at = 0
     while True:
-        batch = jira_client.search_issues(jql_query, startAt=start_at, maxResults=per_page)
-        issues.extend(batch)
-        if len(batch) < per_page:
+        batch = search_page(jira_client, jql_query, start_at, per_page)
+        yield batch
+        start_at += len(batch)
+        if not batch or start_at >= batch.total:
             break
-        start_at += per_page
-    logger.info(f"Получено {len(issues)} задач из Jira.")
-    return issues
+    logger.info(f"Получено {start_at} задач из Jira по запросу {jql_query}.")
+
+# Разбор даты Jira вида 2024-01-31T10:15:00.000+0300
+def parse_jira_datetime(value):
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z")
+
+# Базовый JQL-запрос проекта. since - даты в формате JQL по ключам проектов:
+# при дельта-синхронизации выгружаются только задачи, обновленные не раньше этой даты.
+def project_query(project_key, since=None):
+    jql_query = f'project = "{project_key}"'
+    if since and since.get(project_key):
+        jql_query += f' AND updated >= "{since[project_key]}"'
+    return jql_query
+
+# Построение JQL-запросов для проекта. Если в проекте больше shard_size задач,
+# он делится на непересекающиеся диапазоны по дате создания, чтобы крупные проекты
+# выгружались параллельно независимыми запросами без глубокой пагинации.
+def plan_project_queries(jira_client, project_key, shard_size, since=None):
+    jql_query = project_query(project_key, since)
+    if not shard_size:
+        return [jql_query]
+    first = jira_client.search_issues(f"{jql_query} ORDER BY created ASC", maxResults=1, fields=["created"])
+    if first.total <= shard_size:
+        return [jql_query]
+    last = jira_client.search_issues(f"{jql_query} ORDER BY created DESC", maxResults=1, fields=["created"])
+    created_from = parse_jira_datetime(first[0].fields.created)
+    created_to = parse_jira_datetime(last[0].fields.created)
+    shards = math.ceil(first.total / shard_size)
+    step = (created_to - created_from) / shards
+    # JQL сравнивает даты с точностью до минуты, поэтому совпадающие границы отбрасываются
+    bounds = sorted({(created_from + step * i).strftime("%Y/%m/%d %H:%M") for i in range(1, shards)})
+    if not bounds:
+        return [jql_query]
+    queries = [f'{jql_query} AND created < "{bounds[0]}"']
+    for lower, upper in zip(bounds, bounds[1:]):
+        queries.append(f'{jql_query} AND created >= "{lower}" AND created < "{upper}"')
+    queries.append(f'{jql_query} AND created >= "{bounds[-1]}"')
+    logger.info(f"Проект {project_key} ({first.total} задач) разделен на {len(queries)} частей по дате создания.")
+    return queries
+
+# Параллельная выгрузка страниц из Jira. Пул потоков одновременно планирует запросы
+# по проектам и загружает страницы с разными смещениями; после первой страницы запроса
+# известен общий объем, и остальные смещения ставятся в очередь. Число задач в работе
+# ограничено, чтобы не загружать страницы быстрее, чем их успевают обработать.
+def fetch_pages_concurrently(jira_client, projects, per_page, workers, shard_size, since=None):
+    backlog = deque(("plan", project.key, None) for project in projects)
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jira-export") as executor:
+        try:
+            while backlog or pending:
+                while backlog and len(pending) < workers * 2:
+                    kind, target, start_at = backlog.popleft()
+                    if kind == "plan":
+                        future = executor.submit(plan_project_queries, jira_client, target, shard_size, since)
+                    else:
+                        future = executor.submit(search_page, jira_client, target, start_at, per_page)
+                    pending[future] = (kind, target, start_at)
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, target, start_at = pending.pop(future)
+                    if kind == "plan":
+                        backlog.extendleft(("page", jql_query, 0) for jql_query in reversed(future.result()))
+                        continue
+                    page = future.result()
+                    if start_at == 0 and page:
+                        # Оставшиеся страницы запроса загружаются до перехода к следующим проектам
+                        offsets = range(len(page), page.total, len(page))
+                        backlog.extendleft(("page", target, offset) for offset in reversed(offsets))
+                        logger.info(f"Запрос {target}: {page.total} задач.")
+                    yield page
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
 
 # Экспорт данных из Jira
-def export_data_from_jira(jira_client):
+def export_data_from_jira(jira_client, export_workers=1, shard_size=0):
     try:
         projects = jira_client.projects()
-        issues = []
-        for project in projects:
-            issues.extend(fetch_issues_with_pagination(jira_client, f'project = "{project.key}"'))
+        issues = list(stream_issues_from_jira(jira_client, projects, export_workers, shard_size))
         logger.info(f"Экспорт данных из Jira завершен: {len(projects)} проектов, {len(issues)} задач.")
         return projects, issues
     except Exception as e:
         logger.error(f"Ошибка экспорта данных из Jira: {e}")
         raise
 
-# Преобразование данных из Jira в формат Яндекс Трекера
-def transform_data(projects, issues, user_mapping):
+# Потоковый экспорт задач из Jira: задачи отдаются по одной, без накопления всего списка
+def stream_issues_from_jira(jira_client, projects, export_workers=1, shard_size=0, since=None):
+    try:
+        if export_workers > 1 or shard_size:
+            for page in fetch_pages_concurrently(jira_client, projects, PER_PAGE, max(export_workers, 1), shard_size,
+                                                 since):
+                yield from page
+            return
+        for project in projects:
+            for page in fetch_issues_with_pagination(jira_client, project_query(project.key, since), PER_PAGE):
+                yield from page
+    except Exception as e:
+        logger.error(f"Ошибка экспорта данных из Jira: {e}")
+        raise
+
+# Преобразование проектов Jira в очереди Яндекс Трекера
+def transform_projects(projects):
     tracker_queues = {}
-    tracker_issues = []
     for project in projects:
         queue_key = project.key
         tracker_queue = {
@@ -105,215 +217,375 @@ def transform_data(projects, issues, user_mapping):
             "key": queue_key,
         }
         tracker_queues[queue_key] = tracker_queue
-    
-    for issue in issues:
-        assignee_key = issue.fields.assignee.key if hasattr(issue.fields, 'assignee') and issue.fields.assignee else None
-        reporter_key = issue.fields.reporter.key if hasattr(issue.fields, 'reporter') and issue.fields.reporter else None
-        
-        # Сопоставление пользователей
-        assignee_key = user_mapping.get(assignee_key, assignee_key)
-        reporter_key = user_mapping.get(reporter_key, reporter_key)
-        
-        tracker_issue = {
-            "summary": issue.fields.summary,
-            "description": issue.fields.description,
-            "assignee": assignee_key,
-            "reporter": reporter_key,
-            "status": issue.fields.status.name if hasattr(issue.fields, 'status') else None,
-            "queue": issue.fields.project.key,
-            "comments": [{"author": comment.author.key if hasattr(comment, 'author') and comment.author else None, "body": comment.body} 
-                         for comment in issue.fields.comment.comments] if hasattr(issue.fields, 'comment') else [],
-            "priority": issue.fields.priority.name if hasattr(issue.fields, 'priority') else None,
-            "created": issue.fields.created if hasattr(issue.fields, 'created') else None,
-            "updated": issue.fields.updated if hasattr(issue.fields, 'updated') else None,
-            "labels": [label for label in issue.fields.labels] if hasattr(issue.fields, 'labels') else [],
-            "attachments": issue.fields.attachment if hasattr(issue.fields, 'attachment') else [],
-            "links": issue.fields.issuelinks if hasattr(issue.fields, 'issuelinks') else []
-        }
-        tracker_issues.append(tracker_issue)
-    
+    return tracker_queues
+
+# Преобразование связей задачи Jira (исходный JSON поля issuelinks) в пары
+# (ключ связанной задачи, тип связи в Трекере).
+# Каждая связь Jira есть у обеих задач, поэтому берется только исходящая сторона.
+def transform_links(issuelinks):
+    links = []
+    for link in issuelinks:
+        outward = link.get('outwardIssue')
+        if outward is None:
+            continue
+        link_type = link.get('type') or {}
+        links.append((outward['key'], LINK_TYPES.get(link_type.get('name'), DEFAULT_LINK_TYPE)))
+    return links
+
+# Ключ пользователя Jira (исходный JSON пользователя): key в Jira Server, accountId в Jira Cloud,
+# или None, если пользователь не указан
+def user_key(user):
+    return (user.get('key') or user.get('accountId')) if user else None
+
+# Пользователь Трекера для пользователя Jira по сопоставлению: проверяются все известные
+# ключи пользователя (key, accountId, email); без сопоставления остается ключ Jira
+def map_user(user, user_mapping):
+    key = user_key(user)
+    if key is None:
+        return None
+    return user_mapping.find(key, user.get('accountId'), user.get('emailAddress')) or key
+
+# Преобразование одной задачи Jira (исходный JSON задачи, issue.raw) в формат Яндекс Трекера.
+# Функция работает только со словарями и не обращается к сети, поэтому ее можно выполнять
+# в отдельных процессах (--transform-workers).
+def transform_issue(raw, user_mapping):
+    fields = raw['fields']
+    comment = fields.get('comment')
+    status, priority = fields.get('status'), fields.get('priority')
+
+    return TrackerIssue(
+        source_key=raw['key'],
+        queue=fields['project']['key'],
+        summary=fields['summary'],
+        description=fields.get('description'),
+        assignee=map_user(fields.get('assignee'), user_mapping),
+        reporter=map_user(fields.get('reporter'), user_mapping),
+        status=status['name'] if status else None,
+        priority=priority['name'] if priority else None,
+        created=fields.get('created'),
+        updated=fields.get('updated'),
+        labels=fields.get('labels') or [],
+        comments=[TrackerComment(map_user(item.get('author'), user_mapping), item['body'])
+                  for item in comment['comments']] if comment else [],
+        attachments=fields.get('attachment') or [],
+        links=transform_links(fields.get('issuelinks') or []),
+    )
+
+# Потоковое преобразование задач (исходный JSON) по одной по мере поступления или,
+# при workers > 1, порциями в пуле процессов с сохранением порядка
+def transform_issues(raw_issues, user_mapping, workers=1):
+    if workers > 1:
+        yield from process_stage(raw_issues, transform_issue, user_mapping, workers)
+        return
+    for raw in raw_issues:
+        with metrics.timer("transform"):
+            tracker_issue = transform_issue(raw, user_mapping)
+        yield tracker_issue
+
+# Преобразование данных из Jira в формат Яндекс Трекера
+def transform_data(projects, issues, user_mapping, workers=1):
+    tracker_queues = transform_projects(projects)
+    tracker_issues = list(transform_issues((issue.raw for issue in issues), user_mapping, workers))
     logger.info(f"Преобразовано {len(tracker_issues)} задач в формат Яндекс Трекера.")
     return tracker_queues, tracker_issues
 
-# Функция для создания задачи в Яндекс Трекере
-def create_issue(tracker_client, tracker_issue, queue):
-    try:
-        issue = tracker_client.issues.create(
-            queue=queue.key,
-            summary=tracker_issue["summary"],
-            description=tracker_issue["description"],
-            assignee=tracker_issue["assignee"],
-            author=tracker_issue["reporter"],
-            status=tracker_issue["status"],
-            priority=tracker_issue.get("priority"),
-            created=tracker_issue.get("created"),
-            updated=tracker_issue.get("updated"),
-            tags=tracker_issue.get("labels", [])
+# Источник Jira для общего импорта в Трекер (migration_engine)
+class JiraSource(SourceAdapter):
+    name = "jira"
+
+    def __init__(self, jira_client, export_workers=1, shard_size=0, transform_workers=1):
+        self.jira_client = jira_client
+        self.export_workers = export_workers
+        self.shard_size = shard_size
+        self.transform_workers = transform_workers
+
+    def projects(self):
+        return self.jira_client.projects()
+
+    def read(self, projects, since=None):
+        return stream_issues_from_jira(self.jira_client, projects, self.export_workers, self.shard_size, since)
+
+    def transform_projects(self, projects):
+        return transform_projects(projects)
+
+    # Задачи преобразуются из исходного JSON (issue.raw или строки снимка)
+    def transform(self, items, user_mapping):
+        raw_issues = (item if isinstance(item, dict) else item.raw for item in items)
+        return transform_issues(raw_issues, user_mapping, self.transform_workers)
+
+    def create_fields(self, tracker_issue):
+        return dict(
+            status=tracker_issue.status,
+            priority=tracker_issue.priority,
+            created=tracker_issue.created,
+            updated=tracker_issue.updated,
+            tags=tracker_issue.labels
         )
-        logger.info(f"Задача {tracker_issue['summary']} создана успешно в очереди {queue.key}.")
-        return issue
-    except Exception as e:
-        logger.error(f"Ошибка создания задачи {tracker_issue['summary']} в очереди {queue.key}: {e}")
-        raise
 
-# Функция для добавления комментариев в задачу Яндекс Трекера
-def add_comments_to_issue(tracker_client, issue, comments):
-    for comment in comments:
-        comment_author = comment["author"]
-        if comment_author:
-            try:
-                tracker_client.users.get(comment_author)
-                logger.info(f"Пользователь {comment_author} найден в Яндекс Трекере.")
-            except Exception:
-                logger.warning(f"Пользователь {comment_author} не найден в Яндекс Трекере.")
-                comment_author = None
-        try:
-            tracker_client.issues[issue.key].comments.create(text=comment["body"], author=comment_author)
-            logger.info(f"Комментарий успешно добавлен к задаче {issue.key}.")
-        except Exception as e:
-            logger.error(f"Ошибка добавления комментария к задаче {issue.key}: {e}")
-            raise
+    def update_fields(self, tracker_issue):
+        return dict(priority=tracker_issue.priority, tags=tracker_issue.labels)
 
-# Функция для добавления вложений в задачу Яндекс Трекера
-def add_attachments_to_issue(tracker_client, issue, attachments):
-    for attachment in attachments:
-        try:
-            # Скачивание вложения из Jira
-            attachment_content = attachment.get()
-            attachment_filename = attachment.filename
-
-            # Загрузка вложения в Яндекс Трекер без сохранения во временный файл
-            tracker_client.issues[issue.key].attachments.upload(attachment_filename, content=attachment_content)
-            logger.info(f"Вложение {attachment_filename} успешно загружено для задачи {issue.key}.")
-        except Exception as e:
-            logger.error(f"Ошибка загрузки вложения {attachment.filename} для задачи {issue.key}: {e}")
-            raise
+    # Вложение Jira (исходный JSON) скачивается потоково через сессию клиента Jira
+    def open_attachment(self, attachment):
+        def open_chunks():
+            response = self.jira_client._session.get(attachment['content'], stream=True)
+            response.raise_for_status()
+            return response.iter_content(CHUNK_SIZE)
+        return attachment['filename'], attachment.get('size'), open_chunks
 
-# Функция для добавления связей между задачами в Яндекс Трекере
-def add_links_to_issue(tracker_client, issue, links):
-    for link in links:
-        try:
-            linked_issue_key = link.outwardIssue.key if hasattr(link, 'outwardIssue') else link.inwardIssue.key
-            linked_issue = tracker_client.issues.get(linked_issue_key)
-            link_type = 'relates'  # или другой тип связи
-            tracker_client.issues[issue.key].links.create(type=link_type, target=linked_issue.key)
-            logger.info(f"Связь типа {link_type} создана для задачи {issue.key} с задачей {linked_issue.key}.")
-        except Exception as e:
-            logger.error(f"Ошибка создания связи для задачи {issue.key}: {e}")
-            raise
+    def convert_markup(self, text):
+        return jira_to_markdown(text)
+
+# Выгрузка проектов и задач Jira в снимок без импорта в Трекер.
+# Задачи записываются по мере выгрузки, поэтому весь список не держится в памяти.
+def export_snapshot(jira_client, snapshot_path, export_workers=1, shard_size=0):
+    projects = jira_client.projects()
+    with SnapshotWriter(snapshot_path, "jira") as snapshot:
+        for project in projects:
+            snapshot.write_project(project.raw)
+        for issue in stream_issues_from_jira(jira_client, projects, export_workers, shard_size):
+            snapshot.write_issue(issue.raw)
+    return snapshot.counts["issues"]
 
-# Импорт данных в Яндекс Трекер
-def import_data_to_tracker(tracker_client, tracker_queues, tracker_issues, user_mapping):
-    created_queues = {}
-    created_users = set()
+# Импорт из снимка: задачи читаются из файла потоково и проходят те же этапы
+# преобразования и импорта, что и при выгрузке из Jira. К Jira обращаются только
+# для скачивания вложений, поэтому импорт можно повторять без повторной выгрузки.
+# Задачи преобразуются прямо из JSON снимка, без построения объектов задач jira.
+# Пользователи задач без сопоставления перечисляются до импорта отдельным проходом по снимку.
+def run_snapshot_import(source, sink, user_mapping, snapshot_path, queue_size):
+    with SnapshotReader(snapshot_path, "jira") as snapshot:
+        report_unmapped_users(source.transform(snapshot.issues(progress=False), user_mapping), user_mapping)
+    with SnapshotReader(snapshot_path, "jira") as snapshot:
+        jira_client = source.jira_client
+        projects = [Project(jira_client._options, jira_client._session, raw=raw) for raw in snapshot.projects]
+        tracker_queues = transform_projects(projects)
+        tracker_issues = pipeline_stage(source.transform(snapshot.issues(), user_mapping), queue_size, "transform")
+        return sink.run(tracker_queues, tracker_issues, users_checked=True)
 
-    # Создание очередей
-    for tracker_queue in tracker_queues.values():
-        try:
-            queue = tracker_client.queues.get(tracker_queue["key"])
-            created_queues[tracker_queue["key"]] = queue
-            logger.info(f"Очередь {tracker_queue['name']} уже существует.")
-        except Exception:
-            try:
-                queue = tracker_client.queues.create(
-                    name=tracker_queue["name"],
-                    key=tracker_queue["key"]
-                )
-                created_queues[tracker_queue["key"]] = queue
-                logger.info(f"Создана очередь: {tracker_queue['name']}")
-            except Exception as e:
-                logger.error(f"Ошибка создания очереди {tracker_queue['name']}: {e}")
-                raise
-
-    # Создание задач
+# Часовой пояс пользователя Jira: в нем JQL сравнивает даты без явного пояса
+def jira_time_zone(jira_client):
+    try:
+        return ZoneInfo(jira_client.myself()["timeZone"])
+    except Exception as e:
+        logger.warning(f"Не удалось определить часовой пояс пользователя Jira, используется запас "
+                       f"{DELTA_TZ_MARGIN} ч: {e}")
+        return None
+
+# Перевод сохраненной даты обновления задачи Jira в формат JQL (с точностью до минуты,
+# поэтому задачи на границе выгружаются повторно и просто обновляются еще раз)
+def jql_since(updated, time_zone):
+    moment = parse_jira_datetime(updated)
+    if time_zone is None:
+        moment = moment.astimezone(timezone.utc) - timedelta(hours=DELTA_TZ_MARGIN)
+    else:
+        moment = moment.astimezone(time_zone)
+    return moment.strftime("%Y/%m/%d %H:%M")
+
+# Учет наибольшей даты обновления задач по очередям (проектам Jira)
+def track_watermarks(tracker_issues, watermarks):
     for tracker_issue in tracker_issues:
-        try:
-            queue_key = tracker_issue["queue"]
-            if queue_key not in created_queues:
-                logger.warning(f"Очередь {queue_key} не найдена. Пропускаем задачу {tracker_issue['summary']}.")
-                continue
-            
-            queue = created_queues[queue_key]
-            
-            # Проверка существования пользователей
-            assignee = tracker_issue["assignee"]
-            reporter = tracker_issue["reporter"]
-            if assignee and assignee not in created_users:
-                try:
-                    tracker_client.users.get(assignee)
-                    created_users.add(assignee)
-                    logger.info(f"Пользователь {assignee} найден в Яндекс Трекере.")
-                except Exception:
-                    logger.warning(f"Пользователь {assignee} не найден в Яндекс Трекере.")
-                    assignee = None
-            
-            if reporter and reporter not in created_users:
-                try:
-                    tracker_client.users.get(reporter)
-                    created_users.add(reporter)
-                    logger.info(f"Пользователь {reporter} найден в Яндекс Трекере.")
-                except Exception:
-                    logger.warning(f"Пользователь {reporter} не найден в Яндекс Трекере.")
-                    reporter = None
-
-            issue = tracker_client.issues.create(
-                queue=queue.key,
-                summary=tracker_issue["summary"],
-                description=tracker_issue["description"],
-                assignee=assignee,
-                author=reporter,
-                status=tracker_issue["status"],
-                priority=tracker_issue.get("priority"),
-                created=tracker_issue.get("created"),
-                updated=tracker_issue.get("updated"),
-                tags=tracker_issue.get("labels", [])
-            )
-
-            # Добавление комментариев
-            if hasattr(tracker_issue, 'comments'):
-                add_comments_to_issue(tracker_client, issue, tracker_issue["comments"])
-
-            # Добавление вложений
-            if hasattr(tracker_issue, 'attachments'):
-                add_attachments_to_issue(tracker_client, issue, tracker_issue["attachments"])
-
-            # Добавление связей между задачами
-            if hasattr(tracker_issue, 'links'):
-                add_links_to_issue(tracker_client, issue, tracker_issue["links"])
-
-            logger.info(f"Задача {tracker_issue['summary']} успешно создана.")
-        except Exception as e:
-            logger.error(f"Ошибка создания задачи {tracker_issue['summary']}: {e}")
-            raise
+        updated, queue = tracker_issue.updated, tracker_issue.queue
+        if updated and (queue not in watermarks or
+                        parse_jira_datetime(updated) > parse_jira_datetime(watermarks[queue])):
+            watermarks[queue] = updated
+        yield tracker_issue
+
+# Дельта-синхронизация: из Jira выгружаются только задачи, обновленные после прошлой
+# синхронизации проекта (дата хранится в журнале), новые задачи создаются, а уже
+# перенесенные обновляются по соответствию ключей из журнала. Даты в журнале сдвигаются
+# только после успешного импорта, поэтому при сбое изменения не теряются.
+def run_delta_sync(source, sink, user_mapping, journal, queue_size):
+    projects = source.projects()
+    watermarks = journal.get_watermarks()
+    time_zone = jira_time_zone(source.jira_client) if watermarks else None
+    since = {project: jql_since(updated, time_zone) for project, updated in watermarks.items()}
+    logger.info(f"Дельта-синхронизация {len(projects)} проектов, из них синхронизировались ранее: {len(since)}.")
+
+    updated_marks = {}
+    tracker_issues = track_watermarks(stream_source(source, projects, user_mapping, queue_size, since), updated_marks)
+    processed = sink.run(source.transform_projects(projects), tracker_issues, delta=True)
+    for project, updated in updated_marks.items():
+        journal.set_watermark(project, updated)
+    logger.info(f"Дельта-синхронизация завершена, обновлены отметки {len(updated_marks)} проектов.")
+    return processed
+
+# Сбор плана миграции без импорта: по проекту выполняется один запрос, который возвращает
+# число задач и первые sample задач только с полями, нужными для оценки комментариев,
+# вложений, связей и пользователей. Описание и остальные поля задач не загружаются.
+def plan_migration(jira_client, sample=PLAN_SAMPLE, export_workers=1):
+    projects = jira_client.projects()
+    plan = MigrationPlan("jira")
+    plan.add_source_calls("projects")
+
+    def sample_project(project):
+        return project, jira_client.search_issues(project_query(project.key), maxResults=sample, fields=PLAN_FIELDS)
+
+    with ThreadPoolExecutor(max_workers=max(export_workers, 1), thread_name_prefix="jira-plan") as executor:
+        for project, page in executor.map(sample_project, projects):
+            plan.add_project(project.key, page.total)
+            plan.add_source_calls("search", math.ceil(page.total / PER_PAGE))
+            for issue in page:
+                fields = issue.raw['fields']
+                comment = fields.get('comment') or {}
+                comments = comment.get('comments', [])
+                attachments = fields.get('attachment') or []
+                plan.add_sample(project.key, comment.get('total', len(comments)),
+                                [attachment.get('size', 0) for attachment in attachments],
+                                len(transform_links(fields.get('issuelinks') or [])))
+                plan.add_users(user_key(fields.get('assignee')), user_key(fields.get('reporter')),
+                               *(user_key(item.get('author')) for item in comments))
+    plan.add_source_calls("attachment_download", plan.totals()["attachments"])
+    return plan
+
+# Разбор аргументов командной строки
+def parse_args():
+    parser = argparse.ArgumentParser(description="Миграция задач из Jira в Яндекс Трекер.")
+    parser.add_argument("command", nargs="?", choices=["migrate", "export", "import"], default="migrate",
+                        help="migrate - выгрузка и импорт за один запуск (по умолчанию), export - только выгрузка "
+                             "из Jira в снимок, import - импорт в Трекер из снимка.")
+    parser.add_argument("--snapshot", default=SNAPSHOT_FILE,
+                        help="Файл снимка для команд export и import (по умолчанию %(default)s).")
+    parser.add_argument("--delta", action="store_true",
+                        help="Дельта-синхронизация: переносить только задачи, обновленные после прошлого запуска с --delta, "
+                             "и обновлять уже перенесенные задачи (требуется журнал).")
+    parser.add_argument("--plan", action="store_true",
+                        help="Только оценить миграцию: число задач, запросов к Яндекс Трекеру по типам, объем вложений "
+                             "и время импорта при заданных --rate-limit и числе потоков. В Трекер ничего не записывается.")
+    parser.add_argument("--plan-sample", type=int, default=PLAN_SAMPLE,
+                        help="Сколько задач каждого проекта загружать для оценки комментариев и вложений (по умолчанию %(default)s).")
+    parser.add_argument("--plan-latency", type=float, default=PLAN_LATENCY,
+                        help="Ожидаемая задержка одного запроса к Яндекс Трекеру для оценки времени, секунд (по умолчанию %(default)s).")
+    parser.add_argument("--plan-output", help="Файл для сохранения плана в формате JSON.")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Потоковый режим: экспорт, преобразование и импорт выполняются одновременно с ограниченной памятью.")
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE,
+                        help="Размер очереди между этапами конвейера (по умолчанию %(default)s).")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Количество потоков для параллельного создания задач (по умолчанию %(default)s).")
+    parser.add_argument("--export-workers", type=int, default=EXPORT_WORKERS,
+                        help="Количество потоков для параллельной выгрузки проектов и страниц из Jira (по умолчанию %(default)s).")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE,
+                        help="Делить проекты, в которых больше указанного числа задач, на части по дате создания (по умолчанию %(default)s - не делить).")
+    parser.add_argument("--transform-workers", type=int, default=TRANSFORM_WORKERS,
+                        help="Количество процессов для преобразования задач из JSON Jira; задачи обрабатываются порциями, "
+                             "порядок сохраняется (по умолчанию %(default)s - в основном процессе).")
+    parser.add_argument("--no-markup", action="store_true",
+                        help="Не преобразовывать вики-разметку Jira в описаниях и комментариях в разметку Яндекс Трекера (YFM).")
+    parser.add_argument("--rate-limit", type=float, default=TRACKER_RATE_LIMIT,
+                        help="Максимальная частота запросов к Яндекс Трекеру, запросов в секунду (по умолчанию %(default)s, 0 - без ограничения).")
+    parser.add_argument("--max-retries", type=int, default=TRACKER_MAX_RETRIES,
+                        help="Количество повторов запроса к Яндекс Трекеру при ответах 429/5xx (по умолчанию %(default)s).")
+    parser.add_argument("--no-adaptive", action="store_true",
+                        help="Не снижать частоту и параллельность запросов при ответах 429.")
+    parser.add_argument("--async-io", action="store_true",
+                        help="Переносить задачи в Яндекс Трекер асинхронно (asyncio и aiohttp): одновременно выполняется "
+                             "до --async-concurrency запросов без потока на каждый; --workers и --comment-workers не используются.")
+    parser.add_argument("--async-concurrency", type=int, default=TRACKER_ASYNC_CONCURRENCY,
+                        help="Количество одновременных запросов и задач в работе в режиме --async-io (по умолчанию %(default)s).")
+    parser.add_argument("--attachment-workers", type=int, default=ATTACHMENT_WORKERS,
+                        help="Количество потоков для передачи вложений (по умолчанию %(default)s).")
+    parser.add_argument("--attachment-mb-in-flight", type=int, default=ATTACHMENT_MB_IN_FLIGHT,
+                        help="Суммарный размер одновременно передаваемых вложений, МБ (по умолчанию %(default)s).")
+    parser.add_argument("--comment-workers", type=int, default=COMMENT_WORKERS,
+                        help="Количество потоков для переноса комментариев; комментарии одной задачи переносятся "
+                             "по порядку (по умолчанию %(default)s).")
+    parser.add_argument("--http-pool-size", type=int, default=HTTP_POOL_SIZE,
+                        help="Размер пула HTTP-соединений каждого клиента (по умолчанию %(default)s - по числу потоков, "
+                             "которые обращаются к сервису).")
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help="Файл, в который периодически выводятся метрики строками JSON ('-' - stdout, "
+                             "где они смешиваются с выводом скрипта); по умолчанию метрики не выводятся.")
+    parser.add_argument("--metrics-prometheus", default=METRICS_PROMETHEUS_FILE,
+                        help="Текстовый файл метрик в формате Prometheus (по умолчанию не записывается).")
+    parser.add_argument("--metrics-interval", type=float, default=METRICS_INTERVAL,
+                        help="Период вывода метрик в секундах (по умолчанию %(default)s).")
+    parser.add_argument("--journal", default=JOURNAL_FILE,
+                        help="Файл журнала прогресса для возобновления миграции (по умолчанию %(default)s, пустая строка отключает).")
+    return parser.parse_args()
+
+# Потоковая миграция: задачи импортируются по мере выгрузки из Jira
+def run_pipeline(source, sink, user_mapping, queue_size):
+    projects = source.projects()
+    if not projects:
+        logger.error("Не удалось получить проекты из Jira.")
+        return 0
+    logger.info(f"Запуск конвейера для {len(projects)} проектов, размер очереди между этапами: {queue_size}.")
+    return sink.run(source.transform_projects(projects), stream_source(source, projects, user_mapping, queue_size))
 
 # Основная функция
 def main():
+    args = parse_args()
     start_time = datetime.now()
     logger.info("Начало миграции данных из Jira в Яндекс Трекер.")
+    metrics.configure("jira", args.metrics_file, args.metrics_prometheus, args.metrics_interval,
+                      progress_stage="snapshot_write" if args.command == "export" else "issue")
 
+    journal = None
     try:
-        jira_client = init_jira_client(JIRA_URL, JIRA_USER, JIRA_API_TOKEN)
-        tracker_client = init_tracker_client(ORG_ID, CLOUD_ORG_ID, TOKEN)
+        # Импорт из снимка не выгружает задачи из Jira, клиент нужен только для вложений
+        jira_client = init_jira_client(JIRA_URL, JIRA_USER, JIRA_API_TOKEN, get_server_info=args.command != "import",
+                                       pool_size=args.http_pool_size or args.export_workers + args.attachment_workers)
+        if args.command == "export":
+            exported = export_snapshot(jira_client, args.snapshot, args.export_workers, args.shard_size)
+            logger.info(f"Выгрузка в снимок завершена за {(datetime.now() - start_time).total_seconds()} секунд, "
+                        f"выгружено {exported} задач.")
+            return
+        if args.plan:
+            plan = plan_migration(jira_client, args.plan_sample, args.export_workers)
+            report_plan(plan.estimate(read_user_mapping(USER_MAPPING_FILE, USER_MAPPING_KEYS), args.workers, args.attachment_workers,
+                                      args.comment_workers, args.rate_limit, args.plan_latency, PLAN_BANDWIDTH_MB),
+                        args.plan_output)
+            return
+
+        tracker_client = init_tracker_client(ORG_ID, CLOUD_ORG_ID, TOKEN, TRACKER_API_URL, args.rate_limit,
+                                             max(args.workers, 1) + args.attachment_workers + args.comment_workers,
+                                             args.max_retries, not args.no_adaptive, args.http_pool_size)
 
         if not jira_client or not tracker_client:
             logger.error("Не удалось инициализировать клиенты.")
             return
 
-        user_mapping = read_user_mapping(USER_MAPPING_FILE)
-        projects, issues = export_data_from_jira(jira_client)
-        if not projects or not issues:
-            logger.error("Не удалось получить данные из Jira.")
-            return
+        user_mapping = read_user_mapping(USER_MAPPING_FILE, USER_MAPPING_KEYS)
+        journal = open_journal(args.journal)
+        source = JiraSource(jira_client, args.export_workers, args.shard_size, args.transform_workers)
+        sink_class, sink_options = TrackerSink, {"workers": args.workers, "comment_workers": args.comment_workers}
+        if args.async_io:
+            # aiohttp нужен только в асинхронном режиме, поэтому модуль импортируется здесь
+            from tracker_async import AsyncTrackerSink
+            sink_class, sink_options = AsyncTrackerSink, {"concurrency": args.async_concurrency}
+        sink = sink_class(tracker_client, source, journal, attachment_workers=args.attachment_workers,
+                          attachment_mb_in_flight=args.attachment_mb_in_flight, markup=not args.no_markup,
+                          user_mapping=user_mapping, **sink_options)
+        if args.delta:
+            if not journal:
+                raise ValueError("Для дельта-синхронизации нужен журнал миграции (--journal).")
+            processed = run_delta_sync(source, sink, user_mapping, journal, args.queue_size)
+        elif args.command == "import":
+            processed = run_snapshot_import(source, sink, user_mapping, args.snapshot, args.queue_size)
+        elif args.pipeline:
+            processed = run_pipeline(source, sink, user_mapping, args.queue_size)
+        else:
+            projects, issues = export_data_from_jira(jira_client, args.export_workers, args.shard_size)
+            if not projects or not issues:
+                logger.error("Не удалось получить данные из Jira.")
+                return
 
-        tracker_queues, tracker_issues = transform_data(projects, issues, user_mapping)
-        import_data_to_tracker(tracker_client, tracker_queues, tracker_issues, user_mapping)
+            tracker_queues, tracker_issues = transform_data(projects, issues, user_mapping, args.transform_workers)
+            processed = sink.run(tracker_queues, tracker_issues)
 
         end_time = datetime.now()
         logger.info(f"Миграция завершена за {(end_time - start_time).total_seconds()} секунд.")
-        logger.info(f"Обработано {len(tracker_issues)} задач.")
+        logger.info(f"Обработано {processed} задач.")
+        log_throttle_stats(tracker_client)
+        log_session_stats("Jira", jira_client._session)
+        log_session_stats("Яндекс Трекером", tracker_client._connection.session)
     except Exception as e:
         logger.critical(f"Ошибка при выполнении миграции: {e}")
         raise
+    finally:
+        if journal:
+            journal.close()
+        metrics.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,341 @@
+import logging
+import os
+import re
+from functools import lru_cache
+from html import unescape
+
+from migration_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MARKUP_CACHE_SIZE = int(os.getenv('MARKUP_CACHE_SIZE', '20000'))  # Количество запоминаемых преобразованных фрагментов разметки
+MARKUP_CACHE_TEXT = 4096  # Фрагменты длиннее этого числа символов не запоминаются (почти всегда уникальны)
+
+# Разметка Jira (вики-разметка) -> YFM (markdown Яндекс Трекера).
+# Все регулярные выражения компилируются один раз при загрузке модуля.
+
+# Блоки, внутри которых разметка не преобразуется или преобразуется целиком: код, неформатированный текст, цитата
+_JIRA_BLOCK = re.compile(r"\{(code|noformat|quote)(?::([^}]*))?\}(.*?)\{\1\}", re.S)
+_JIRA_PARAGRAPH = re.compile(r"\n[ \t]*\n")
+_JIRA_HEADING = re.compile(r"^h([1-6])\.\s+")
+_JIRA_QUOTE_LINE = re.compile(r"^bq\.\s+")
+_JIRA_LIST = re.compile(r"^([*#]+|-)\s+")
+_JIRA_RULE = re.compile(r"^-{4,}\s*$")
+_JIRA_TABLE = re.compile(r"^\|")
+_JIRA_TABLE_HEADER = re.compile(r"\|\|")
+# Строчная разметка: одно выражение с альтернативами, поэтому текст просматривается один раз,
+# а содержимое ссылок и моноширинного текста не затрагивается остальными правилами.
+# Опережающая проверка первого символа отсекает позиции, с которых разметка начаться не может.
+_JIRA_INLINE = re.compile(
+    r"(?=[*_\-?{\[!\\])(?:"
+    r"\{\{(?P<mono>.+?)\}\}"
+    r"|\[~(?P<mention>[^\]]+)\]"
+    r"|\[(?P<label>[^|\]\n]+)\|(?P<href>[^\]\n]+)\]"
+    r"|\[(?P<url>(?:https?|ftp|mailto):[^\]\s]+)\]"
+    r"|!(?P<image>[^!\s|]+)(?:\|[^!\n]*)?!"
+    r"|(?<![\w*])\*(?=\S)(?P<bold>.+?)(?<=\S)\*(?![\w*])"
+    r"|(?<![\w_])_(?=\S)(?P<italic>.+?)(?<=\S)_(?![\w_])"
+    r"|(?<![\w-])-(?=[^\s-])(?P<strike>.+?)(?<=[^\s-])-(?![\w-])"
+    r"|\?\?(?P<citation>.+?)\?\?"
+    r"|\{color(?::[^}]*)?\}"
+    r"|(?P<br>\\\\))"
+)
+# Первые символы строк со структурной разметкой и символы, с которых начинается строчная разметка
+_JIRA_STRUCTURE = frozenset("hb*#-|")
+_JIRA_SPECIAL = re.compile(r"[*_\-?{\[!\\]")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def _jira_inline_match(match):
+    group = match.lastgroup
+    if group == "mono":
+        return f"`{match.group('mono')}`"
+    if group == "mention":
+        return f"@{match.group('mention')}"
+    if group == "href":
+        return f"[{_jira_inline(match.group('label'))}]({match.group('href').strip()})"
+    if group == "url":
+        return f"<{match.group('url')}>"
+    if group == "image":
+        return f"![]({match.group('image')})"
+    if group == "bold":
+        return f"**{_jira_inline(match.group('bold'))}**"
+    if group in ("italic", "citation"):
+        return f"*{_jira_inline(match.group(group))}*"
+    if group == "strike":
+        return f"~~{_jira_inline(match.group('strike'))}~~"
+    if group == "br":
+        return "  \n"
+    return ""
+
+
+def _jira_inline(text):
+    return _JIRA_INLINE.sub(_jira_inline_match, text)
+
+
+def _table_row(line):
+    header = line.startswith("||")
+    cells = _JIRA_TABLE_HEADER.sub("|", line).strip().strip("|").split("|")
+    return header, "| " + " | ".join(cell.strip() for cell in cells) + " |", len(cells)
+
+
+# Преобразование одного абзаца вики-разметки Jira (без блоков кода и цитат): сначала
+# структура строк (заголовки, списки, таблицы), затем строчная разметка всего абзаца
+# одним проходом. Строки без структурной разметки и абзацы без специальных символов
+# не проверяются остальными выражениями.
+def _jira_paragraph(text):
+    lines = []
+    in_table = False
+    for line in text.split("\n"):
+        stripped = line.lstrip()
+        if not stripped or stripped[0] not in _JIRA_STRUCTURE:
+            in_table = False
+            lines.append(line)
+            continue
+        stripped = stripped.rstrip()
+        if _JIRA_TABLE.match(stripped):
+            header, row, columns = _table_row(stripped)
+            if not in_table and lines and lines[-1]:
+                # Таблица и горизонтальная линия не должны продолжать предыдущий абзац
+                lines.append("")
+            if not in_table and not header:
+                # Таблица markdown всегда начинается с заголовка
+                lines.extend(["|" + " |" * columns, "|" + " --- |" * columns])
+            lines.append(row)
+            if header and not in_table:
+                lines.append("|" + " --- |" * columns)
+            in_table = True
+            continue
+        in_table = False
+        if _JIRA_RULE.match(stripped):
+            lines.extend(["", "---", ""])
+            continue
+        match = _JIRA_HEADING.match(stripped)
+        if match:
+            lines.append("#" * int(match.group(1)) + " " + stripped[match.end():])
+            continue
+        match = _JIRA_QUOTE_LINE.match(stripped)
+        if match:
+            lines.append("> " + stripped[match.end():])
+            continue
+        match = _JIRA_LIST.match(stripped)
+        if match:
+            markers = match.group(1)
+            # Вложенный список сдвигается на ширину маркеров родительских уровней
+            indent = "".join("   " if marker == "#" else "  " for marker in markers[:-1])
+            bullet = "1." if markers[-1] == "#" else "-"
+            lines.append(f"{indent}{bullet} {stripped[match.end():]}")
+            continue
+        lines.append(line)
+    text = "\n".join(lines)
+    return _jira_inline(text) if _JIRA_SPECIAL.search(text) else text
+
+
+# Абзацы запоминаются по отдельности: шаблоны и подписи повторяются в тысячах описаний
+# и комментариев, хотя тексты целиком почти всегда различаются
+@lru_cache(maxsize=MARKUP_CACHE_SIZE)
+def _jira_paragraph_cached(text):
+    return _jira_paragraph(text)
+
+
+def _jira_text(text):
+    paragraphs = []
+    for paragraph in _JIRA_PARAGRAPH.split(text):
+        if len(paragraph) <= MARKUP_CACHE_TEXT:
+            paragraphs.append(_jira_paragraph_cached(paragraph))
+        else:
+            paragraphs.append(_jira_paragraph(paragraph))
+    return "\n\n".join(paragraphs)
+
+
+def _code_language(parameters):
+    if not parameters:
+        return ""
+    for parameter in parameters.split("|"):
+        name, _, value = parameter.partition("=")
+        if not value:
+            return name.strip()
+        if name.strip() == "language":
+            return value.strip()
+    return ""
+
+
+# Вики-разметка Jira -> YFM
+def jira_to_markdown(text):
+    if not text:
+        return text
+    parts = []
+    position = 0
+    for match in _JIRA_BLOCK.finditer(text):
+        parts.append(_jira_text(text[position:match.start()]))
+        kind, parameters, body = match.groups()
+        if kind == "quote":
+            quoted = jira_to_markdown(body.strip("\n"))
+            parts.append("\n" + "\n".join(f"> {line}" if line else ">" for line in quoted.split("\n")) + "\n")
+        else:
+            language = _code_language(parameters) if kind == "code" else ""
+            parts.append(f"\n```{language}\n{body.strip(chr(10))}\n```\n")
+        position = match.end()
+    parts.append(_jira_text(text[position:]))
+    return _BLANK_LINES.sub("\n\n", "".join(parts)).strip("\n")
+
+
+# Форматированный текст Asana (html_notes, html_text) -> markdown.
+# Asana отдает ограниченный набор тегов без вложенных скриптов и комментариев внутри <body>,
+# поэтому текст разбирается одним заранее скомпилированным выражением на теги и текст,
+# без построения дерева (стандартный HTMLParser заметно медленнее).
+_ASANA_TOKEN = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)([^>]*)>|([^<]+)|<")
+_ASANA_ATTRIBUTE = re.compile(r"""([a-zA-Z_:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_ASANA_INLINE = {"strong": "**", "b": "**", "em": "*", "i": "*", "s": "~~", "strike": "~~", "del": "~~"}
+_ASANA_HEADINGS = {"h1": "# ", "h2": "## ", "h3": "### "}
+
+
+def _attributes(text):
+    return {name: unescape(double if double is not None else single)
+            for name, double, single in _ASANA_ATTRIBUTE.findall(text)}
+
+
+class _AsanaMarkdown:
+    def __init__(self):
+        self.buffers = [[]]
+        self.lists = []
+        self.links = []
+        self.pre = 0
+
+    def write(self, text):
+        self.buffers[-1].append(text)
+
+    def feed(self, text):
+        for match in _ASANA_TOKEN.finditer(text):
+            closing, tag, attributes, data = match.groups()
+            if tag:
+                tag = tag.lower()
+                if closing:
+                    self.handle_endtag(tag)
+                else:
+                    self.handle_starttag(tag, attributes)
+            else:
+                data = data or "<"
+                self.handle_data(unescape(data) if "&" in data else data)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _ASANA_INLINE:
+            self.write(_ASANA_INLINE[tag])
+        elif tag == "code" and not self.pre:
+            self.write("`")
+        elif tag == "pre":
+            self.pre += 1
+            self.write("\n```\n")
+        elif tag in _ASANA_HEADINGS:
+            self.write("\n\n" + _ASANA_HEADINGS[tag])
+        elif tag in ("ul", "ol"):
+            self.lists.append([tag, 0])
+            if len(self.lists) == 1:
+                self.write("\n")
+        elif tag == "li":
+            indent = "   " * (len(self.lists) - 1)
+            if self.lists and self.lists[-1][0] == "ol":
+                self.lists[-1][1] += 1
+                self.write(f"\n{indent}{self.lists[-1][1]}. ")
+            else:
+                self.write(f"\n{indent}- ")
+        elif tag in ("a", "blockquote"):
+            # Текст ссылки и цитаты собирается отдельно и оформляется при закрытии тега
+            if tag == "a":
+                self.links.append(_attributes(attrs).get("href"))
+            self.buffers.append([])
+        elif tag == "br":
+            self.write("\n")
+        elif tag == "hr":
+            self.write("\n\n---\n\n")
+        elif tag == "img":
+            source = _attributes(attrs).get("src")
+            if source:
+                self.write(f"![]({source})")
+
+    def handle_endtag(self, tag):
+        if tag in _ASANA_INLINE:
+            self.write(_ASANA_INLINE[tag])
+        elif tag == "code" and not self.pre:
+            self.write("`")
+        elif tag == "pre" and self.pre:
+            self.pre -= 1
+            self.write("\n```\n")
+        elif tag in _ASANA_HEADINGS:
+            self.write("\n\n")
+        elif tag in ("ul", "ol") and self.lists:
+            self.lists.pop()
+            if not self.lists:
+                self.write("\n\n")
+        elif tag == "a" and self.links and len(self.buffers) > 1:
+            label, href = "".join(self.buffers.pop()), self.links.pop()
+            self.write(f"[{label}]({href})" if href and label != href else (href or label))
+        elif tag == "blockquote" and len(self.buffers) > 1:
+            quoted = "".join(self.buffers.pop()).strip("\n")
+            self.write("\n\n" + "\n".join(f"> {line}" if line else ">" for line in quoted.split("\n")) + "\n\n")
+
+    def handle_data(self, data):
+        self.write(data)
+
+    def markdown(self):
+        while len(self.buffers) > 1:
+            text = "".join(self.buffers.pop())
+            self.write(text)
+        return _BLANK_LINES.sub("\n\n", "".join(self.buffers[0])).strip()
+
+
+def _asana_markdown(text):
+    parser = _AsanaMarkdown()
+    parser.feed(text)
+    return parser.markdown()
+
+
+@lru_cache(maxsize=MARKUP_CACHE_SIZE)
+def _asana_markdown_cached(text):
+    return _asana_markdown(text)
+
+
+# Форматированный текст Asana -> markdown. Простой текст (notes, text из старых
+# снимков без html-полей) возвращается без изменений.
+def asana_to_markdown(text):
+    if not text or not text.startswith("<body"):
+        return text
+    if len(text) <= MARKUP_CACHE_TEXT:
+        return _asana_markdown_cached(text)
+    return _asana_markdown(text)
+
+
+# Потоковый этап преобразования разметки описаний и комментариев задач Трекера
+# функцией convert. Задачи изменяются на месте и отдаются по одной.
+def markup_stage(tracker_issues, convert):
+    for tracker_issue in tracker_issues:
+        with metrics.timer("markup"):
+            size = len(tracker_issue.description or "")
+            tracker_issue.description = convert(tracker_issue.description)
+            for comment in tracker_issue.comments:
+                size += len(comment.body or "")
+                comment.body = convert(comment.body)
+        metrics.count("markup_chars", size)
+        yield tracker_issue
+
+
+# Статистика кэша преобразованных фрагментов: (попадания, промахи)
+def cache_stats():
+    hits = misses = 0
+    for function in (_jira_paragraph_cached, _asana_markdown_cached):
+        info = function.cache_info()
+        hits += info.hits
+        misses += info.misses
+    return hits, misses
+
+
+def log_cache_stats():
+    hits, misses = cache_stats()
+    if hits + misses:
+        logger.info(f"Разметка: преобразовано фрагментов {misses}, взято из кэша {hits} "
+                    f"({hits / (hits + misses):.1%}).")
+
+
+def clear_cache():
+    _jira_paragraph_cached.cache_clear()
+    _asana_markdown_cached.cache_clear()
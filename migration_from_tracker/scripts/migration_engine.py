@@ -0,0 +1,632 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from queue import Queue, Empty, Full
+
+from yandex_tracker_client import TrackerClient
+from yandex_tracker_client.exceptions import Conflict
+
+from tracker_throttle import ThrottledConnection
+from http_pool import configure_session
+from migration_journal import JournaledIssue
+from tracker_users import UserCache
+from user_mapping_index import UserMapping, UnmappedUsers
+from attachment_transfer import AttachmentTransfer
+from tracker_comments import CommentStage
+from tracker_links import DeferredLinks
+from markup_converter import markup_stage, log_cache_stats
+from migration_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Настройки создаваемых очередей Яндекс Трекера
+QUEUE_LEAD = os.getenv('QUEUE_LEAD', '')  # Руководитель новых очередей (по умолчанию - владелец токена)
+QUEUE_DEFAULT_TYPE = os.getenv('QUEUE_DEFAULT_TYPE', 'task')  # Тип задач по умолчанию
+QUEUE_DEFAULT_PRIORITY = os.getenv('QUEUE_DEFAULT_PRIORITY', 'normal')  # Приоритет задач по умолчанию
+QUEUE_WORKFLOW = os.getenv('QUEUE_WORKFLOW', 'oicn')  # Рабочий процесс для типа задач по умолчанию
+QUEUE_RESOLUTIONS = os.getenv('QUEUE_RESOLUTIONS', 'fixed,wontFix').split(',')  # Резолюции рабочего процесса
+QUEUE_WORKERS = int(os.getenv('QUEUE_WORKERS', '8'))  # Количество потоков для создания очередей
+QUEUE_PAGE_SIZE = 100  # Количество очередей на странице списка
+TRANSFORM_CHUNK_SIZE = int(os.getenv('TRANSFORM_CHUNK_SIZE', '200'))  # Количество задач в одной порции для процесса преобразования
+
+
+# Функция для инициализации клиента Яндекс Трекера.
+# Все запросы к Трекеру проходят через общий ограничитель частоты с повторами, а пул
+# соединений по умолчанию рассчитан на max_concurrency одновременных запросов.
+def init_tracker_client(org_id, cloud_org_id, token, base_url, rate_limit=10.0, max_concurrency=1, max_retries=8,
+                        adaptive=True, pool_size=0):
+    if not org_id and not cloud_org_id:
+        logger.error("Необходимо указать либо ORG_ID, либо CLOUD_ORG_ID.")
+        raise ValueError("Необходимо указать либо ORG_ID, либо CLOUD_ORG_ID.")
+    throttle_options = dict(base_url=base_url, rate_limit=rate_limit, max_concurrency=max_concurrency,
+                            max_retries=max_retries, adaptive=adaptive)
+    if org_id:
+        logger.info(f"Используется обычная организация с ID: {org_id}")
+        connection = ThrottledConnection(token=token, org_id=org_id, **throttle_options)
+    else:
+        logger.info(f"Используется облачная организация с ID: {cloud_org_id}")
+        connection = ThrottledConnection(token=token, cloud_org_id=cloud_org_id, **throttle_options)
+    configure_session(connection.session, pool_size or max_concurrency)
+    return TrackerClient(connection=connection)
+
+
+# Индекс сопоставления пользователей (user_mapping_index.UserMapping): файл CSV или SQLite
+# со столбцом tracker_user и столбцами ключей источника key_columns (например, jira_user,
+# email). Файл загружается при первом обращении.
+def read_user_mapping(file_path, key_columns):
+    if isinstance(key_columns, str):
+        key_columns = [key_columns]
+    return UserMapping(file_path, key_columns)
+
+
+# Комментарий задачи в формате Трекера
+@dataclass(slots=True)
+class TrackerComment:
+    author: str
+    body: str
+
+
+# Задача в формате Трекера, общем для всех источников. Задач при миграции миллионы, а
+# преобразуются они иногда в отдельных процессах, поэтому вместо словарей используется
+# компактная запись со __slots__: она меньше в памяти и быстрее передается между процессами.
+@dataclass(slots=True)
+class TrackerIssue:
+    source_key: str
+    queue: str
+    summary: str
+    description: str = None
+    assignee: str = None
+    reporter: str = None
+    status: object = None
+    priority: str = None
+    created: str = None
+    updated: str = None
+    labels: list = field(default_factory=list)
+    comments: list = field(default_factory=list)  # TrackerComment по порядку создания
+    attachments: list = field(default_factory=list)  # Вложения в формате источника (см. SourceAdapter.open_attachment)
+    links: list = field(default_factory=list)  # Пары (ключ связанной задачи источника, тип связи в Трекере)
+    followers: list = field(default_factory=list)  # Наблюдатели (пользователи после сопоставления)
+
+
+# Пользователи задачи: исполнитель, автор, наблюдатели и авторы комментариев
+def issue_users(tracker_issue):
+    return [tracker_issue.assignee, tracker_issue.reporter, *tracker_issue.followers,
+            *(comment.author for comment in tracker_issue.comments)]
+
+
+# Проверка до импорта: пользователи источника без сопоставления перечисляются одним
+# проходом по задачам (список задач или повторное чтение снимка). Возвращает их список.
+def report_unmapped_users(tracker_issues, user_mapping):
+    unmapped = UnmappedUsers(user_mapping)
+    for tracker_issue in tracker_issues:
+        unmapped.add(issue_users(tracker_issue))
+    users = unmapped.report()
+    if not users:
+        logger.info(f"Все пользователи источника есть в сопоставлении {user_mapping.path}.")
+    return users
+
+
+# Если задачи переданы списком, пользователи источника проверяются до импорта; при потоковом
+# импорте задачи заранее неизвестны и проверяются по мере импорта. Возвращает True, если проверка выполнена.
+def precheck_users(tracker_issues, user_mapping):
+    if user_mapping is None or not isinstance(tracker_issues, list):
+        return False
+    report_unmapped_users(tracker_issues, user_mapping)
+    return True
+
+
+# Маркер завершения этапа конвейера
+_STAGE_DONE = object()
+
+
+# Запуск этапа конвейера в фоновом потоке с ограниченной очередью на выходе.
+# Когда очередь заполнена, этап ждет потребителя (backpressure), поэтому в памяти
+# одновременно находится не больше queue_size элементов между соседними этапами.
+def pipeline_stage(items, queue_size, name):
+    buffer = Queue(maxsize=queue_size)
+    stopped = threading.Event()
+    errors = []
+
+    def produce():
+        try:
+            for item in items:
+                while not stopped.is_set():
+                    try:
+                        buffer.put(item, timeout=0.5)
+                        break
+                    except Full:
+                        continue
+                if stopped.is_set():
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            buffer.put(_STAGE_DONE)
+
+    thread = threading.Thread(target=produce, name=f"pipeline-{name}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _STAGE_DONE:
+                break
+            yield item
+    finally:
+        stopped.set()
+        # Освобождаем место в очереди, чтобы производитель мог завершиться
+        while thread.is_alive():
+            try:
+                buffer.get(timeout=0.5)
+            except Empty:
+                pass
+        thread.join()
+    if errors:
+        logger.error(f"Ошибка на этапе конвейера {name}: {errors[0]}")
+        raise errors[0]
+
+
+# Контекст процесса преобразования: функция и ее постоянный аргумент (например,
+# сопоставление пользователей) передаются процессу один раз при запуске, а не с каждой порцией
+_process_context = None
+
+
+def _init_process(function, context):
+    global _process_context
+    _process_context = (function, context)
+
+
+def _process_chunk(chunk):
+    function, context = _process_context
+    results, durations = [], []
+    for item in chunk:
+        started = time.perf_counter()
+        results.append(function(item, context))
+        durations.append(time.perf_counter() - started)
+    return results, durations
+
+
+# Этап конвейера в пуле из workers процессов для преобразований, которые упираются в
+# процессор. Элементы items (данные, которые можно передать между процессами, например
+# исходный JSON задач) делятся на порции по chunk_size и обрабатываются вызовом
+# function(item, context); результаты отдаются в исходном порядке. В работе одновременно
+# не больше workers * 2 порций, поэтому входной генератор не вычитывается в память.
+def process_stage(items, function, context, workers, chunk_size=TRANSFORM_CHUNK_SIZE, name="transform"):
+    pending = deque()
+    chunk = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_process, initargs=(function, context)) as executor:
+        try:
+            for item in items:
+                chunk.append(item)
+                if len(chunk) < chunk_size:
+                    continue
+                pending.append(executor.submit(_process_chunk, chunk))
+                chunk = []
+                while len(pending) >= workers * 2:
+                    yield from _chunk_results(pending.popleft(), name)
+            if chunk:
+                pending.append(executor.submit(_process_chunk, chunk))
+            while pending:
+                yield from _chunk_results(pending.popleft(), name)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+
+def _chunk_results(future, name):
+    results, durations = future.result()
+    for seconds in durations:
+        metrics.observe(name, seconds)
+    return results
+
+
+# Интерфейс источника миграции. Источник потоково (по страницам) выгружает задачи
+# проектов и преобразует их в общий формат задач Трекера (TrackerIssue), а импорт в
+# Трекер для всех источников выполняет TrackerSink.
+class SourceAdapter:
+    name = None  # Имя источника: префикс поля unique задач Трекера
+
+    # Список проектов источника
+    def projects(self):
+        raise NotImplementedError
+
+    # Потоковая выгрузка задач проектов; since - даты по ключам проектов для дельта-синхронизации
+    def read(self, projects, since=None):
+        raise NotImplementedError
+
+    # Очереди Трекера по проектам источника: {ключ: {"name", "key"}}
+    def transform_projects(self, projects):
+        raise NotImplementedError
+
+    # Потоковое преобразование выгруженных задач в формат Трекера
+    def transform(self, items, user_mapping):
+        raise NotImplementedError
+
+    # Дополнительные поля при создании задачи (кроме очереди, unique, названия, описания, исполнителя и автора)
+    def create_fields(self, tracker_issue):
+        return {}
+
+    # Дополнительные поля при обновлении задачи дельта-синхронизацией
+    def update_fields(self, tracker_issue):
+        return {}
+
+    # Вложение для передачи: (имя файла, размер или None, функция, открывающая поток частей файла)
+    def open_attachment(self, attachment):
+        raise NotImplementedError
+
+    # Преобразование разметки описания или комментария в YFM (по умолчанию текст не меняется)
+    def convert_markup(self, text):
+        return text
+
+
+# Потоковая выгрузка и преобразование задач источника. При queue_size выгрузка и
+# преобразование выполняются отдельными этапами конвейера одновременно с импортом.
+def stream_source(source, projects, user_mapping, queue_size=0, since=None):
+    items = source.read(projects, since)
+    if queue_size:
+        items = pipeline_stage(items, queue_size, "export")
+    tracker_issues = source.transform(items, user_mapping)
+    if queue_size:
+        tracker_issues = pipeline_stage(tracker_issues, queue_size, "transform")
+    return tracker_issues
+
+
+# Поля запроса создания очереди с обязательными настройками (lead - руководитель очереди)
+def queue_settings(tracker_queue, lead=None):
+    settings = dict(
+        name=tracker_queue["name"],
+        key=tracker_queue["key"],
+        defaultType=QUEUE_DEFAULT_TYPE,
+        defaultPriority=QUEUE_DEFAULT_PRIORITY,
+        issueTypesConfig=[{"issueType": QUEUE_DEFAULT_TYPE, "workflow": QUEUE_WORKFLOW,
+                           "resolutions": QUEUE_RESOLUTIONS}],
+    )
+    if lead:
+        settings["lead"] = lead
+    return settings
+
+
+# Подготовка очередей Яндекс Трекера. Существующие очереди загружаются одним списком,
+# недостающие создаются пулом потоков с обязательными настройками (руководитель, тип и
+# приоритет задач по умолчанию, рабочий процесс). Импорт задач начинается сразу:
+# задача ждет только создания своей очереди, а задачи готовых очередей не ждут.
+# Если список получить не удалось, каждая очередь проверяется отдельным запросом.
+class QueueProvisioner:
+    def __init__(self, tracker_client, tracker_queues, workers=QUEUE_WORKERS):
+        self.tracker_client = tracker_client
+        self.tracker_queues = tracker_queues
+        self.executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="queues")
+        self.lock = threading.Lock()
+        self.ready = {}
+        self.pending = {}
+        self.lead = None
+        self.stats = {"existing": 0, "created": 0, "failed": 0}
+
+    def start(self):
+        existing = self._prefetch()
+        for key, tracker_queue in self.tracker_queues.items():
+            if existing is not None and key in existing:
+                self.ready[key] = existing[key]
+                self.stats["existing"] += 1
+            else:
+                self.pending[key] = self.executor.submit(self._provision, tracker_queue, existing is None)
+        logger.info(f"Очередей: {len(self.tracker_queues)}, уже существуют {len(self.ready)}, "
+                    f"создаются или проверяются {len(self.pending)}.")
+        return self
+
+    def _prefetch(self):
+        try:
+            with metrics.timer("queue_list"):
+                return {queue.key: queue for queue in self.tracker_client.queues.get_all(perPage=QUEUE_PAGE_SIZE)}
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить список очередей Яндекс Трекера, "
+                           f"каждая очередь будет проверена отдельно: {e}")
+            return None
+
+    # Руководитель новых очередей: QUEUE_LEAD или владелец токена
+    def _queue_lead(self):
+        with self.lock:
+            if self.lead is None:
+                try:
+                    self.lead = QUEUE_LEAD or self.tracker_client.myself.login
+                except Exception as e:
+                    logger.warning(f"Не удалось определить руководителя очередей (QUEUE_LEAD): {e}")
+                    self.lead = ""
+            return self.lead
+
+    @metrics.timed("queue")
+    def _provision(self, tracker_queue, check_existing):
+        if check_existing:
+            try:
+                queue = self.tracker_client.queues.get(tracker_queue["key"])
+                logger.info(f"Очередь {tracker_queue['name']} уже существует.")
+                with self.lock:
+                    self.stats["existing"] += 1
+                return queue
+            except Exception:
+                pass
+        try:
+            queue = self.tracker_client.queues.create(**queue_settings(tracker_queue, self._queue_lead()))
+        except Conflict:
+            # Очередь уже создана (например, повторенным после сбоя запросом)
+            queue = self.tracker_client.queues.get(tracker_queue["key"])
+            logger.info(f"Очередь {tracker_queue['name']} уже существует.")
+            with self.lock:
+                self.stats["existing"] += 1
+            return queue
+        except Exception as e:
+            logger.error(f"Ошибка создания очереди {tracker_queue['name']}: {e}")
+            with self.lock:
+                self.stats["failed"] += 1
+            raise
+        logger.info(f"Создана очередь: {tracker_queue['name']}")
+        with self.lock:
+            self.stats["created"] += 1
+        return queue
+
+    # Очередь по ключу (ждет ее создания) или None, если такой очереди нет среди переносимых.
+    # Если очередь не удалось создать, выбрасывается исключение создания.
+    def get(self, key):
+        queue = self.ready.get(key)
+        if queue is not None:
+            return queue
+        future = self.pending.get(key)
+        if future is None:
+            return None
+        queue = future.result()
+        self.ready[key] = queue
+        return queue
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        logger.info(f"Очереди: уже существовали {self.stats['existing']}, создано {self.stats['created']}, "
+                    f"с ошибкой {self.stats['failed']}.")
+
+
+# Отчет о производительности рабочих потоков
+def log_worker_stats(worker_stats, total_seconds):
+    total_issues = 0
+    for worker, stats in sorted(worker_stats.items()):
+        rate = stats["issues"] / stats["seconds"] if stats["seconds"] else 0.0
+        total_issues += stats["issues"]
+        logger.info(f"Поток {worker}: создано {stats['issues']} задач, пропущено {stats['skipped']}, "
+                    f"время работы {stats['seconds']:.1f} с, {rate:.2f} задач/с.")
+    total_rate = total_issues / total_seconds if total_seconds else 0.0
+    logger.info(f"Всего создано {total_issues} задач за {total_seconds:.1f} с ({total_rate:.2f} задач/с).")
+
+
+
+# Завершение импорта с ошибкой, если комментарии части задач или часть связей не перенесены:
+# иначе скрипт завершился бы успешно, а дельта-синхронизация сдвинула бы дату обновления
+# проектов. Повторный запуск с журналом продолжит перенос с первого неудачного комментария
+# и создаст только не созданные связи.
+def raise_for_failures(comment_failures, link_failures=0):
+    problems = []
+    if comment_failures:
+        problems.append(f"комментарии перенесены не полностью у {comment_failures} задач")
+    if link_failures:
+        problems.append(f"не создано связей: {link_failures}")
+    if problems:
+        raise RuntimeError(f"Импорт завершен с ошибками: {', '.join(problems)}.")
+
+# Импорт задач в Яндекс Трекер, общий для всех источников.
+# Задачи создаются пулом из workers потоков, комментарии переносятся этапом комментариев,
+# вложения - пулом передачи вложений, связи - отдельным проходом после всех задач.
+# Кэш пользователей, журнал и метрики используются всеми этапами. Особенности источника
+# (дополнительные поля задач, разметка текстов и скачивание вложений) задаются адаптером source.
+class TrackerSink:
+    def __init__(self, tracker_client, source, journal=None, workers=1, attachment_workers=4,
+                 attachment_mb_in_flight=256, comment_workers=8, markup=True, user_mapping=None):
+        self.tracker_client = tracker_client
+        self.source = source
+        self.journal = journal
+        self.workers = workers
+        self.attachment_workers = attachment_workers
+        self.attachment_mb_in_flight = attachment_mb_in_flight
+        self.comment_workers = comment_workers
+        self.markup = markup
+        self.user_mapping = user_mapping
+
+    # Импорт очередей и задач (tracker_issues может быть как списком, так и генератором).
+    # При дельта-синхронизации (delta) уже перенесенные задачи обновляются, а из комментариев
+    # и вложений переносятся только новые. Разметка текстов преобразуется потоково, по мере
+    # поступления задач. Если вызывающий уже проверил пользователей источника по сопоставлению
+    # (users_checked), они не проверяются повторно. Возвращает количество обработанных задач.
+    def run(self, tracker_queues, tracker_issues, delta=False, users_checked=False):
+        self.delta = delta
+        users_checked = users_checked or precheck_users(tracker_issues, self.user_mapping)
+        if self.markup:
+            tracker_issues = markup_stage(tracker_issues, self.source.convert_markup)
+        self.queues = QueueProvisioner(self.tracker_client, tracker_queues).start()
+        self.user_cache = UserCache(self.tracker_client)
+        # Пользователи из сопоставления, которых нет в Трекере, перечисляются до импорта задач,
+        # а пользователи источника без сопоставления, если задачи не были известны заранее, - после
+        self.unmapped_users = None
+        if self.user_mapping is not None:
+            self.user_mapping.check_targets(self.user_cache)
+            if not users_checked:
+                self.unmapped_users = UnmappedUsers(self.user_mapping)
+        self.attachment_transfer = AttachmentTransfer(self.tracker_client, self.attachment_workers,
+                                                      self.attachment_mb_in_flight * 1024 * 1024)
+        self.comment_stage = CommentStage(self.tracker_client, self.user_cache, self.comment_workers,
+                                          journal=self.journal)
+        self.deferred_links = DeferredLinks(self.journal)
+        try:
+            if self.workers > 1:
+                logger.info(f"Параллельный импорт задач в {self.workers} потоков.")
+                processed = self.import_issues_concurrently(tracker_issues)
+            else:
+                processed = sum(1 for tracker_issue in tracker_issues if self.import_issue(tracker_issue) is not None)
+        finally:
+            comment_failures = self.comment_stage.shutdown()
+            self.attachment_transfer.shutdown()
+            self.queues.shutdown()
+
+        # Связи создаются после всех задач, когда известны ключи Трекера для обеих сторон
+        self.deferred_links.create_all(self.tracker_client, self.workers)
+        self.user_cache.log_stats()
+        if self.unmapped_users:
+            self.unmapped_users.report()
+        if self.markup:
+            log_cache_stats()
+        raise_for_failures(comment_failures, self.deferred_links.failures())
+        return processed
+
+    # Создание задачи с проверкой исполнителя, автора и наблюдателей. Поле unique строится из
+    # ключа источника, поэтому повторное создание после сбоя вернет уже существующую задачу.
+    def create_issue(self, tracker_issue, queue):
+        fields = self.source.create_fields(tracker_issue)
+        followers = self.resolve_followers(tracker_issue)
+        if followers:
+            fields["followers"] = followers
+        return self.tracker_client.issues.create(
+            queue=queue.key,
+            unique=f"{self.source.name}-{tracker_issue.source_key}",
+            summary=tracker_issue.summary,
+            description=tracker_issue.description,
+            assignee=self.user_cache.resolve(tracker_issue.assignee),
+            author=self.user_cache.resolve(tracker_issue.reporter),
+            **fields
+        )
+
+    # Обновление полей уже перенесенной задачи при дельта-синхронизации; наблюдатели только
+    # добавляются. Статус не обновляется: в Трекере он меняется только переходами по рабочему процессу.
+    def update_issue(self, tracker_key, tracker_issue):
+        fields = self.source.update_fields(tracker_issue)
+        followers = self.resolve_followers(tracker_issue)
+        if followers:
+            fields["followers"] = {"add": followers}
+        self.tracker_client.issues[tracker_key].update(
+            summary=tracker_issue.summary,
+            description=tracker_issue.description,
+            assignee=self.user_cache.resolve(tracker_issue.assignee),
+            **fields
+        )
+
+    # Наблюдатели задачи, которые есть в Трекере (без повторов)
+    def resolve_followers(self, tracker_issue):
+        followers = (self.user_cache.resolve(follower) for follower in tracker_issue.followers)
+        return list(dict.fromkeys(follower for follower in followers if follower))
+
+    # Импорт одной задачи: создание задачи, затем вложения. Комментарии передаются этапу
+    # комментариев и переносятся параллельно, связи только запоминаются и создаются после
+    # импорта всех задач. Возвращает задачу или None, если задача пропущена.
+    @metrics.timed("issue")
+    def import_issue(self, tracker_issue):
+        try:
+            queue_key = tracker_issue.queue
+            queue = self.queues.get(queue_key)
+            if queue is None:
+                logger.warning(f"Очередь {queue_key} не найдена. Пропускаем задачу {tracker_issue.summary}.")
+                return None
+            if self.unmapped_users:
+                self.unmapped_users.add(issue_users(tracker_issue))
+
+            # Задача уже создана при предыдущем запуске: продолжаем с незавершенных этапов
+            source_key = tracker_issue.source_key
+            tracker_key = self.journal.get_tracker_key(source_key) if self.journal else None
+            if tracker_key:
+                issue = JournaledIssue(tracker_key)
+                if self.delta:
+                    with metrics.timer("issue_update"):
+                        self.update_issue(tracker_key, tracker_issue)
+                    logger.info(f"Задача {source_key} обновлена в {tracker_key}.")
+                else:
+                    logger.info(f"Задача {source_key} уже перенесена как {tracker_key}.")
+            else:
+                with metrics.timer("issue_create"):
+                    issue = self.create_issue(tracker_issue, queue)
+                if self.journal:
+                    self.journal.record_issue(source_key, issue.key)
+
+            # Добавление комментариев (по порядку, в потоках этапа комментариев)
+            if tracker_issue.comments:
+                self.comment_stage.submit(issue.key, tracker_issue.comments, source_key)
+
+            # Добавление вложений
+            if tracker_issue.attachments:
+                self.add_attachments(issue, tracker_issue.attachments, source_key)
+
+            # Связи между задачами создаются отдельным проходом
+            self.deferred_links.add(source_key, issue.key, tracker_issue.links)
+
+            logger.info(f"Задача {tracker_issue.summary} успешно создана.")
+            return issue
+        except Exception as e:
+            logger.error(f"Ошибка создания задачи {tracker_issue.summary}: {e}")
+            raise
+
+    # Добавление вложений в задачу. Вложения передаются пулом передачи вложений потоково:
+    # файл не загружается в память целиком.
+    def add_attachments(self, issue, attachments, source_key):
+        journal = self.journal
+        if journal and journal.is_done(source_key, "attachments") and \
+                journal.get_progress(source_key, "attachments") >= len(attachments):
+            return
+        futures = []
+        for index, attachment in enumerate(attachments):
+            if journal and journal.is_done(source_key, f"attachment:{index}"):
+                continue
+            filename, size, open_chunks = self.source.open_attachment(attachment)
+            futures.append((index, filename, self.attachment_transfer.submit(issue.key, filename, size, open_chunks)))
+
+        error = None
+        for index, filename, future in futures:
+            try:
+                future.result()
+                logger.info(f"Вложение {filename} успешно загружено для задачи {issue.key}.")
+                if journal:
+                    journal.mark_done(source_key, f"attachment:{index}")
+            except Exception as e:
+                logger.error(f"Ошибка загрузки вложения {filename} для задачи {issue.key}: {e}")
+                error = error or e
+        if error:
+            raise error
+        if journal:
+            journal.set_progress(source_key, "attachments", len(attachments))
+            journal.mark_done(source_key, "attachments")
+
+    # Импорт одной задачи с учетом статистики рабочего потока
+    def import_issue_with_stats(self, tracker_issue, worker_stats, stats_lock):
+        started = time.monotonic()
+        issue = self.import_issue(tracker_issue)
+        elapsed = time.monotonic() - started
+        worker = threading.current_thread().name
+        with stats_lock:
+            stats = worker_stats.setdefault(worker, {"issues": 0, "skipped": 0, "seconds": 0.0})
+            stats["issues" if issue is not None else "skipped"] += 1
+            stats["seconds"] += elapsed
+        return issue
+
+    # Параллельное создание задач пулом потоков. Вложения одной задачи ожидаются в том же
+    # потоке, что и создание задачи, а комментарии одной задачи переносятся одним потоком
+    # этапа комментариев, поэтому их порядок сохраняется.
+    # Число задач в работе ограничено, чтобы не вычитывать весь генератор задач в память.
+    def import_issues_concurrently(self, tracker_issues):
+        worker_stats = {}
+        stats_lock = threading.Lock()
+        max_pending = self.workers * 2
+        processed = 0
+        pending = set()
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="import-worker") as executor:
+            try:
+                for tracker_issue in tracker_issues:
+                    if len(pending) >= max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        processed += sum(1 for future in done if future.result() is not None)
+                    pending.add(executor.submit(self.import_issue_with_stats, tracker_issue, worker_stats, stats_lock))
+                for future in as_completed(pending):
+                    if future.result() is not None:
+                        processed += 1
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
+            finally:
+                log_worker_stats(worker_stats, time.monotonic() - started)
+        return processed
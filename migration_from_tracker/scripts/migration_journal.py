@@ -0,0 +1,103 @@
+import logging
+import sqlite3
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Ссылка на уже созданную задачу Трекера, восстановленная из журнала без обращения к API
+JournaledIssue = namedtuple("JournaledIssue", ["key"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    source_key TEXT PRIMARY KEY,
+    tracker_key TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    source_key TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (source_key, stage)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    project TEXT PRIMARY KEY,
+    updated TEXT NOT NULL
+);
+"""
+
+
+# Журнал прогресса миграции в SQLite.
+# Хранит соответствие ключей источника и Трекера, а также прогресс по этапам
+# (comments, attachments, links, ...) для каждой задачи: сколько элементов уже
+# перенесено и завершен ли этап. Повторный запуск пропускает сделанную работу.
+# Для дельта-синхронизации хранит по каждому проекту дату последнего обновления
+# перенесенных задач (high-water mark).
+class MigrationJournal:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+        count = self.connection.execute("SELECT COUNT(*) FROM issues").fetchone()[0]
+        if count:
+            logger.info(f"Журнал миграции {path}: уже перенесено {count} задач, они будут пропущены.")
+
+    def get_tracker_key(self, source_key):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT tracker_key FROM issues WHERE source_key = ?", (source_key,)).fetchone()
+        return row[0] if row else None
+
+    def record_issue(self, source_key, tracker_key):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO issues (source_key, tracker_key) VALUES (?, ?)", (source_key, tracker_key))
+
+    def get_progress(self, source_key, stage):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT progress FROM stages WHERE source_key = ? AND stage = ?", (source_key, stage)).fetchone()
+        return row[0] if row else 0
+
+    def set_progress(self, source_key, stage, progress):
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO stages (source_key, stage, progress) VALUES (?, ?, ?) "
+                "ON CONFLICT (source_key, stage) DO UPDATE SET progress = excluded.progress",
+                (source_key, stage, progress))
+
+    def is_done(self, source_key, stage):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT done FROM stages WHERE source_key = ? AND stage = ?", (source_key, stage)).fetchone()
+        return bool(row and row[0])
+
+    def mark_done(self, source_key, stage):
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO stages (source_key, stage, done) VALUES (?, ?, 1) "
+                "ON CONFLICT (source_key, stage) DO UPDATE SET done = 1", (source_key, stage))
+
+    def get_watermarks(self):
+        with self.lock:
+            return dict(self.connection.execute("SELECT project, updated FROM watermarks").fetchall())
+
+    def set_watermark(self, project, updated):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO watermarks (project, updated) VALUES (?, ?)", (project, updated))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+# Открытие журнала миграции; пустой путь отключает журналирование
+def open_journal(path):
+    if not path:
+        return None
+    logger.info(f"Используется журнал миграции: {path}")
+    return MigrationJournal(path)
@@ -0,0 +1,221 @@
+import bisect
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы длительности этапов, секунд
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# Гистограмма длительностей с фиксированными корзинами (как в Prometheus)
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    # Оценка квантиля по верхней границе корзины (для последней корзины - по максимуму)
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return round(self.max, 3)
+
+
+# Метрики миграции: длительность и количество операций по этапам, счетчики и прогресс.
+# Периодически выводит снимок строкой JSON (в файл или stdout) и при необходимости
+# записывает текстовый файл в формате Prometheus. Безопасен для использования из потоков.
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.total = 0
+        self.progress_stage = "issue"
+        self.script = ""
+        self.started = time.monotonic()
+        self.json_path = None
+        self.prometheus_path = None
+        self.interval = 0
+        self.stopped = threading.Event()
+        self.reporter = None
+
+    # Настройка вывода. json_path "-" означает stdout, пустое значение отключает вывод.
+    def configure(self, script, json_path=None, prometheus_path=None, interval=30.0, progress_stage="issue"):
+        self.script = script
+        self.json_path = json_path or None
+        self.prometheus_path = prometheus_path or None
+        self.interval = interval
+        self.progress_stage = progress_stage
+        self.started = time.monotonic()
+        if interval > 0 and (self.json_path or self.prometheus_path):
+            self.stopped.clear()
+            self.reporter = threading.Thread(target=self._report_loop, name="metrics", daemon=True)
+            self.reporter.start()
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.observe(stage, time.monotonic() - started, error=True)
+            raise
+        self.observe(stage, time.monotonic() - started)
+
+    # Декоратор: каждый вызов функции учитывается как операция этапа stage
+    # (для корутины - время до ее завершения, а не до создания)
+    def timed(self, stage):
+        def decorator(function):
+            if inspect.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def async_wrapper(*args, **kwargs):
+                    with self.timer(stage):
+                        return await function(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, stage, seconds, error=False):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            if error:
+                histogram.errors += 1
+            else:
+                histogram.observe(seconds)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    # Общее число элементов для расчета ETA (может увеличиваться по мере выгрузки)
+    def add_total(self, value):
+        with self.lock:
+            self.total += value
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.started
+        with self.lock:
+            stages = {}
+            for name, histogram in sorted(self.stages.items()):
+                stages[name] = {
+                    "count": histogram.count,
+                    "errors": histogram.errors,
+                    "per_second": round(histogram.count / elapsed, 3) if elapsed else 0.0,
+                    "avg_seconds": round(histogram.sum / histogram.count, 4) if histogram.count else None,
+                    "p50_seconds": histogram.quantile(0.5),
+                    "p95_seconds": histogram.quantile(0.95),
+                    "p99_seconds": histogram.quantile(0.99),
+                }
+            counters = dict(self.counters)
+            total = self.total
+        done = stages.get(self.progress_stage, {}).get("count", 0)
+        rate = done / elapsed if elapsed else 0.0
+        eta = (total - done) / rate if rate and total > done else None
+        return {
+            "type": "metrics",
+            "script": self.script,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "elapsed_seconds": round(elapsed, 1),
+            "progress": {"done": done, "total": total or None, "per_second": round(rate, 3),
+                         "eta_seconds": round(eta, 1) if eta is not None else None},
+            "stages": stages,
+            "counters": counters,
+        }
+
+    def emit(self):
+        snapshot = self.snapshot()
+        if self.json_path:
+            line = json.dumps(snapshot, ensure_ascii=False)
+            try:
+                if self.json_path == "-":
+                    print(line, file=sys.stdout, flush=True)
+                else:
+                    with open(self.json_path, "a", encoding="utf-8") as file:
+                        file.write(line + "\n")
+            except OSError as e:
+                logger.warning(f"Не удалось записать метрики в {self.json_path}: {e}")
+        if self.prometheus_path:
+            self._write_prometheus()
+
+    # Запись метрик в текстовом формате Prometheus (для node_exporter textfile collector).
+    # Файл заменяется атомарно, чтобы сборщик не прочитал его наполовину записанным.
+    def _write_prometheus(self):
+        script = self.script
+        lines = ["# TYPE migration_stage_seconds histogram"]
+        with self.lock:
+            for name, histogram in sorted(self.stages.items()):
+                labels = f'script="{script}",stage="{name}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.buckets):
+                    cumulative += count
+                    lines.append(f'migration_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'migration_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"migration_stage_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"migration_stage_seconds_count{{{labels}}} {histogram.count}")
+            lines.append("# TYPE migration_stage_errors_total counter")
+            for name, histogram in sorted(self.stages.items()):
+                lines.append(f'migration_stage_errors_total{{script="{script}",stage="{name}"}} {histogram.errors}')
+            lines.append("# TYPE migration_counter_total counter")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'migration_counter_total{{script="{script}",name="{name}"}} {value}')
+        progress = self.snapshot()["progress"]
+        lines.append("# TYPE migration_progress_done gauge")
+        lines.append(f'migration_progress_done{{script="{script}"}} {progress["done"]}')
+        lines.append("# TYPE migration_progress_total gauge")
+        lines.append(f'migration_progress_total{{script="{script}"}} {progress["total"] or 0}')
+        if progress["eta_seconds"] is not None:
+            lines.append("# TYPE migration_eta_seconds gauge")
+            lines.append(f'migration_eta_seconds{{script="{script}"}} {progress["eta_seconds"]}')
+        temporary = f"{self.prometheus_path}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n")
+            os.replace(temporary, self.prometheus_path)
+        except OSError as e:
+            logger.warning(f"Не удалось записать метрики в {self.prometheus_path}: {e}")
+
+    def _report_loop(self):
+        while not self.stopped.wait(self.interval):
+            self.emit()
+
+    # Остановка периодического вывода с итоговым снимком
+    def close(self):
+        self.stopped.set()
+        if self.reporter:
+            self.reporter.join()
+            self.reporter = None
+        if self.json_path or self.prometheus_path:
+            self.emit()
+
+
+# Общий экземпляр метрик для всех модулей миграции
+metrics = Metrics()
@@ -0,0 +1,130 @@
+import json
+import logging
+import math
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+# План миграции, собранный по дешевым запросам к источнику (режим --plan).
+# Количество задач известно для каждого проекта точно, а комментарии, вложения и связи
+# считаются по выборке задач проекта и пересчитываются на весь проект; если выборка
+# покрывает проект целиком, оценка точная. По итогам оценивается число запросов к
+# Яндекс Трекеру по типам, объем передаваемых вложений и время импорта при заданных
+# ограничении частоты и числе потоков.
+class MigrationPlan:
+    def __init__(self, source):
+        self.source = source
+        self.projects = {}
+        self.source_calls = Counter()
+        self.users = Counter()
+
+    def add_project(self, key, issues):
+        self.projects[key] = {"issues": issues, "sampled": 0, "comments": 0, "attachments": 0,
+                              "attachment_bytes": 0, "links": 0}
+
+    # Учет одной задачи из выборки проекта
+    def add_sample(self, project_key, comments=0, attachment_sizes=(), links=0):
+        project = self.projects[project_key]
+        project["sampled"] += 1
+        project["comments"] += comments
+        project["attachments"] += len(attachment_sizes)
+        project["attachment_bytes"] += sum(size or 0 for size in attachment_sizes)
+        project["links"] += links
+
+    def add_users(self, *users):
+        self.users.update(user for user in users if user)
+
+    def add_source_calls(self, kind, count=1):
+        self.source_calls[kind] += count
+
+    # Пересчет выборок на полный объем проектов
+    def totals(self):
+        totals = Counter(dict.fromkeys(("issues", "sampled", "comments", "attachments", "attachment_bytes", "links"), 0))
+        for project in self.projects.values():
+            totals["issues"] += project["issues"]
+            totals["sampled"] += project["sampled"]
+            if not project["sampled"]:
+                continue
+            scale = project["issues"] / project["sampled"]
+            for field in ("comments", "attachments", "attachment_bytes", "links"):
+                totals[field] += project[field] * scale
+        return {field: math.ceil(value) for field, value in totals.items()}
+
+    # Оценка запросов к Трекеру и времени импорта. Задачи, комментарии и вложения
+    # переносятся одновременно своими пулами потоков, связи - после всех задач;
+    # каждый этап ограничен числом потоков и задержкой запроса, а все вместе - общим
+    # ограничением частоты запросов к Трекеру.
+    def estimate(self, user_mapping, workers, attachment_workers, comment_workers, rate_limit, latency,
+                 bandwidth_mb):
+        totals = self.totals()
+        calls = {
+            "users": 1,
+            "queue_list": 1,
+            "queue_create": len(self.projects),
+            "issue_create": totals["issues"],
+            "comment": totals["comments"],
+            "attachment": totals["attachments"],
+            "link": totals["links"],
+        }
+        concurrent_calls = sum(calls.values()) - calls["link"]
+        workers = max(workers, 1)
+        stages = {
+            "issues": calls["issue_create"] * latency / workers,
+            "comments": calls["comment"] * latency / max(comment_workers, 1),
+            "attachments": calls["attachment"] * latency / max(attachment_workers, 1) +
+                           totals["attachment_bytes"] / (bandwidth_mb * 1024 * 1024),
+        }
+        import_seconds = max(stages.values())
+        link_seconds = calls["link"] * latency / workers
+        if rate_limit:
+            import_seconds = max(import_seconds, concurrent_calls / rate_limit)
+            link_seconds = max(link_seconds, calls["link"] / rate_limit)
+        unmapped = sorted(user for user in self.users if user not in user_mapping)
+        return {
+            "source": self.source,
+            "projects": len(self.projects),
+            "issues": totals["issues"],
+            "sampled_issues": totals["sampled"],
+            "comments": totals["comments"],
+            "attachments": totals["attachments"],
+            "attachment_bytes": totals["attachment_bytes"],
+            "links": totals["links"],
+            "source_calls": dict(self.source_calls),
+            "tracker_calls": calls,
+            "tracker_calls_total": sum(calls.values()),
+            "stage_seconds": {stage: round(seconds, 1) for stage, seconds in stages.items()},
+            "projected_seconds": round(import_seconds + link_seconds, 1),
+            "assumptions": {"workers": workers, "attachment_workers": attachment_workers,
+                            "comment_workers": comment_workers, "rate_limit": rate_limit,
+                            "latency": latency, "bandwidth_mb": bandwidth_mb},
+            "users": len(self.users),
+            "unmapped_users": unmapped,
+        }
+
+
+# Вывод плана в журнал и, если указан файл, в JSON
+def report_plan(plan, output=None):
+    logger.info(f"План миграции из {plan['source']}: {plan['projects']} проектов, {plan['issues']} задач "
+                f"(по выборке из {plan['sampled_issues']} задач: {plan['comments']} комментариев, "
+                f"{plan['attachments']} вложений на {plan['attachment_bytes'] / (1024 * 1024):.1f} МБ, "
+                f"{plan['links']} связей).")
+    for kind, count in plan["source_calls"].items():
+        logger.info(f"Запросов к {plan['source']} ({kind}): {count}.")
+    for kind, count in plan["tracker_calls"].items():
+        logger.info(f"Запросов к Яндекс Трекеру ({kind}): {count}.")
+    assumptions = plan["assumptions"]
+    rate = f"ограничении {assumptions['rate_limit']} запросов/с" if assumptions["rate_limit"] else "без ограничения частоты"
+    logger.info(f"Всего запросов к Яндекс Трекеру: {plan['tracker_calls_total']}. Оценка времени импорта: "
+                f"{plan['projected_seconds'] / 3600:.2f} ч ({plan['projected_seconds']} с) при "
+                f"{assumptions['workers']} потоках задач, {assumptions['comment_workers']} потоках комментариев, "
+                f"{assumptions['attachment_workers']} потоках вложений, задержке запроса {assumptions['latency']} с "
+                f"и {rate}.")
+    if plan["unmapped_users"]:
+        logger.warning(f"Пользователи без сопоставления ({len(plan['unmapped_users'])} из {plan['users']}): "
+                       f"{', '.join(plan['unmapped_users'][:50])}"
+                       f"{' ...' if len(plan['unmapped_users']) > 50 else ''}")
+    if output:
+        with open(output, "w") as file:
+            json.dump(plan, file, ensure_ascii=False, indent=2)
+        logger.info(f"План сохранен в {output}.")
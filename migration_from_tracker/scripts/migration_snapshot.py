@@ -0,0 +1,116 @@
+import gzip
+import json
+import logging
+import os
+import time
+
+from migration_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+COMPRESS_LEVEL = 6  # Уровень сжатия gzip: баланс между скоростью выгрузки и размером файла
+
+
+# Снимок выгруженных данных источника: сжатый gzip файл JSONL.
+# Первая строка - заголовок (источник, версия формата, время выгрузки), затем проекты,
+# затем по одной строке на задачу вместе с комментариями и метаданными вложений,
+# последняя строка - итог с количеством записей. Итог позволяет отличить полный снимок
+# от оборванного. Файл пишется во временный и переименовывается только после успешной
+# выгрузки, поэтому на месте снимка никогда не оказывается недописанный файл.
+class SnapshotWriter:
+    def __init__(self, path, source):
+        self.path = path
+        self.temporary = f"{path}.tmp"
+        self.file = gzip.open(self.temporary, "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL)
+        self.counts = {"projects": 0, "issues": 0}
+        self.started = time.monotonic()
+        self._write({"type": "header", "source": source, "version": SNAPSHOT_VERSION,
+                     "created": time.strftime("%Y-%m-%dT%H:%M:%S")})
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        self.file.write("\n")
+
+    # Проекты записываются до задач, чтобы при чтении очереди были известны сразу
+    def write_project(self, project):
+        if self.counts["issues"]:
+            raise ValueError("Проекты должны быть записаны в снимок до задач.")
+        self._write({"type": "project", "data": project})
+        self.counts["projects"] += 1
+
+    def write_issue(self, issue):
+        with metrics.timer("snapshot_write"):
+            self._write({"type": "issue", "data": issue})
+        self.counts["issues"] += 1
+
+    def close(self):
+        self._write(dict({"type": "end"}, **self.counts))
+        self.file.close()
+        os.replace(self.temporary, self.path)
+        size = os.path.getsize(self.path) / (1024 * 1024)
+        logger.info(f"Снимок {self.path} записан: {self.counts['projects']} проектов, {self.counts['issues']} задач, "
+                    f"{size:.1f} МБ за {time.monotonic() - self.started:.1f} с.")
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.temporary)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# Чтение снимка. Заголовок и проекты читаются при открытии, задачи - потоково
+# методом issues(), поэтому в памяти одновременно находится только одна задача.
+# Проход без учета в прогрессе миграции (progress=False) нужен для проверок до импорта.
+class SnapshotReader:
+    def __init__(self, path, source):
+        if not os.path.isfile(path):
+            logger.error(f"Файл снимка {path} не найден.")
+            raise FileNotFoundError(f"Файл снимка {path} не найден.")
+        self.path = path
+        self.file = gzip.open(path, "rt", encoding="utf-8")
+        self.header = self._read()
+        if not self.header or self.header.get("type") != "header":
+            raise ValueError(f"Файл {path} не является снимком миграции.")
+        if self.header.get("source") != source or self.header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Снимок {path} создан для источника {self.header.get('source')} "
+                             f"(версия {self.header.get('version')}), ожидается {source} (версия {SNAPSHOT_VERSION}).")
+        self.projects = []
+        self.pending = self._read()
+        while self.pending and self.pending["type"] == "project":
+            self.projects.append(self.pending["data"])
+            self.pending = self._read()
+        logger.info(f"Открыт снимок {path} от {self.header.get('created')}: {len(self.projects)} проектов.")
+
+    def _read(self):
+        line = self.file.readline()
+        return json.loads(line) if line else None
+
+    def issues(self, progress=True):
+        record, count = self.pending, 0
+        while record and record["type"] == "issue":
+            count += 1
+            if progress:
+                metrics.add_total(1)
+            yield record["data"]
+            record = self._read()
+        if not record or record["type"] != "end" or record.get("issues") != count:
+            raise ValueError(f"Снимок {self.path} оборван: прочитано {count} задач, итоговая запись отсутствует "
+                             f"или не совпадает.")
+        logger.info(f"Из снимка {self.path} прочитано {count} задач.")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
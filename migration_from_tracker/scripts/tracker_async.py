@@ -0,0 +1,741 @@
+import asyncio
+import itertools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from tracker_throttle import RETRYABLE_STATUS_CODES, backoff_delay, parse_retry_after, retry_safe
+from tracker_users import UserCache
+from attachment_transfer import CHUNK_SIZE, SPOOL_MEMORY, AttachmentSizeError, MultipartBody, spool_chunks
+from migration_engine import (QUEUE_LEAD, QUEUE_PAGE_SIZE, queue_settings, raise_for_failures, issue_users,
+                              precheck_users)
+from user_mapping_index import UnmappedUsers
+from markup_converter import markup_stage, log_cache_stats
+from tracker_links import DeferredLinks
+from migration_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 60  # Время ожидания ответа Яндекс Трекера, секунд
+SEARCH_PAGE_SIZE = 100  # Количество задач на странице поиска
+
+_DONE = object()
+
+
+# Ошибка запроса к Яндекс Трекеру: ответ 4xx (status) или неудача после всех повторов
+class TrackerAPIError(Exception):
+    def __init__(self, method, path, reason, status=None, messages=()):
+        super().__init__(f"{method} {path}: {reason}{': ' + '; '.join(messages) if messages else ''}")
+        self.status = status
+        self.messages = list(messages)
+
+
+# Адаптивный ограничитель для цикла событий, аналог AdaptiveLimiter: лимит одновременных
+# запросов и частота (алгоритм GCRA: каждый запрос получает время отправки в порядке
+# очереди, поэтому сотни ожидающих корутин не будят друг друга). При ответах 429 частота
+# и параллельность уменьшаются вдвое и затем постепенно восстанавливаются (AIMD),
+# а Retry-After приостанавливает отправку всех запросов.
+class AsyncAdaptiveLimiter:
+    def __init__(self, rate, max_concurrency=256, adaptive=True, min_rate=0.5):
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.min_rate = min(float(min_rate), self.max_rate) if rate > 0 else 0.0
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.adaptive = adaptive
+        self.burst = max(1.0, self.max_rate)
+        self.next_time = 0.0
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            await self._wait_rate()
+            yield
+        finally:
+            async with self.condition:
+                self.in_flight -= 1
+                self.condition.notify(max(1, int(self.limit) - self.in_flight))
+
+    async def _wait_rate(self):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        start = max(self.next_time, now)
+        self.next_time = start + 1 / self.rate
+        delay = start - now - (self.burst - 1) / self.rate
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        self.next_time = max(self.next_time, time.monotonic() + seconds + (self.burst - 1) / max(self.rate, 1.0))
+
+    def on_success(self):
+        if not self.adaptive:
+            return
+        if self.limit < self.max_concurrency:
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.01)
+
+    def on_throttled(self, retry_after=None):
+        if self.adaptive:
+            self.limit = max(1.0, self.limit / 2)
+            if self.max_rate > 0:
+                self.rate = max(self.min_rate, self.rate / 2)
+        if retry_after:
+            self.pause(retry_after)
+
+
+# Асинхронный клиент Яндекс Трекера на aiohttp для запросов, которые выполняет импорт:
+# пользователи, очереди, создание, обновление (в том числе наблюдателей) и поиск задач,
+# комментарии, вложения и связи. Все запросы идут через один пул соединений на max_concurrency
+# соединений с общим ограничением частоты и повторами при 429/5xx и сетевых ошибках,
+# поэтому один процесс держит сотни одновременных запросов без потока на каждый.
+# Создается и используется внутри одного цикла событий (async with).
+class AsyncTrackerClient:
+    def __init__(self, base_url, headers, rate_limit=10.0, max_concurrency=256, max_retries=8, adaptive=True,
+                 api_version="v2", timeout=REQUEST_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {name: value for name, value in headers.items() if name.lower() != "content-type"}
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_retries = max_retries
+        self.api_version = api_version
+        self.timeout = timeout
+        self.limiter = AsyncAdaptiveLimiter(rate_limit, max_concurrency, adaptive)
+        self.session = None
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "server_errors": 0, "failed": 0,
+                      "connections": 0, "reused": 0}
+
+    # Клиент с теми же адресом, авторизацией и ограничениями, что и у синхронного клиента
+    @classmethod
+    def from_tracker_client(cls, tracker_client, max_concurrency=256):
+        connection = tracker_client._connection
+        limiter = getattr(connection, "limiter", None)
+        return cls(connection.base_url, dict(connection.session.headers),
+                   rate_limit=limiter.max_rate if limiter else 0.0, max_concurrency=max_concurrency,
+                   max_retries=getattr(connection, "max_retries", 8), adaptive=limiter.adaptive if limiter else True,
+                   api_version=connection.api_version)
+
+    async def __aenter__(self):
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(self._on_connection_created)
+        trace.on_connection_reuseconn.append(self._on_connection_reused)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300),
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[trace],
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        self.log_stats()
+
+    async def _on_connection_created(self, session, context, params):
+        self.stats["connections"] += 1
+
+    async def _on_connection_reused(self, session, context, params):
+        self.stats["reused"] += 1
+
+    def url(self, path):
+        return f"{self.base_url}/{self.api_version}/{path.lstrip('/')}"
+
+    # Запрос с повторами; data может быть функцией, которая строит тело запроса заново для
+    # каждой попытки (так повторяются запросы с потоковым телом). Неидемпотентные POST
+    # (см. retry_safe) повторяются только после ответа 429 или если соединение не было
+    # установлено. Возвращает JSON ответа и заголовок Link со следующей страницей (или None).
+    async def request(self, method, path, json=None, params=None, data=None, headers=None):
+        url = path if path.startswith("http") else self.url(path)
+        safe = retry_safe(method, url, json)
+        attempt = 0
+        while True:
+            reason = retry_after = None
+            try:
+                body = data() if callable(data) else data
+                async with self.limiter.slot(), self.session.request(method, url, json=json, params=params, data=body,
+                                                                     headers=headers) as response:
+                    self.stats["requests"] += 1
+                    if response.status not in RETRYABLE_STATUS_CODES:
+                        try:
+                            body = await response.json(content_type=None)
+                        except ValueError:
+                            body = None
+                        if response.status >= 400:
+                            messages = body.get("errorMessages", []) if isinstance(body, dict) else []
+                            raise TrackerAPIError(method, path, f"HTTP {response.status}", response.status, messages)
+                        self.limiter.on_success()
+                        next_page = response.links.get("next", {}).get("url")
+                        return body, str(next_page) if next_page else None
+                    reason = f"HTTP {response.status}"
+                    retryable = safe or response.status == 429
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if response.status == 429:
+                        self.stats["throttled"] += 1
+                        self.limiter.on_throttled(retry_after)
+                    else:
+                        self.stats["server_errors"] += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # aiohttp оборачивает ошибку чтения тела; несовпадение размера вложения - не сетевая ошибка
+                if isinstance(e.__cause__, AttachmentSizeError):
+                    raise e.__cause__
+                self.stats["requests"] += 1
+                reason = f"{type(e).__name__}: {e}"
+                retryable = safe or isinstance(e, (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError))
+            if attempt >= self.max_retries or not retryable:
+                self.stats["failed"] += 1
+                raise TrackerAPIError(method, path, reason)
+            delay = retry_after if retry_after is not None else backoff_delay(attempt)
+            logger.warning(f"Запрос {method} {path} не выполнен ({reason}), "
+                           f"повтор {attempt + 1}/{self.max_retries} через {delay:.1f} с.")
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    # Все страницы списка (переход по заголовку Link)
+    async def get_all(self, path, params=None, method="GET", json=None):
+        items = []
+        url = path
+        while url:
+            page, url = await self.request(method, url, json=json, params=params)
+            items.extend(page or [])
+            params = None
+        return items
+
+    async def myself(self):
+        return (await self.request("GET", "/myself"))[0]
+
+    async def users(self):
+        return await self.get_all("/users/")
+
+    async def get_user(self, user):
+        return (await self.request("GET", f"/users/{user}"))[0]
+
+    async def queues(self, per_page=QUEUE_PAGE_SIZE):
+        return await self.get_all("/queues/", {"perPage": per_page})
+
+    async def get_queue(self, key):
+        return (await self.request("GET", f"/queues/{key}"))[0]
+
+    async def create_queue(self, **fields):
+        return (await self.request("POST", "/queues/", json=fields))[0]
+
+    # Создание задачи. Если задача с таким unique уже есть (повтор после сбоя),
+    # возвращается существующая задача, как в синхронном клиенте.
+    async def create_issue(self, **fields):
+        fields = {name: value for name, value in fields.items() if value is not None}
+        try:
+            return (await self.request("POST", "/issues/", json=fields))[0]
+        except TrackerAPIError as e:
+            if e.status != 409 or not fields.get("unique"):
+                raise
+        return (await self.request("POST", "/issues/_findByUnique", params={"unique": fields["unique"]}))[0]
+
+    async def update_issue(self, key, **fields):
+        return (await self.request("PATCH", f"/issues/{key}", json=fields))[0]
+
+    async def find_issues(self, filter=None, query=None, per_page=SEARCH_PAGE_SIZE):
+        body = {"filter": filter} if filter is not None else {"query": query}
+        return await self.get_all("/issues/_search", {"perPage": per_page}, method="POST", json=body)
+
+    async def create_comment(self, key, text, author=None):
+        fields = {"text": text}
+        if author:
+            fields["author"] = author
+        return (await self.request("POST", f"/issues/{key}/comments", json=fields))[0]
+
+    async def create_link(self, key, relationship, issue):
+        return (await self.request("POST", f"/issues/{key}/links", json={"relationship": relationship,
+                                                                          "issue": issue}))[0]
+
+    # Потоковая загрузка вложения: тело multipart (MultipartBody) читается блоками в потоках
+    # executor (источник - синхронный итератор) и уходит с Content-Length, не загружаясь в
+    # память целиком. Файл неизвестного размера, или если источник отдал не заявленное
+    # число байт, сначала пишется во временный файл (spool_chunks).
+    # При повторе запроса файл читается из источника заново.
+    async def upload_attachment(self, key, filename, size, open_chunks, executor=None):
+        if size:
+            try:
+                return await self._upload_body(key, filename, size, open_chunks, executor), size
+            except AttachmentSizeError as e:
+                logger.warning(f"Вложение {filename} задачи {key} передается через временный файл: {e}")
+        spool, size = await asyncio.get_running_loop().run_in_executor(executor, spool_chunks, open_chunks)
+        with spool:
+            def read_spool():
+                spool.seek(0)
+                return iter(lambda: spool.read(CHUNK_SIZE), b"")
+
+            return await self._upload_body(key, filename, size, read_spool, executor), size
+
+    async def _upload_body(self, key, filename, size, open_chunks, executor):
+        loop = asyncio.get_running_loop()
+        multipart = await loop.run_in_executor(executor, MultipartBody, size, open_chunks, True)
+        attempts = itertools.count()
+
+        async def body():
+            if next(attempts):
+                await loop.run_in_executor(executor, multipart.rewind)
+            async for chunk in _iterate_in_thread(iter(multipart), executor):
+                yield chunk
+
+        headers = {"Content-Type": multipart.content_type, "Content-Length": str(multipart.len)}
+        attachment, _ = await self.request("POST", f"/issues/{key}/attachments/", params={"filename": filename},
+                                           data=body, headers=headers)
+        return attachment
+
+    def log_stats(self):
+        stats = self.stats
+        logger.info(f"Асинхронных запросов к Яндекс Трекеру: {stats['requests']}, повторов: {stats['retries']}, "
+                    f"ответов 429: {stats['throttled']}, ошибок сервера: {stats['server_errors']}, "
+                    f"неудачных: {stats['failed']}. Итоговая частота: {round(self.limiter.rate, 2)} запр/с, "
+                    f"параллельность: {int(self.limiter.limit)}. "
+                    f"Соединений открыто: {stats['connections']}, повторно использовано: {stats['reused']}.")
+
+
+# Асинхронный итератор по синхронному: каждый блок читается в потоке executor,
+# чтобы медленный источник не останавливал цикл событий
+async def _iterate_in_thread(iterator, executor=None):
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await loop.run_in_executor(executor, next, iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+
+# Выполнение корутин из итерируемого набора (в том числе генератора), не больше limit
+# одновременно: корутины создаются по мере освобождения мест, а не все сразу
+async def run_bounded(coroutines, limit):
+    pending = set()
+    for coroutine in coroutines:
+        if len(pending) >= limit:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        pending.add(asyncio.ensure_future(coroutine))
+    if pending:
+        await asyncio.gather(*pending)
+
+
+# Кэш пользователей для асинхронного импорта. Список пользователей загружается асинхронным
+# клиентом; если это не удалось, каждый пользователь проверяется одним асинхронным запросом,
+# а одновременные проверки одного пользователя объединяются. Синхронный resolve (например,
+# для UserMapping.check_targets в потоке) работает как у UserCache.
+class AsyncUserCache(UserCache):
+    def __init__(self, tracker_client, async_client):
+        super().__init__(tracker_client, prefetch=False)
+        self.async_client = async_client
+        self.lookups = {}
+
+    async def prefetch_async(self):
+        try:
+            users = await self.async_client.users()
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить список пользователей Яндекс Трекера, "
+                           f"будут использоваться одиночные запросы: {e}")
+            return
+        self.store(identifier for user in users for identifier in (user.get("uid"), user.get("login"), user.get("email")))
+
+    async def resolve_async(self, user):
+        if not user:
+            return None
+        key = str(user)
+        with self.lock:
+            cached = self.complete or key in self.known
+        if cached:
+            return self.resolve(user)
+        lookup = self.lookups.get(key)
+        if lookup is None:
+            lookup = self.lookups[key] = asyncio.ensure_future(self._lookup_async(user))
+        exists = await lookup
+        with self.lock:
+            self.known[key] = exists
+        return user if exists else None
+
+    @metrics.timed("user_lookup")
+    async def _lookup_async(self, user):
+        try:
+            await self.async_client.get_user(user)
+            logger.info(f"Пользователь {user} найден в Яндекс Трекере.")
+            exists = True
+        except Exception:
+            logger.warning(f"Пользователь {user} не найден в Яндекс Трекере.")
+            exists = False
+        with self.lock:
+            self.stats["lookups"] += 1
+        return exists
+
+
+# Импорт задач в Яндекс Трекер в цикле событий asyncio (режим --async-io) с тем же
+# методом run, что и у TrackerSink (пулов потоков задач и комментариев здесь нет). Этапы те же: очереди, задачи, комментарии, вложения,
+# связи и журнал, но каждая задача переносится корутиной, а все запросы идут через
+# AsyncTrackerClient, поэтому одновременно в работе до concurrency задач без потока на
+# каждую. Потоки нужны только для чтения задач из источника, блоков вложений и журнала:
+# библиотеки источников и sqlite3 синхронные, поэтому обращения к журналу выполняются
+# отдельным потоком и не останавливают цикл событий. Комментарии задачи переносятся по порядку, вложения - параллельно
+# с ограничением суммарного размера, связи - после всех задач.
+class AsyncTrackerSink:
+    def __init__(self, tracker_client, source, journal=None, attachment_workers=4, attachment_mb_in_flight=256,
+                 markup=True, user_mapping=None, concurrency=256):
+        self.tracker_client = tracker_client
+        self.source = source
+        self.journal = journal
+        self.attachment_workers = max(attachment_workers, 1)
+        self.attachment_bytes = attachment_mb_in_flight * 1024 * 1024
+        self.markup = markup
+        self.user_mapping = user_mapping
+        self.concurrency = max(concurrency, 1)
+
+    def run(self, tracker_queues, tracker_issues, delta=False, users_checked=False):
+        self.delta = delta
+        self.users_checked = users_checked or precheck_users(tracker_issues, self.user_mapping)
+        if self.markup:
+            tracker_issues = markup_stage(tracker_issues, self.source.convert_markup)
+        processed = asyncio.run(self._run(tracker_queues, tracker_issues))
+        self.user_cache.log_stats()
+        if self.markup:
+            log_cache_stats()
+        return processed
+
+    async def _run(self, tracker_queues, tracker_issues):
+        self.reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="async-reader")
+        self.journal_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="async-journal")
+        self.executor = ThreadPoolExecutor(max_workers=self.attachment_workers, thread_name_prefix="async-attachment")
+        self.attachment_slots = asyncio.Semaphore(self.attachment_workers)
+        self.attachment_condition = asyncio.Condition()
+        self.bytes_in_flight = 0
+        self.stats = {"issues": 0, "skipped": 0, "comments": 0, "comment_issues": 0, "comment_skipped": 0,
+                      "comment_failed": 0, "files": 0, "bytes": 0}
+        self.deferred_links = DeferredLinks(self.journal)
+        try:
+            async with AsyncTrackerClient.from_tracker_client(self.tracker_client, self.concurrency) as client:
+                self.client = client
+                self.user_cache = AsyncUserCache(self.tracker_client, client)
+                await self.user_cache.prefetch_async()
+                await self._start_queues(tracker_queues)
+                # Пользователи из сопоставления, которых нет в Трекере, перечисляются до импорта задач,
+                # а пользователи источника без сопоставления, если задачи не были известны заранее, - после
+                self.unmapped_users = None
+                if self.user_mapping is not None:
+                    await asyncio.get_running_loop().run_in_executor(self.reader, self.user_mapping.check_targets,
+                                                                     self.user_cache)
+                if self.user_mapping is not None and not self.users_checked:
+                    self.unmapped_users = await asyncio.get_running_loop().run_in_executor(
+                        self.reader, UnmappedUsers, self.user_mapping)
+                try:
+                    processed = await self._import_issues(tracker_issues)
+                finally:
+                    await self._finish_queues()
+                    self.log_stats()
+                # Связи создаются после всех задач, когда известны ключи Трекера для обеих сторон
+                await self._create_links()
+                if self.unmapped_users:
+                    self.unmapped_users.report()
+                raise_for_failures(self.stats["comment_failed"], self.deferred_links.failures())
+        finally:
+            self.reader.shutdown(wait=False)
+            self.executor.shutdown(wait=True)
+            self.journal_executor.shutdown(wait=True)
+        return processed
+
+    # Очереди: существующие загружаются одним списком, недостающие создаются одновременно;
+    # задача ждет только создания своей очереди
+    async def _start_queues(self, tracker_queues):
+        try:
+            with metrics.timer("queue_list"):
+                existing = {queue["key"]: queue for queue in await self.client.queues()}
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить список очередей Яндекс Трекера, "
+                           f"каждая очередь будет проверена отдельно: {e}")
+            existing = None
+        self.queue_stats = {"existing": 0, "created": 0, "failed": 0}
+        self.queues = {}
+        lead = None
+        for key, tracker_queue in tracker_queues.items():
+            if existing is not None and key in existing:
+                self.queues[key] = asyncio.get_running_loop().create_future()
+                self.queues[key].set_result(existing[key])
+                self.queue_stats["existing"] += 1
+                continue
+            if lead is None:
+                lead = await self._queue_lead()
+            self.queues[key] = asyncio.ensure_future(self._provision_queue(tracker_queue, existing is None, lead))
+        logger.info(f"Очередей: {len(tracker_queues)}, уже существуют {self.queue_stats['existing']}, "
+                    f"создаются или проверяются {len(tracker_queues) - self.queue_stats['existing']}.")
+
+    # Руководитель новых очередей: QUEUE_LEAD или владелец токена
+    async def _queue_lead(self):
+        if QUEUE_LEAD:
+            return QUEUE_LEAD
+        try:
+            return (await self.client.myself()).get("login") or ""
+        except Exception as e:
+            logger.warning(f"Не удалось определить руководителя очередей (QUEUE_LEAD): {e}")
+            return ""
+
+    @metrics.timed("queue")
+    async def _provision_queue(self, tracker_queue, check_existing, lead):
+        if check_existing:
+            try:
+                queue = await self.client.get_queue(tracker_queue["key"])
+                logger.info(f"Очередь {tracker_queue['name']} уже существует.")
+                self.queue_stats["existing"] += 1
+                return queue
+            except Exception:
+                pass
+        try:
+            queue = await self.client.create_queue(**queue_settings(tracker_queue, lead))
+        except TrackerAPIError as e:
+            if e.status != 409:
+                logger.error(f"Ошибка создания очереди {tracker_queue['name']}: {e}")
+                self.queue_stats["failed"] += 1
+                raise
+            # Очередь уже создана (например, повторенным после сбоя запросом)
+            queue = await self.client.get_queue(tracker_queue["key"])
+            logger.info(f"Очередь {tracker_queue['name']} уже существует.")
+            self.queue_stats["existing"] += 1
+            return queue
+        except Exception as e:
+            logger.error(f"Ошибка создания очереди {tracker_queue['name']}: {e}")
+            self.queue_stats["failed"] += 1
+            raise
+        logger.info(f"Создана очередь: {tracker_queue['name']}")
+        self.queue_stats["created"] += 1
+        return queue
+
+    async def _finish_queues(self):
+        await asyncio.gather(*self.queues.values(), return_exceptions=True)
+        logger.info(f"Очереди: уже существовали {self.queue_stats['existing']}, создано {self.queue_stats['created']}, "
+                    f"с ошибкой {self.queue_stats['failed']}.")
+
+    # Задачи читаются из источника в отдельном потоке по одной, в работе не больше concurrency задач
+    async def _import_issues(self, tracker_issues):
+        loop = asyncio.get_running_loop()
+        iterator = iter(tracker_issues)
+        logger.info(f"Асинхронный импорт задач: до {self.concurrency} задач одновременно.")
+        started = time.monotonic()
+        pending = set()
+        try:
+            while True:
+                if len(pending) >= self.concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                tracker_issue = await loop.run_in_executor(self.reader, next, iterator, _DONE)
+                if tracker_issue is _DONE:
+                    break
+                pending.add(asyncio.ensure_future(self.import_issue(tracker_issue)))
+            if pending:
+                await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            rate = self.stats["issues"] / elapsed if elapsed else 0.0
+            logger.info(f"Всего создано {self.stats['issues']} задач за {elapsed:.1f} с ({rate:.2f} задач/с), "
+                        f"пропущено {self.stats['skipped']}.")
+        return self.stats["issues"]
+
+    async def create_issue(self, tracker_issue, queue):
+        fields = self.source.create_fields(tracker_issue)
+        followers = await self.resolve_followers(tracker_issue)
+        if followers:
+            fields["followers"] = followers
+        return await self.client.create_issue(
+            queue=queue["key"],
+            unique=f"{self.source.name}-{tracker_issue.source_key}",
+            summary=tracker_issue.summary,
+            description=tracker_issue.description,
+            assignee=await self.user_cache.resolve_async(tracker_issue.assignee),
+            author=await self.user_cache.resolve_async(tracker_issue.reporter),
+            **fields
+        )
+
+    async def update_issue(self, tracker_key, tracker_issue):
+        fields = self.source.update_fields(tracker_issue)
+        followers = await self.resolve_followers(tracker_issue)
+        if followers:
+            fields["followers"] = {"add": followers}
+        await self.client.update_issue(
+            tracker_key,
+            summary=tracker_issue.summary,
+            description=tracker_issue.description,
+            assignee=await self.user_cache.resolve_async(tracker_issue.assignee),
+            **fields
+        )
+
+    async def resolve_followers(self, tracker_issue):
+        followers = [await self.user_cache.resolve_async(follower) for follower in tracker_issue.followers]
+        return list(dict.fromkeys(follower for follower in followers if follower))
+
+    # Импорт одной задачи: создание (или обновление при дельта-синхронизации), затем
+    # комментарии и вложения одновременно. Возвращает ключ задачи или None, если она пропущена.
+    @metrics.timed("issue")
+    async def import_issue(self, tracker_issue):
+        try:
+            queue_future = self.queues.get(tracker_issue.queue)
+            if queue_future is None:
+                logger.warning(f"Очередь {tracker_issue.queue} не найдена. Пропускаем задачу {tracker_issue.summary}.")
+                self.stats["skipped"] += 1
+                return None
+            if self.unmapped_users:
+                self.unmapped_users.add(issue_users(tracker_issue))
+            queue = await queue_future
+
+            # Задача уже создана при предыдущем запуске: продолжаем с незавершенных этапов
+            source_key = tracker_issue.source_key
+            issue_key = await self._journal(self.journal.get_tracker_key, source_key) if self.journal else None
+            if issue_key:
+                if self.delta:
+                    with metrics.timer("issue_update"):
+                        await self.update_issue(issue_key, tracker_issue)
+                    logger.info(f"Задача {source_key} обновлена в {issue_key}.")
+                else:
+                    logger.info(f"Задача {source_key} уже перенесена как {issue_key}.")
+            else:
+                with metrics.timer("issue_create"):
+                    issue_key = (await self.create_issue(tracker_issue, queue))["key"]
+                if self.journal:
+                    await self._journal(self.journal.record_issue, source_key, issue_key)
+
+            stages = []
+            if tracker_issue.comments:
+                stages.append(self.import_comments(issue_key, tracker_issue.comments, source_key))
+            if tracker_issue.attachments:
+                stages.append(self.add_attachments(issue_key, tracker_issue.attachments, source_key))
+            await asyncio.gather(*stages)
+
+            # Связи между задачами создаются отдельным проходом
+            self.deferred_links.add(source_key, issue_key, tracker_issue.links)
+
+            logger.info(f"Задача {tracker_issue.summary} успешно создана.")
+            self.stats["issues"] += 1
+            return issue_key
+        except Exception as e:
+            logger.error(f"Ошибка создания задачи {tracker_issue.summary}: {e}")
+            raise
+
+    # Комментарии задачи по порядку; после неудачного комментария остальные пропускаются,
+    # чтобы не нарушить порядок (продолжение - по журналу при повторном запуске)
+    async def import_comments(self, issue_key, comments, source_key):
+        journal = self.journal
+        start = await self._journal(journal.get_progress, source_key, "comments") if journal else 0
+        if journal and start >= len(comments) and await self._journal(journal.is_done, source_key, "comments"):
+            self.stats["comment_skipped"] += 1
+            return
+        for index, comment in enumerate(comments[start:], start):
+            try:
+                await self._create_comment(issue_key, comment)
+            except Exception as e:
+                logger.error(f"Ошибка добавления комментария {index + 1} из {len(comments)} к задаче {issue_key}, "
+                             f"остальные комментарии задачи пропущены: {e}")
+                self.stats["comment_failed"] += 1
+                return
+            if journal:
+                await self._journal(journal.set_progress, source_key, "comments", index + 1)
+            self.stats["comments"] += 1
+        if journal:
+            await self._journal(journal.mark_done, source_key, "comments")
+        self.stats["comment_issues"] += 1
+        logger.info(f"Комментарии ({len(comments) - start}) добавлены к задаче {issue_key}.")
+
+    @metrics.timed("comment")
+    async def _create_comment(self, issue_key, comment):
+        author = await self.user_cache.resolve_async(comment.author)
+        return await self.client.create_comment(issue_key, comment.body, author)
+
+    # Вложения задачи передаются одновременно, не больше attachment_workers файлов
+    # и attachment_mb_in_flight МБ на весь импорт (файл больше лимита передается один)
+    async def add_attachments(self, issue_key, attachments, source_key):
+        journal = self.journal
+        if journal and await self._journal(journal.is_done, source_key, "attachments") and \
+                await self._journal(journal.get_progress, source_key, "attachments") >= len(attachments):
+            return
+        transfers = []
+        for index, attachment in enumerate(attachments):
+            if journal and await self._journal(journal.is_done, source_key, f"attachment:{index}"):
+                continue
+            filename, size, open_chunks = self.source.open_attachment(attachment)
+            transfers.append((index, filename, self._transfer(issue_key, filename, size, open_chunks)))
+        results = await asyncio.gather(*(transfer for _, _, transfer in transfers), return_exceptions=True)
+
+        error = None
+        for (index, filename, _), result in zip(transfers, results):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка загрузки вложения {filename} для задачи {issue_key}: {result}")
+                error = error or result
+                continue
+            logger.info(f"Вложение {filename} успешно загружено для задачи {issue_key}.")
+            if journal:
+                await self._journal(journal.mark_done, source_key, f"attachment:{index}")
+        if error:
+            raise error
+        if journal:
+            await self._journal(journal.set_progress, source_key, "attachments", len(attachments))
+            await self._journal(journal.mark_done, source_key, "attachments")
+
+    @metrics.timed("attachment")
+    async def _transfer(self, issue_key, filename, size, open_chunks):
+        cost = min(size or SPOOL_MEMORY, self.attachment_bytes)
+        async with self.attachment_slots:
+            async with self.attachment_condition:
+                await self.attachment_condition.wait_for(
+                    lambda: not self.bytes_in_flight or self.bytes_in_flight + cost <= self.attachment_bytes)
+                self.bytes_in_flight += cost
+            try:
+                _, sent = await self.client.upload_attachment(issue_key, filename, size, open_chunks, self.executor)
+            finally:
+                async with self.attachment_condition:
+                    self.bytes_in_flight -= cost
+                    self.attachment_condition.notify_all()
+        self.stats["files"] += 1
+        self.stats["bytes"] += sent
+        metrics.count("attachment_bytes", sent)
+        return sent
+
+    async def _create_links(self):
+        pending = self.deferred_links.take()
+        if not pending:
+            return
+        logger.info(f"Создание {len(pending)} связей между задачами, до {self.concurrency} одновременно.")
+        started = time.monotonic()
+        await run_bounded((self._create_link(*link) for link in pending), self.concurrency)
+        self.deferred_links.log_stats(time.monotonic() - started)
+
+    async def _create_link(self, source_key, target, relationship):
+        keys = await self._journal(self.deferred_links.prepare, source_key, target, relationship)
+        if keys is None:
+            return
+        issue_key, target_key = keys
+        try:
+            with metrics.timer("link"):
+                await self.client.create_link(issue_key, relationship, target_key)
+        except Exception as e:
+            logger.error(f"Ошибка создания связи {relationship} для задачи {issue_key} с задачей {target_key}: {e}")
+            await self._journal(self.deferred_links.record, "failed", source_key, target, relationship)
+            return
+        logger.info(f"Связь типа {relationship} создана для задачи {issue_key} с задачей {target_key}.")
+        await self._journal(self.deferred_links.record, "created", source_key, target, relationship)
+
+    # Вызов метода журнала (или использующего журнал) в потоке журнала; без журнала - сразу
+    async def _journal(self, function, *args):
+        if not self.journal:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.journal_executor, function, *args)
+
+    def log_stats(self):
+        stats = self.stats
+        logger.info(f"Комментарии: добавлено {stats['comments']} к {stats['comment_issues']} задачам, "
+                    f"уже были перенесены у {stats['comment_skipped']} задач, "
+                    f"с ошибкой у {stats['comment_failed']} задач.")
+        logger.info(f"Вложений передано: {stats['files']} ({stats['bytes'] / (1024 * 1024):.1f} МБ).")
@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from yandex_tracker_client.collections import IssueComments
+
+from migration_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Перенос комментариев в Яндекс Трекер отдельным этапом.
+# Комментарии разных задач переносятся параллельно собственным пулом потоков, а
+# комментарии одной задачи - одним потоком по порядку, поэтому их хронология сохраняется.
+# Повторы запросов выполняет соединение клиента (ThrottledConnection); если комментарий не
+# удалось создать, остальные комментарии задачи пропускаются, чтобы не нарушить порядок
+# (при повторном запуске перенос продолжится с него по журналу). Этап комментариев такой
+# задачи не отмечается в журнале завершенным, а shutdown возвращает число задач с ошибкой.
+# Число задач, ожидающих переноса комментариев, ограничено, поэтому импорт задач не уходит
+# далеко вперед.
+class CommentStage:
+    def __init__(self, tracker_client, user_cache, workers=8, journal=None):
+        self.tracker_client = tracker_client
+        self.user_cache = user_cache
+        self.journal = journal
+        self.executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="comments")
+        self.slots = threading.BoundedSemaphore(max(workers, 1) * 4)
+        self.lock = threading.Lock()
+        self.stats = {"issues": 0, "comments": 0, "skipped": 0, "failed": 0}
+        self.started = time.monotonic()
+
+    # Постановка комментариев задачи в очередь; ждет, если очередь заполнена
+    def submit(self, issue_key, comments, source_key=None):
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(self._import_comments, issue_key, comments, source_key)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(self._finished)
+        return future
+
+    # Освобождение места в очереди и учет непредвиденных ошибок переноса комментариев задачи
+    def _finished(self, future):
+        self.slots.release()
+        if future.cancelled() or future.exception() is None:
+            return
+        logger.error(f"Ошибка переноса комментариев задачи: {future.exception()}")
+        with self.lock:
+            self.stats["failed"] += 1
+
+    def _import_comments(self, issue_key, comments, source_key):
+        journal = self.journal
+        start = journal.get_progress(source_key, "comments") if journal else 0
+        if journal and start >= len(comments) and journal.is_done(source_key, "comments"):
+            with self.lock:
+                self.stats["skipped"] += 1
+            return 0
+        # Коллекция комментариев создается без запроса задачи: каждый комментарий - один POST
+        collection = IssueComments(self.tracker_client._connection, issue=issue_key)
+        for index, comment in enumerate(comments[start:], start):
+            try:
+                self._create(collection, issue_key, comment)
+            except Exception as e:
+                logger.error(f"Ошибка добавления комментария {index + 1} из {len(comments)} к задаче {issue_key}, "
+                             f"остальные комментарии задачи пропущены: {e}")
+                with self.lock:
+                    self.stats["failed"] += 1
+                return index - start
+            if journal:
+                journal.set_progress(source_key, "comments", index + 1)
+            with self.lock:
+                self.stats["comments"] += 1
+        if journal:
+            journal.mark_done(source_key, "comments")
+        with self.lock:
+            self.stats["issues"] += 1
+        logger.info(f"Комментарии ({len(comments) - start}) добавлены к задаче {issue_key}.")
+        return len(comments) - start
+
+    @metrics.timed("comment")
+    def _create(self, collection, issue_key, comment):
+        author = self.user_cache.resolve(comment.author)
+        return collection.create(text=comment.body, author=author)
+
+    def log_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        elapsed = time.monotonic() - self.started
+        rate = stats["comments"] / elapsed if elapsed else 0.0
+        logger.info(f"Комментарии: добавлено {stats['comments']} ({rate:.2f} комментариев/с) к {stats['issues']} задачам, "
+                    f"уже были перенесены у {stats['skipped']} задач, с ошибкой у {stats['failed']} задач.")
+
+    # Ожидание переноса всех комментариев; возвращает число задач, комментарии которых перенесены не полностью
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.log_stats()
+        with self.lock:
+            return self.stats["failed"]
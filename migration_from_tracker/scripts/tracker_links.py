@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from yandex_tracker_client.collections import IssueLinks
+
+from migration_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Отложенное создание связей между задачами.
+# Во время импорта запоминает соответствие ключей источника и Трекера и связи каждой
+# задачи, а после создания всех задач создает связи одним проходом: ключ связанной
+# задачи берется из этого соответствия (или из журнала миграции, если задача перенесена
+# при предыдущем запуске), поэтому связи не зависят от порядка импорта и не требуют
+# дополнительных запросов к API. Безопасен для использования из потоков.
+class DeferredLinks:
+    def __init__(self, journal=None):
+        self.journal = journal
+        self.lock = threading.Lock()
+        self.tracker_keys = {}
+        self.pending = []
+        self.stats = {"created": 0, "skipped": 0, "unresolved": 0, "failed": 0}
+
+    # links - список пар (ключ связанной задачи в источнике, тип связи в Трекере)
+    def add(self, source_key, tracker_key, links=()):
+        with self.lock:
+            self.tracker_keys[source_key] = tracker_key
+            self.pending.extend((source_key, target, relationship) for target, relationship in links)
+
+    def resolve(self, source_key):
+        with self.lock:
+            tracker_key = self.tracker_keys.get(source_key)
+        if tracker_key is None and self.journal:
+            tracker_key = self.journal.get_tracker_key(source_key)
+        return tracker_key
+
+    # Забирает все запомненные связи для создания
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        return pending
+
+    def create_all(self, tracker_client, workers=1):
+        pending = self.take()
+        if not pending:
+            return
+        logger.info(f"Создание {len(pending)} связей между задачами в {max(workers, 1)} потоков.")
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="links") as executor:
+            futures = [executor.submit(self._create, tracker_client, *link) for link in pending]
+            for future in as_completed(futures):
+                future.result()
+        self.log_stats(time.monotonic() - started)
+
+    # Ключи Трекера обеих задач связи или None, если связь создавать не нужно
+    # (уже создана при предыдущем запуске или связанная задача не перенесена)
+    def prepare(self, source_key, target, relationship):
+        if self.journal and self.journal.is_done(source_key, f"link:{target}:{relationship}"):
+            with self.lock:
+                self.stats["skipped"] += 1
+            return None
+        issue_key, target_key = self.resolve(source_key), self.resolve(target)
+        if not issue_key or not target_key:
+            logger.warning(f"Связь {source_key} -> {target} пропущена: задача {target} не перенесена в Яндекс Трекер.")
+            with self.lock:
+                self.stats["unresolved"] += 1
+            return None
+        return issue_key, target_key
+
+    # Учет результата создания связи: "created" отмечается в журнале, "failed" - только в статистике
+    def record(self, result, source_key, target, relationship):
+        if result == "created" and self.journal:
+            self.journal.mark_done(source_key, f"link:{target}:{relationship}")
+        with self.lock:
+            self.stats[result] += 1
+
+    def _create(self, tracker_client, source_key, target, relationship):
+        keys = self.prepare(source_key, target, relationship)
+        if keys is None:
+            return
+        issue_key, target_key = keys
+        try:
+            # Коллекция связей создается без запроса задачи: каждая связь - один POST
+            with metrics.timer("link"):
+                IssueLinks(tracker_client._connection, issue=issue_key).create(relationship=relationship,
+                                                                               issue=target_key)
+        except Exception as e:
+            logger.error(f"Ошибка создания связи {relationship} для задачи {issue_key} с задачей {target_key}: {e}")
+            self.record("failed", source_key, target, relationship)
+            return
+        logger.info(f"Связь типа {relationship} создана для задачи {issue_key} с задачей {target_key}.")
+        self.record("created", source_key, target, relationship)
+
+    # Число связей, которые не удалось создать
+    def failures(self):
+        with self.lock:
+            return self.stats["failed"]
+
+    def log_stats(self, seconds):
+        with self.lock:
+            stats = dict(self.stats)
+        rate = stats["created"] / seconds if seconds else 0.0
+        logger.info(f"Связи: создано {stats['created']} ({rate:.2f} связей/с), уже были созданы {stats['skipped']}, "
+                    f"без связанной задачи {stats['unresolved']}, с ошибкой {stats['failed']}.")
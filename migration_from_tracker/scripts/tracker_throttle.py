@@ -0,0 +1,264 @@
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from urllib3.exceptions import NewConnectionError
+from yandex_tracker_client import exceptions
+from yandex_tracker_client.connection import Connection
+
+logger = logging.getLogger(__name__)
+
+# Коды ответов, после которых запрос имеет смысл повторить
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# POST-запросы, которые можно повторять: поиск и создание очереди (ключ очереди
+# уникален, повтор уже выполненного запроса получает ответ 409)
+RETRY_SAFE_POST_SUFFIXES = ("/_search", "/_count", "/_findByUnique", "/queues")
+
+
+# Ограничитель частоты запросов по алгоритму token bucket.
+# Токены пополняются со скоростью rate в секунду, но не больше burst.
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill()
+            self.rate = float(rate)
+
+    # Приостановка выдачи токенов для всех потоков (например, по заголовку Retry-After)
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+# Адаптивный ограничитель: объединяет token bucket и лимит одновременных запросов.
+# При росте числа ответов 429 частота и параллельность уменьшаются вдвое (AIMD),
+# при успешных ответах постепенно возвращаются к заданным максимумам.
+class AdaptiveLimiter:
+    def __init__(self, rate, max_concurrency=16, adaptive=True, min_rate=0.5):
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate) if rate > 0 else 0.0
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.adaptive = adaptive
+        self.bucket = TokenBucket(rate)
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "server_errors": 0, "failed": 0}
+
+    @contextmanager
+    def slot(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+        try:
+            self.bucket.acquire()
+            yield
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self.stats["requests"] += 1
+                self.condition.notify()
+
+    def on_success(self):
+        if not self.adaptive:
+            return
+        with self.condition:
+            if self.limit < self.max_concurrency:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+                self.condition.notify_all()
+        if self.bucket.rate < self.max_rate:
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.max_rate * 0.01))
+
+    def on_throttled(self, retry_after=None):
+        with self.condition:
+            self.stats["throttled"] += 1
+            if self.adaptive:
+                self.limit = max(1.0, self.limit / 2)
+        if self.adaptive and self.max_rate > 0:
+            self.bucket.set_rate(max(self.min_rate, self.bucket.rate / 2))
+        if retry_after:
+            self.bucket.pause(retry_after)
+
+    def count(self, key):
+        with self.condition:
+            self.stats[key] += 1
+
+    def summary(self):
+        with self.condition:
+            return dict(self.stats, concurrency=int(self.limit), rate=round(self.bucket.rate, 2))
+
+
+# Разбор заголовка Retry-After: число секунд или дата в формате HTTP
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+# Экспоненциальная задержка со случайным разбросом (equal jitter)
+def backoff_delay(attempt, base=0.5, cap=60.0):
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# Можно ли повторить запрос после ответа 5xx или обрыва соединения (data - тело в JSON или словарь).
+# Повтор POST безопасен только при поиске, создании очереди и создании задачи с полем
+# unique (при конфликте возвращается уже созданная задача); остальные POST (комментарии,
+# связи, вложения) при повторе создали бы дубликат.
+def retry_safe(method, url, data):
+    if (method or "").upper() != "POST":
+        return True
+    if urlparse(url or "").path.rstrip("/").endswith(RETRY_SAFE_POST_SUFFIXES):
+        return True
+    if isinstance(data, (str, bytes)):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return False
+    return isinstance(data, dict) and data.get("unique") is not None
+
+
+# Ошибка соединения, при которой запрос заведомо не дошел до сервера
+def request_not_sent(exception):
+    if isinstance(exception, requests.ConnectTimeout):
+        return True
+    if not isinstance(exception, requests.ConnectionError):
+        return False
+    reason = exception.args[0] if exception.args else None
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, (NewConnectionError, ConnectionRefusedError))
+
+
+# Ошибка клиента Трекера, после которой неидемпотентный запрос можно повторить:
+# ответ 429 или запрос, не дошедший до сервера
+def retryable_failure(error):
+    if isinstance(error, exceptions.TrackerRequestError):
+        return request_not_sent(error.original_error)
+    return isinstance(error, exceptions.TrackerServerError) and error.status_code == 429
+
+
+# Соединение с Яндекс Трекером с ограничением частоты запросов и повторами.
+# Подменяет встроенный механизм повторов клиента: учитывает Retry-After,
+# делает экспоненциальную задержку с разбросом и общую для всех потоков адаптацию.
+# Это единственный уровень повторов: неидемпотентные POST (см. retry_safe)
+# повторяются только после ответа 429 или если запрос не дошел до сервера.
+class ThrottledConnection(Connection):
+    def __init__(self, *args, rate_limit=10.0, max_concurrency=16, max_retries=8,
+                 backoff_base=0.5, backoff_cap=60.0, adaptive=True, **kwargs):
+        kwargs["retries"] = 0
+        super().__init__(*args, **kwargs)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.limiter = AdaptiveLimiter(rate_limit, max_concurrency, adaptive)
+
+    def _try_request(self, **kwargs):
+        attempt = 0
+        body = kwargs.get("data")
+        safe = retry_safe(kwargs.get("method"), kwargs.get("url"), body)
+        while True:
+            response = None
+            exception = None
+            if attempt and hasattr(body, "rewind"):
+                body.rewind()
+            with self.limiter.slot():
+                try:
+                    response = self.session.request(**kwargs)
+                except requests.RequestException as e:
+                    exception = e
+
+            retry_after = None
+            if exception is not None:
+                reason = f"{type(exception).__name__}: {exception}"
+                retryable = safe or request_not_sent(exception)
+            elif response.status_code in RETRYABLE_STATUS_CODES:
+                reason = f"HTTP {response.status_code}"
+                retryable = safe or response.status_code == 429
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if response.status_code == 429:
+                    self.limiter.on_throttled(retry_after)
+                else:
+                    self.limiter.count("server_errors")
+            else:
+                self.limiter.on_success()
+                break
+
+            # Потоковое тело, которое нельзя прочитать повторно, повторяет вызывающий код
+            streamed_once = hasattr(body, "read") and not getattr(body, "rewindable", False)
+            if attempt >= self.max_retries or streamed_once or not retryable:
+                self.limiter.count("failed")
+                break
+            delay = retry_after if retry_after is not None else backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+            logger.warning(f"Запрос {kwargs.get('method')} {kwargs.get('url')} не выполнен ({reason}), "
+                           f"повтор {attempt + 1}/{self.max_retries} через {delay:.1f} с.")
+            self.limiter.count("retries")
+            time.sleep(delay)
+            attempt += 1
+
+        if exception is not None:
+            raise exceptions.TrackerRequestError(exception)
+        if 500 <= response.status_code < 600:
+            raise exceptions.OutOfRetries(response)
+        if 400 <= response.status_code < 500:
+            self._log_error(logging.ERROR, response)
+            exc_class = exceptions.STATUS_CODES.get(response.status_code, exceptions.TrackerServerError)
+            raise exc_class(response)
+        return response
+
+
+# Вывод статистики запросов к Яндекс Трекеру
+def log_throttle_stats(tracker_client):
+    connection = getattr(tracker_client, "_connection", None)
+    if not isinstance(connection, ThrottledConnection):
+        return
+    stats = connection.limiter.summary()
+    logger.info(f"Запросов к Яндекс Трекеру: {stats['requests']}, повторов: {stats['retries']}, "
+                f"ответов 429: {stats['throttled']}, ошибок сервера: {stats['server_errors']}, "
+                f"неудачных после всех повторов: {stats['failed']}. "
+                f"Итоговая частота: {stats['rate']} запр/с, параллельность: {stats['concurrency']}.")
@@ -0,0 +1,81 @@
+import logging
+import threading
+
+from migration_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Кэш пользователей Яндекс Трекера.
+# При создании один раз загружает всех пользователей через users.get_all() и
+# индексирует их по uid, логину и email. После успешной предзагрузки проверка
+# пользователя не требует обращений к API; если предзагрузка не удалась,
+# используются одиночные запросы users.get, а их результат (в том числе
+# отрицательный) запоминается. Кэш общий для исполнителей, авторов,
+# авторов комментариев и наблюдателей и безопасен для использования из потоков.
+class UserCache:
+    def __init__(self, tracker_client, prefetch=True):
+        self.tracker_client = tracker_client
+        self.lock = threading.Lock()
+        self.known = {}
+        self.complete = False
+        self.stats = {"hits": 0, "misses": 0, "lookups": 0}
+        if prefetch:
+            self.prefetch()
+
+    def prefetch(self):
+        try:
+            users = self.tracker_client.users.get_all()
+            identifiers = [identifier for user in users for identifier in
+                           (getattr(user, "uid", None), getattr(user, "login", None), getattr(user, "email", None))]
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить список пользователей Яндекс Трекера, "
+                           f"будут использоваться одиночные запросы: {e}")
+            return
+        self.store(identifiers)
+
+    # Запоминает полный список пользователей Трекера (их uid, логины и email)
+    def store(self, identifiers):
+        known = {str(identifier): True for identifier in identifiers if identifier}
+        with self.lock:
+            self.known.update(known)
+            self.complete = True
+        logger.info(f"Загружено {len(known)} идентификаторов пользователей Яндекс Трекера.")
+
+    # Возвращает пользователя, если он есть в Трекере, иначе None (warn - сообщать об отсутствующем)
+    def resolve(self, user, warn=True):
+        if not user:
+            return None
+        key = str(user)
+        with self.lock:
+            exists = self.known.get(key)
+            if exists is None and self.complete:
+                exists = self.known[key] = False
+                if warn:
+                    logger.warning(f"Пользователь {user} не найден в Яндекс Трекере.")
+            if exists is not None:
+                self.stats["hits" if exists else "misses"] += 1
+                metrics.count("user_cache_hits")
+                return user if exists else None
+        exists = self._lookup(user, warn)
+        with self.lock:
+            self.known[key] = exists
+            self.stats["lookups"] += 1
+        return user if exists else None
+
+    @metrics.timed("user_lookup")
+    def _lookup(self, user, warn=True):
+        try:
+            self.tracker_client.users.get(user)
+            logger.info(f"Пользователь {user} найден в Яндекс Трекере.")
+            return True
+        except Exception:
+            if warn:
+                logger.warning(f"Пользователь {user} не найден в Яндекс Трекере.")
+            return False
+
+    def log_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        logger.info(f"Проверки пользователей: найдено в кэше {stats['hits']}, отсутствуют {stats['misses']}, "
+                    f"запросов к API {stats['lookups']}.")
@@ -0,0 +1,254 @@
+import csv
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from collections import Counter
+from collections.abc import Mapping
+
+logger = logging.getLogger(__name__)
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+SQLITE_TABLE = os.getenv('USER_MAPPING_TABLE', 'user_mapping')  # Таблица сопоставления в файле SQLite
+REPORT_LIMIT = 50  # Сколько пользователей перечислять в предупреждениях
+
+
+# Индекс сопоставления пользователей источника с пользователями Трекера.
+# Источник ищется по нескольким видам ключей (например, логин Jira, accountId, email):
+# каждый вид - отдельный столбец файла, столбцы проверяются по порядку key_columns,
+# а в файле должен быть хотя бы один из них и столбец target_column. Столбец email
+# сравнивается без учета регистра (в SQLite адреса должны храниться в нижнем регистре).
+# Файл загружается при первом обращении, а не при создании:
+# - CSV читается построчно в один словарь; значения (пользователи Трекера) интернируются,
+#   поэтому несколько ключей одного пользователя ссылаются на одну строку;
+# - SQLite (.db, .sqlite, .sqlite3) в память не загружается: каждый ключ ищется запросом
+#   по индексу, а ответы (в том числе отрицательные) запоминаются;
+# - текстовый файл (to.txt) - пары "старый новый" через пробел, '#' начинает комментарий.
+# Индекс ведет себя как словарь только для чтения и безопасен для использования из потоков.
+class UserMapping(Mapping):
+    def __init__(self, path, key_columns=(), target_column="tracker_user", table=SQLITE_TABLE):
+        self.path = path
+        self.key_columns = list(key_columns)
+        self.target_column = target_column
+        self.table = table
+        self.kind = "sqlite" if path.lower().endswith(SQLITE_EXTENSIONS) else \
+            "csv" if path.lower().endswith(".csv") else "text"
+        if not os.path.isfile(path):
+            logger.error(f"Файл сопоставления пользователей {path} не найден.")
+            raise FileNotFoundError(f"Файл сопоставления пользователей {path} не найден.")
+        self.lock = threading.Lock()
+        self.index = None
+        self.connection = None
+        self.columns = []
+        # Заголовок проверяется сразу, чтобы ошибка в файле не обнаружилась посреди миграции
+        if self.kind == "csv":
+            with open(path, "r", newline="") as file:
+                self._check_columns(next(csv.reader(file), []))
+        elif self.kind == "sqlite":
+            self._open_sqlite()
+
+    # Соединение с SQLite не передается в другие процессы: там оно открывается заново
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.update(lock=None, connection=None, index=None if self.kind == "sqlite" else self.index)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.index is not None:
+            return self.index
+        with self.lock:
+            if self.index is None:
+                loaders = {"csv": self._load_csv, "sqlite": self._open_sqlite, "text": self._load_text}
+                index = loaders[self.kind]()
+                self.index = index
+        return self.index
+
+    def _check_columns(self, fieldnames):
+        self.columns = [column for column in self.key_columns if column in fieldnames]
+        if not self.columns or self.target_column not in fieldnames:
+            logger.error(f"Файл {self.path} не содержит необходимых столбцов: нужен {self.target_column} "
+                         f"и хотя бы один из {', '.join(self.key_columns)}.")
+            raise ValueError(f"Файл {self.path} не содержит необходимых столбцов.")
+
+    def _add(self, index, key, target, conflicts):
+        key = sys.intern(key)
+        target = sys.intern(target)
+        previous = index.setdefault(key, target)
+        if previous is not target and previous != target:
+            conflicts.append(key)
+
+    def _load_csv(self):
+        index, conflicts, rows = {}, [], 0
+        with open(self.path, "r", newline="") as file:
+            reader = csv.DictReader(file)
+            self._check_columns(reader.fieldnames or [])
+            # Ключи одного вида идут подряд: при совпадении ключей разных видов побеждает первый столбец
+            columns = [(column, column == "email") for column in self.columns]
+            for row in reader:
+                rows += 1
+                target = row[self.target_column]
+                if not target:
+                    continue
+                for column, is_email in columns:
+                    key = row[column]
+                    if key:
+                        self._add(index, key.lower() if is_email else key, target, conflicts)
+        self._report_conflicts(conflicts)
+        logger.info(f"Файл сопоставления пользователей {self.path} загружен: {rows} строк, "
+                    f"{len(index)} ключей по столбцам {', '.join(self.columns)}.")
+        return index
+
+    def _load_text(self):
+        index, conflicts, lines = {}, [], 0
+        with open(self.path, "r") as file:
+            for line in file:
+                parts = line.partition("#")[0].split()
+                if len(parts) >= 2:
+                    lines += 1
+                    self._add(index, parts[0], parts[1], conflicts)
+        self._report_conflicts(conflicts)
+        logger.info(f"Файл сопоставления {self.path} загружен: {lines} строк, {len(index)} уникальных ключей.")
+        return index
+
+    # В SQLite индекс - это кэш уже найденных ключей
+    def _open_sqlite(self):
+        if self.connection is not None:
+            return {}
+        self.connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        fieldnames = [row[1] for row in self.connection.execute(f'PRAGMA table_info("{self.table}")')]
+        self._check_columns(fieldnames)
+        self.queries = [(column, f'SELECT "{self.target_column}" FROM "{self.table}" WHERE "{column}" = ? LIMIT 1')
+                        for column in self.columns]
+        logger.info(f"Сопоставление пользователей читается из SQLite {self.path} (таблица {self.table}) "
+                    f"по столбцам {', '.join(self.columns)}.")
+        return {}
+
+    def _query(self, key):
+        index = self._load()
+        with self.lock:
+            if key in index:
+                return index[key]
+            target = None
+            for column, query in self.queries:
+                row = self.connection.execute(query, (key.lower() if column == "email" else key,)).fetchone()
+                if row and row[0]:
+                    target = sys.intern(row[0])
+                    break
+            index[key] = target
+            return target
+
+    def _report_conflicts(self, conflicts):
+        if conflicts:
+            logger.warning(f"В файле {self.path} ключи сопоставлены с разными пользователями ({len(conflicts)}), "
+                           f"используется первое значение: {', '.join(conflicts[:REPORT_LIMIT])}"
+                           f"{' ...' if len(conflicts) > REPORT_LIMIT else ''}")
+
+    def __getitem__(self, key):
+        if key is None:
+            raise KeyError(key)
+        key = str(key)
+        if self.kind == "sqlite":
+            target = self._query(key)
+        else:
+            index = self._load()
+            target = index.get(key)
+            if target is None and "@" in key:
+                target = index.get(key.lower())
+        if target is None:
+            raise KeyError(key)
+        return target
+
+    # Ключи SQLite, как и в CSV: различные непустые значения всех столбцов ключей в строках
+    # с пользователем Трекера (сравнение NULL с '' ложно, поэтому NULL тоже отбрасывается)
+    def _keys_query(self):
+        return " UNION ".join(f'SELECT "{column}" FROM "{self.table}" '
+                              f'WHERE "{column}" != \'\' AND "{self.target_column}" != \'\''
+                              for column in self.columns)
+
+    def __iter__(self):
+        if self.kind != "sqlite":
+            return iter(self._load())
+        self._load()
+        return (row[0] for row in self.connection.execute(self._keys_query()))
+
+    def __len__(self):
+        if self.kind != "sqlite":
+            return len(self._load())
+        self._load()
+        return self.connection.execute(f"SELECT COUNT(*) FROM ({self._keys_query()})").fetchone()[0]
+
+    # Пользователь Трекера для первого сопоставленного из нескольких ключей одного
+    # пользователя источника (например, accountId, логин и email) или None
+    def find(self, *keys):
+        for key in keys:
+            if key:
+                target = self.get(key)
+                if target is not None:
+                    return target
+        return None
+
+    # Все пользователи Трекера, на которые ссылается сопоставление (один проход по файлу)
+    def targets(self):
+        if self.kind != "sqlite":
+            return set(self._load().values())
+        self._load()
+        return {row[0] for row in self.connection.execute(
+            f'SELECT DISTINCT "{self.target_column}" FROM "{self.table}" WHERE "{self.target_column}" IS NOT NULL')}
+
+    # Проверка до начала миграции: пользователи Трекера из сопоставления, которых нет в
+    # Трекере, определяются одним проходом по кэшу пользователей (UserCache), который
+    # загружает список пользователей одним запросом. Если список загрузить не удалось,
+    # проверка пропускается: иначе каждый пользователь проверялся бы отдельным запросом.
+    # Возвращает отсутствующих пользователей.
+    def check_targets(self, user_cache):
+        if not user_cache.complete:
+            logger.warning(f"Список пользователей Яндекс Трекера не загружен, проверка пользователей "
+                           f"из сопоставления {self.path} пропущена.")
+            return []
+        targets = self.targets()
+        missing = sorted(target for target in targets if user_cache.resolve(target, warn=False) is None)
+        if missing:
+            logger.warning(f"Пользователи из сопоставления {self.path}, которых нет в Яндекс Трекере "
+                           f"({len(missing)} из {len(targets)}): {', '.join(missing[:REPORT_LIMIT])}"
+                           f"{' ...' if len(missing) > REPORT_LIMIT else ''}")
+        else:
+            logger.info(f"Все {len(targets)} пользователей из сопоставления {self.path} есть в Яндекс Трекере.")
+        return missing
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+# Учет пользователей источника без сопоставления во время импорта или проходом по задачам
+# до него (report_unmapped_users в migration_engine). Пользователь задачи,
+# которого нет среди пользователей Трекера в сопоставлении, остался ключом источника
+# (преобразование могло выполняться в другом процессе, поэтому проверяется результат).
+# Безопасен для использования из потоков.
+class UnmappedUsers:
+    def __init__(self, user_mapping):
+        self.path = user_mapping.path
+        self.targets = user_mapping.targets()
+        self.lock = threading.Lock()
+        self.users = Counter()
+
+    def add(self, users):
+        unmapped = [user for user in users if user and user not in self.targets]
+        if unmapped:
+            with self.lock:
+                self.users.update(unmapped)
+
+    # Сводка по итогам импорта: пользователи без сопоставления, самые частые первыми
+    def report(self):
+        with self.lock:
+            users = [user for user, _ in self.users.most_common()]
+        if users:
+            logger.warning(f"Пользователи источника без сопоставления в {self.path} ({len(users)}): "
+                           f"{', '.join(users[:REPORT_LIMIT])}{' ...' if len(users) > REPORT_LIMIT else ''}")
+        return users
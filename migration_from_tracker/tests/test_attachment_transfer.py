@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import attachment_transfer  # noqa: E402
+from attachment_transfer import AttachmentSizeError, AttachmentTransfer, MultipartBody, spool_chunks  # noqa: E402
+
+
+def chunks(*parts):
+    return lambda: iter(parts)
+
+
+def test_multipart_length_matches_body():
+    body = MultipartBody(6, chunks(b"abc", b"def"))
+    data = b"".join(body)
+    assert len(data) == body.len == body.sent
+    assert b"\r\n\r\nabcdef\r\n--" in data
+
+
+def test_multipart_rewind():
+    body = MultipartBody(3, chunks(b"abc"), rewindable=True)
+    first = body.read()
+    body.rewind()
+    assert body.read() == first
+    with pytest.raises(ValueError):
+        MultipartBody(3, chunks(b"abc")).rewind()
+
+
+@pytest.mark.parametrize("parts", [(b"ab",), (b"abc", b"d")])
+def test_multipart_rejects_wrong_source_length(parts):
+    body = MultipartBody(3, chunks(*parts))
+    with pytest.raises(AttachmentSizeError):
+        b"".join(body)
+
+
+def test_spool_limit(monkeypatch):
+    monkeypatch.setattr(attachment_transfer, "SPOOL_LIMIT", 4)
+    spool, size = spool_chunks(chunks(b"ab", b"cd"))
+    assert size == 4
+    spool.close()
+    with pytest.raises(AttachmentSizeError):
+        spool_chunks(chunks(b"ab", b"cde"))
+
+
+# Соединение, которое читает тело запроса целиком, как при отправке
+class FakeConnection:
+    api_version = "v2"
+    timeout = 10
+
+    def __init__(self):
+        self.uploads = []
+
+    def build_url(self, path):
+        return path
+
+    def _try_request(self, data, **kwargs):
+        self.uploads.append(b"".join(data))
+
+
+class FakeTrackerClient:
+    def __init__(self):
+        self._connection = FakeConnection()
+
+
+def test_wrong_declared_size_falls_back_to_spool():
+    client = FakeTrackerClient()
+    transfer = AttachmentTransfer(client, workers=1)
+    assert transfer.submit("Q-1", "a.txt", 10, chunks(b"abc")).result() == 3
+    assert transfer.submit("Q-1", "b.txt", 3, chunks(b"abc")).result() == 3
+    transfer.shutdown()
+    assert (transfer.stats["files"], transfer.stats["bytes"], transfer.stats["spooled"]) == (2, 6, 1)
+    assert len(client._connection.uploads) == 2
+    assert all(b"\r\n\r\nabc\r\n--" in upload for upload in client._connection.uploads)
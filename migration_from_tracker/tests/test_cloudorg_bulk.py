@@ -0,0 +1,40 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import import_cloudorg_org_tracker as cloudorg  # noqa: E402
+
+UID_MAPPING = {"1": "101", "2": "102", "3": "103"}
+
+
+def issue(key, assignee=None, followers=()):
+    return SimpleNamespace(key=key, assignee={"id": assignee} if assignee else None, createdBy=None,
+                           followers=[{"id": follower} for follower in followers])
+
+
+def test_follower_change_is_split_per_uid():
+    changes = cloudorg.compute_changes(issue("Q-1", followers=["1", "2", "9"]), UID_MAPPING)
+    assert list(cloudorg.bulk_operations(changes)) == [
+        ("followers", {"add": ["101"], "remove": ["1"]}),
+        ("followers", {"add": ["102"], "remove": ["2"]}),
+    ]
+
+
+def test_issues_with_different_followers_share_bulk_jobs(monkeypatch):
+    issues = [issue("Q-1", "1", ["1", "2"]), issue("Q-2", followers=["1"]), issue("Q-3", "1", ["2", "3"])]
+    jobs = []
+
+    def run_bulk_change(client_to, issue_keys, values, timeout):
+        jobs.append((sorted(issue_keys), values))
+        return {"updated": len(issue_keys)}
+
+    monkeypatch.setattr(cloudorg, "find_issues_by_uids",
+                        lambda client, filter_key, uids: iter(issues if filter_key == "assignee" else []))
+    monkeypatch.setattr(cloudorg, "run_bulk_change", run_bulk_change)
+    stats = cloudorg.process_issues_bulk(None, None, UID_MAPPING, workers=1)
+    assert stats["jobs"] == 4
+    assert (["Q-1", "Q-2"], {"followers": {"add": ["101"], "remove": ["1"]}}) in jobs
+    assert (["Q-1", "Q-3"], {"followers": {"add": ["102"], "remove": ["2"]}}) in jobs
+    assert (["Q-1", "Q-3"], {"assignee": "101"}) in jobs
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import markup_converter  # noqa: E402
+from markup_converter import asana_to_markdown, jira_to_markdown, markup_stage  # noqa: E402
+from migration_engine import TrackerComment, TrackerIssue  # noqa: E402
+
+
+@pytest.mark.parametrize("wiki, markdown", [
+    ("h2. Title\n\nSome *bold* and _italic_ text with {{code}} and -strike-.",
+     "## Title\n\nSome **bold** and *italic* text with `code` and ~~strike~~."),
+    ("* one\n** nested\n# first\n## second", "- one\n  - nested\n1. first\n   1. second"),
+    ("||Name||Value||\n|a|1|", "| Name | Value |\n| --- | --- |\n| a | 1 |"),
+    ("|a|1|", "| | |\n| --- | --- |\n| a | 1 |"),
+    ("{code:python}\nx = *1*\n{code}", "```python\nx = *1*\n```"),
+    ("{quote}quoted *text*{quote}", "> quoted **text**"),
+    ("See [docs|https://example.com], [~jdoe], [https://x.y/z] and !image.png|width=10!",
+     "See [docs](https://example.com), @jdoe, <https://x.y/z> and ![](image.png)"),
+    ("line one\\\\line two", "line one  \nline two"),
+    ("snake_case_name and 2-3-4 stay", "snake_case_name and 2-3-4 stay"),
+    ("bq. quote line\n----", "> quote line\n\n---"),
+    ("", ""),
+    (None, None),
+])
+def test_jira_to_markdown(wiki, markdown):
+    assert jira_to_markdown(wiki) == markdown
+
+
+@pytest.mark.parametrize("html, markdown", [
+    ('<body>Hello <strong>bold</strong> <em>it</em> &amp; <a href="https://x.y">link</a></body>',
+     "Hello **bold** *it* & [link](https://x.y)"),
+    ("<body><ul><li>one</li><li>two<ol><li>a</li></ol></li></ul></body>", "- one\n- two\n   1. a"),
+    ("<body><pre>x &lt; 1</pre><code>y</code><blockquote>quote\nline</blockquote></body>",
+     "```\nx < 1\n```\n`y`\n\n> quote\n> line"),
+    ("plain text <b>not html</b>", "plain text <b>not html</b>"),
+])
+def test_asana_to_markdown(html, markdown):
+    assert asana_to_markdown(html) == markdown
+
+
+def test_repeated_paragraphs_come_from_cache():
+    markup_converter.clear_cache()
+    jira_to_markdown("Signature *team*\n\nfirst")
+    jira_to_markdown("Signature *team*\n\nsecond")
+    assert markup_converter.cache_stats() == (1, 3)
+
+
+def test_markup_stage_converts_description_and_comments():
+    issue = TrackerIssue(source_key="S-1", queue="Q", summary="", description="*a*",
+                         comments=[TrackerComment("user", "_b_")])
+    assert list(markup_stage([issue], jira_to_markdown)) == [issue]
+    assert issue.description == "**a**"
+    assert issue.comments[0].body == "*b*"
@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from migration_engine import SourceAdapter, pipeline_stage, process_stage, queue_settings, stream_source  # noqa: E402
+
+
+def square_plus(item, context):
+    return item * item + context
+
+
+def fail_on_three(item, context):
+    if item == 3:
+        raise ValueError("bad item")
+    return item
+
+
+def test_pipeline_stage_keeps_order():
+    assert list(pipeline_stage(range(100), 4, "test")) == list(range(100))
+
+
+def test_pipeline_stage_applies_backpressure():
+    produced = []
+
+    def items():
+        for item in range(100):
+            produced.append(item)
+            yield item
+
+    stage = pipeline_stage(items(), 2, "test")
+    assert next(stage) == 0
+    threading.Event().wait(0.2)
+    # В памяти не больше размера очереди, одного элемента у потребителя и одного у производителя
+    assert len(produced) <= 4
+    stage.close()
+
+
+def test_pipeline_stage_raises_producer_error():
+    def items():
+        yield 1
+        raise ValueError("export failed")
+
+    stage = pipeline_stage(items(), 2, "test")
+    assert next(stage) == 1
+    with pytest.raises(ValueError, match="export failed"):
+        next(stage)
+
+
+def test_process_stage_keeps_order():
+    results = list(process_stage(range(20), square_plus, 1, workers=2, chunk_size=3))
+    assert results == [item * item + 1 for item in range(20)]
+
+
+def test_process_stage_raises_worker_error():
+    with pytest.raises(ValueError, match="bad item"):
+        list(process_stage(range(10), fail_on_three, None, workers=2, chunk_size=2))
+
+
+class FakeSource(SourceAdapter):
+    name = "fake"
+
+    def read(self, projects, since=None):
+        for project in projects:
+            yield from (f"{project}-{number}" for number in range(3))
+
+    def transform(self, items, user_mapping):
+        for item in items:
+            yield user_mapping.get(item, item)
+
+
+@pytest.mark.parametrize("queue_size", [0, 2])
+def test_stream_source(queue_size):
+    issues = stream_source(FakeSource(), ["A", "B"], {"A-1": "mapped"}, queue_size=queue_size)
+    assert list(issues) == ["A-0", "mapped", "A-2", "B-0", "B-1", "B-2"]
+
+
+def test_queue_settings():
+    settings = queue_settings({"name": "Queue", "key": "Q"}, lead="admin")
+    assert settings["key"] == "Q"
+    assert settings["lead"] == "admin"
+    assert "lead" not in queue_settings({"name": "Queue", "key": "Q"})
@@ -0,0 +1,49 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from migration_journal import MigrationJournal, open_journal  # noqa: E402
+
+
+def test_progress_survives_reopen(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = MigrationJournal(path)
+    journal.record_issue("S-1", "Q-1")
+    journal.set_progress("S-1", "comments", 2)
+    journal.mark_done("S-1", "attachments")
+    journal.set_watermark("P", "2024-01-02T00:00:00")
+    journal.close()
+
+    journal = MigrationJournal(path)
+    assert journal.get_tracker_key("S-1") == "Q-1"
+    assert journal.get_tracker_key("S-2") is None
+    assert journal.get_progress("S-1", "comments") == 2
+    assert not journal.is_done("S-1", "comments")
+    assert journal.is_done("S-1", "attachments")
+    assert journal.get_watermarks() == {"P": "2024-01-02T00:00:00"}
+    journal.close()
+
+
+def test_progress_and_done_are_kept_together(tmp_path):
+    journal = MigrationJournal(str(tmp_path / "journal.db"))
+    journal.set_progress("S-1", "comments", 3)
+    journal.mark_done("S-1", "comments")
+    journal.set_progress("S-1", "comments", 4)
+    assert journal.get_progress("S-1", "comments") == 4
+    assert journal.is_done("S-1", "comments")
+    journal.close()
+
+
+def test_closed_journal_rejects_writes(tmp_path):
+    journal = MigrationJournal(str(tmp_path / "journal.db"))
+    journal.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        journal.record_issue("S-1", "Q-1")
+
+
+def test_open_journal_without_path():
+    assert open_journal("") is None
@@ -0,0 +1,60 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from migration_metrics import Histogram, Metrics  # noqa: E402
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    assert histogram.quantile(0.5) is None
+    for seconds in (0.001, 0.002, 0.003, 0.2, 100.0):
+        histogram.observe(seconds)
+    assert histogram.quantile(0.5) == 0.005
+    assert histogram.quantile(0.8) == 0.25
+    assert histogram.quantile(1.0) == 100.0
+
+
+def test_timed_counts_calls_and_errors():
+    metrics = Metrics()
+
+    @metrics.timed("issue")
+    def import_issue(fail=False):
+        if fail:
+            raise ValueError("failed")
+
+    @metrics.timed("comment")
+    async def create_comment():
+        return "done"
+
+    import_issue()
+    with pytest.raises(ValueError):
+        import_issue(fail=True)
+    assert asyncio.run(create_comment()) == "done"
+    metrics.count("attachment_bytes", 10)
+    metrics.add_total(4)
+    snapshot = metrics.snapshot()
+    assert snapshot["stages"]["issue"]["count"] == 1
+    assert snapshot["stages"]["issue"]["errors"] == 1
+    assert snapshot["stages"]["comment"]["count"] == 1
+    assert snapshot["counters"] == {"attachment_bytes": 10}
+    assert snapshot["progress"]["done"] == 1
+    assert snapshot["progress"]["total"] == 4
+
+
+def test_close_writes_final_json_and_prometheus(tmp_path):
+    metrics = Metrics()
+    json_path, prometheus_path = tmp_path / "metrics.jsonl", tmp_path / "metrics.prom"
+    metrics.configure("jira", str(json_path), str(prometheus_path), interval=0)
+    with metrics.timer("issue"):
+        pass
+    metrics.close()
+    assert json.loads(json_path.read_text())["progress"]["done"] == 1
+    text = prometheus_path.read_text()
+    assert 'migration_stage_seconds_count{script="jira",stage="issue"} 1' in text
+    assert 'migration_progress_done{script="jira"} 1' in text
@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from migration_plan import MigrationPlan  # noqa: E402
+
+TOTAL_FIELDS = {"issues", "sampled", "comments", "attachments", "attachment_bytes", "links"}
+
+
+def test_totals_of_empty_plan():
+    plan = MigrationPlan("jira")
+    assert plan.totals() == dict.fromkeys(TOTAL_FIELDS, 0)
+
+
+def test_totals_of_unsampled_project():
+    plan = MigrationPlan("jira")
+    plan.add_project("A", 0)
+    plan.add_project("B", 10)
+    totals = plan.totals()
+    assert totals["issues"] == 10
+    assert totals["attachments"] == 0
+
+
+def test_estimate_of_empty_plan():
+    plan = MigrationPlan("asana").estimate({}, workers=1, attachment_workers=1, comment_workers=1, rate_limit=10,
+                                           latency=0.3, bandwidth_mb=10)
+    assert plan["issues"] == 0
+    assert plan["tracker_calls"]["attachment"] == 0
+    assert plan["projected_seconds"] >= 0
+
+
+def test_totals_scale_samples_to_project():
+    plan = MigrationPlan("jira")
+    plan.add_project("A", 100)
+    plan.add_sample("A", comments=2, attachment_sizes=[1024, None], links=1)
+    plan.add_sample("A", comments=0)
+    totals = plan.totals()
+    assert totals["comments"] == 100
+    assert totals["attachments"] == 100
+    assert totals["attachment_bytes"] == 51200
+    assert totals["links"] == 50
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmark"))
+
+import tracker_async  # noqa: E402
+from fake_services import Dataset, FakeServices, ServiceBehaviour  # noqa: E402
+from tracker_async import AsyncTrackerClient, TrackerAPIError  # noqa: E402
+
+
+# Поведение имитатора Трекера с заданными ошибками: для каждого метода API - коды
+# ответов, которые отдаются на первые обращения вместо настоящего ответа
+class ScriptedBehaviour(ServiceBehaviour):
+    def __init__(self):
+        super().__init__()
+        self.errors = {}
+        self.current = threading.local()
+
+    def record(self, route):
+        super().record(route)
+        with self.lock:
+            errors = self.errors.get(route) or [None]
+            self.current.error = errors.pop(0)
+
+    def admit(self):
+        return self.current.error
+
+
+@pytest.fixture(scope="module")
+def services():
+    services = FakeServices(Dataset(issues=5, users=5)).start()
+    yield services
+    services.stop()
+
+
+@pytest.fixture
+def tracker(services, monkeypatch):
+    # Повторы без ожидания: задержки и Retry-After не нужны для проверки логики повторов
+    monkeypatch.setattr(tracker_async, "backoff_delay", lambda attempt: 0.0)
+    monkeypatch.setattr(tracker_async, "parse_retry_after", lambda value: None)
+    services.reset()
+    behaviour = services.servers["tracker"].behaviour = ScriptedBehaviour()
+    return services.url("tracker"), behaviour
+
+
+def run(url, call, max_retries=3):
+    async def main():
+        async with AsyncTrackerClient(url, {}, rate_limit=0, max_retries=max_retries) as client:
+            return await call(client), client.stats
+    return asyncio.run(main())
+
+
+def test_search_is_retried_after_server_error(tracker):
+    url, behaviour = tracker
+    behaviour.errors["search"] = [503, 502]
+    issues, stats = run(url, lambda client: client.find_issues(filter={"assignee": ["1000"]}))
+    assert [issue["key"] for issue in issues] == ["Q-1"]
+    assert behaviour.calls["search"] == 3
+    assert stats["retries"] == 2
+
+
+def test_comment_is_not_retried_after_server_error(tracker):
+    url, behaviour = tracker
+    behaviour.errors["create_comment"] = [503]
+    with pytest.raises(TrackerAPIError, match="HTTP 503"):
+        run(url, lambda client: client.create_comment("Q-1", "text"))
+    assert behaviour.calls["create_comment"] == 1
+
+
+def test_comment_is_retried_after_throttling(tracker):
+    url, behaviour = tracker
+    behaviour.errors["create_comment"] = [429]
+    comment, stats = run(url, lambda client: client.create_comment("Q-1", "text"))
+    assert comment["id"] == 1
+    assert behaviour.calls["create_comment"] == 2
+    assert stats["throttled"] == 1
+
+
+def test_issue_with_unique_is_retried_and_found_after_conflict(tracker):
+    url, behaviour = tracker
+    behaviour.errors["create_issue"] = [503]
+    issue, _ = run(url, lambda client: client.create_issue(queue="Q", summary="a", unique="S-1"))
+    again, _ = run(url, lambda client: client.create_issue(queue="Q", summary="a", unique="S-1"))
+    assert issue["key"] == again["key"] == "Q-1"
+    assert behaviour.calls["create_issue"] == 3
+    assert behaviour.calls["find_by_unique"] == 1
+
+
+def test_comment_is_retried_when_connection_refused(tracker):
+    closed = FakeServices(Dataset(issues=1))
+    url = closed.url("tracker")
+    for server in closed.servers.values():
+        server.server_close()
+
+    async def create_comment(client):
+        with pytest.raises(TrackerAPIError, match="ClientConnectorError"):
+            await client.create_comment("Q-1", "text")
+
+    _, stats = run(url, create_comment, max_retries=2)
+    assert stats["requests"] == 3
+    assert stats["failed"] == 1
+
+
+def test_attachment_with_wrong_size_is_spooled(tracker):
+    url, behaviour = tracker
+    (_, size), _ = run(url, lambda client: client.upload_attachment(
+        "Q-1", "file.bin", 10, lambda: iter([b"abc", b"def"])))
+    assert size == 6
+    # Обрезанное тело не дошло до обработчика: Трекер получил только файл из временного файла
+    assert behaviour.calls["create_attachment"] == 1
@@ -0,0 +1,66 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import tracker_comments  # noqa: E402
+from migration_engine import TrackerComment  # noqa: E402
+from migration_journal import MigrationJournal  # noqa: E402
+
+
+class FakeComments:
+    created = []
+    fail_on = None
+
+    def __init__(self, connection, issue):
+        self.issue = issue
+
+    def create(self, text, author):
+        if text == self.fail_on:
+            raise ConnectionError("comment rejected")
+        self.created.append((self.issue, text))
+
+
+class FakeTrackerClient:
+    _connection = None
+
+
+class FakeUserCache:
+    def resolve(self, user):
+        return user
+
+
+def comment_stage(monkeypatch, journal=None, fail_on=None):
+    FakeComments.created = []
+    FakeComments.fail_on = fail_on
+    monkeypatch.setattr(tracker_comments, "IssueComments", FakeComments)
+    return tracker_comments.CommentStage(FakeTrackerClient(), FakeUserCache(), workers=2, journal=journal)
+
+
+def comments(*texts):
+    return [TrackerComment(author="user", body=text) for text in texts]
+
+
+def test_shutdown_without_failures(monkeypatch):
+    stage = comment_stage(monkeypatch)
+    stage.submit("Q-1", comments("a", "b"), "S-1")
+    assert stage.shutdown() == 0
+    assert FakeComments.created == [("Q-1", "a"), ("Q-1", "b")]
+
+
+def test_failed_comment_is_counted_and_not_marked_done(monkeypatch, tmp_path):
+    journal = MigrationJournal(str(tmp_path / "journal.db"))
+    stage = comment_stage(monkeypatch, journal, fail_on="b")
+    stage.submit("Q-1", comments("a", "b", "c"), "S-1")
+    stage.submit("Q-2", comments("d"), "S-2")
+    assert stage.shutdown() == 1
+    assert journal.get_progress("S-1", "comments") == 1
+    assert not journal.is_done("S-1", "comments")
+    assert journal.is_done("S-2", "comments")
+    journal.close()
+
+
+def test_unexpected_error_is_counted(monkeypatch):
+    stage = comment_stage(monkeypatch)
+    stage.submit("Q-1", None, "S-1")
+    assert stage.shutdown() == 1
@@ -0,0 +1,79 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import tracker_links  # noqa: E402
+from migration_engine import raise_for_failures  # noqa: E402
+from migration_journal import MigrationJournal  # noqa: E402
+
+
+class FakeLinks:
+    created = []
+    fail_for = None
+
+    def __init__(self, connection, issue):
+        self.issue = issue
+
+    def create(self, relationship, issue):
+        if issue == self.fail_for:
+            raise ConnectionError("link rejected")
+        self.created.append((self.issue, relationship, issue))
+
+
+class FakeTrackerClient:
+    _connection = None
+
+
+@pytest.fixture
+def links(monkeypatch):
+    FakeLinks.created = []
+    FakeLinks.fail_for = None
+    monkeypatch.setattr(tracker_links, "IssueLinks", FakeLinks)
+    return FakeLinks
+
+
+def test_links_resolved_through_keys_and_journal(links, tmp_path):
+    journal = MigrationJournal(str(tmp_path / "journal.db"))
+    journal.record_issue("S-3", "Q-3")
+    deferred = tracker_links.DeferredLinks(journal)
+    deferred.add("S-1", "Q-1", [("S-2", "relates"), ("S-3", "depends"), ("S-9", "relates")])
+    deferred.add("S-2", "Q-2")
+    deferred.create_all(FakeTrackerClient(), workers=2)
+    assert sorted(links.created) == [("Q-1", "depends", "Q-3"), ("Q-1", "relates", "Q-2")]
+    assert deferred.stats["unresolved"] == 1
+    assert deferred.failures() == 0
+    assert journal.is_done("S-1", "link:S-2:relates")
+    journal.close()
+
+
+def test_created_links_are_skipped_on_rerun(links, tmp_path):
+    journal = MigrationJournal(str(tmp_path / "journal.db"))
+    journal.mark_done("S-1", "link:S-2:relates")
+    deferred = tracker_links.DeferredLinks(journal)
+    deferred.add("S-1", "Q-1", [("S-2", "relates")])
+    deferred.add("S-2", "Q-2")
+    deferred.create_all(FakeTrackerClient())
+    assert links.created == []
+    assert deferred.stats["skipped"] == 1
+    journal.close()
+
+
+def test_failed_link_fails_the_run(links, tmp_path):
+    journal = MigrationJournal(str(tmp_path / "journal.db"))
+    links.fail_for = "Q-2"
+    deferred = tracker_links.DeferredLinks(journal)
+    deferred.add("S-1", "Q-1", [("S-2", "relates")])
+    deferred.add("S-2", "Q-2")
+    deferred.create_all(FakeTrackerClient())
+    assert deferred.failures() == 1
+    assert not journal.is_done("S-1", "link:S-2:relates")
+    with pytest.raises(RuntimeError, match="связей: 1"):
+        raise_for_failures(0, deferred.failures())
+    journal.close()
+
+
+def test_raise_for_failures_without_failures():
+    raise_for_failures(0, 0)
@@ -0,0 +1,125 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import requests
+from yandex_tracker_client import exceptions
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import tracker_throttle  # noqa: E402
+from tracker_throttle import AdaptiveLimiter, ThrottledConnection, backoff_delay, parse_retry_after  # noqa: E402
+
+API = "https://api.tracker.yandex.net/v2"
+
+
+def response(status, headers=None):
+    result = requests.Response()
+    result.status_code = status
+    result.headers.update(headers or {})
+    result._content = b"{}"
+    return result
+
+
+# Сессия, которая по очереди отдает заданные ответы или выбрасывает заданные исключения
+class FakeSession:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.requests = 0
+
+    def request(self, **kwargs):
+        self.requests += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(tracker_throttle.time, "sleep", delays.append)
+    return delays
+
+
+def connection(*results):
+    result = ThrottledConnection(token="token", org_id="1", rate_limit=0, max_retries=3)
+    result.session = FakeSession(*results)
+    return result
+
+
+def post(connection, path, body):
+    return connection._try_request(method="POST", url=f"{API}{path}", data=json.dumps(body))
+
+
+def test_backoff_delay_is_exponential_with_jitter_and_cap():
+    for attempt in range(10):
+        delay = min(8.0, 0.5 * 2 ** attempt)
+        assert delay / 2 <= backoff_delay(attempt, base=0.5, cap=8.0) <= delay
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    retry_at = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < parse_retry_after(retry_at) <= 30
+
+
+def test_limiter_backs_off_on_throttling_and_recovers():
+    limiter = AdaptiveLimiter(rate=8, max_concurrency=8)
+    limiter.on_throttled(retry_after=2)
+    assert limiter.limit == 4
+    assert limiter.bucket.rate == 4
+    assert limiter.bucket.paused_until > time.monotonic() + 1
+    for _ in range(20):
+        limiter.on_success()
+    assert 4 < limiter.limit <= 8
+    assert 4 < limiter.bucket.rate <= 8
+    assert limiter.summary()["throttled"] == 1
+
+
+def test_retry_after_is_honored(sleeps):
+    tracker = connection(response(429, {"Retry-After": "3"}), response(200))
+    assert tracker._try_request(method="GET", url=f"{API}/issues/Q-1").status_code == 200
+    assert sleeps == [3.0]
+    assert tracker.limiter.summary()["retries"] == 1
+
+
+def test_server_errors_are_retried_until_out_of_retries(sleeps):
+    tracker = connection(*[response(503)] * 4)
+    with pytest.raises(exceptions.OutOfRetries):
+        tracker._try_request(method="GET", url=f"{API}/issues/Q-1")
+    assert tracker.session.requests == 4
+    assert tracker.limiter.summary()["failed"] == 1
+
+
+def test_comment_post_is_not_retried_after_server_error(sleeps):
+    tracker = connection(response(503), response(201))
+    with pytest.raises(exceptions.OutOfRetries):
+        post(tracker, "/issues/Q-1/comments", {"text": "a"})
+    assert tracker.session.requests == 1
+
+
+def test_comment_post_is_not_retried_after_read_timeout(sleeps):
+    tracker = connection(requests.ReadTimeout("read timed out"), response(201))
+    with pytest.raises(exceptions.TrackerRequestError):
+        post(tracker, "/issues/Q-1/comments", {"text": "a"})
+    assert tracker.session.requests == 1
+
+
+def test_comment_post_is_retried_when_not_sent(sleeps):
+    tracker = connection(response(429), requests.ConnectTimeout("connect timed out"), response(201))
+    assert post(tracker, "/issues/Q-1/comments", {"text": "a"}).status_code == 201
+    assert tracker.session.requests == 3
+
+
+def test_issue_post_with_unique_is_retried(sleeps):
+    tracker = connection(response(503), requests.ReadTimeout("read timed out"), response(201))
+    assert post(tracker, "/issues/", {"queue": "Q", "unique": "S-1"}).status_code == 201
+    assert tracker.session.requests == 3
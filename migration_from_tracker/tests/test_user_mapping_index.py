@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from migration_engine import TrackerComment, TrackerIssue, precheck_users, report_unmapped_users  # noqa: E402
+from user_mapping_index import UserMapping, UnmappedUsers  # noqa: E402
+
+
+class FakeUserCache:
+    def __init__(self, complete, known=()):
+        self.complete = complete
+        self.known = set(known)
+        self.lookups = 0
+
+    def resolve(self, user, warn=True):
+        self.lookups += 1
+        return user if user in self.known else None
+
+
+def user_mapping(tmp_path):
+    path = tmp_path / "user_mapping.csv"
+    path.write_text("jira_user,tracker_user\nalice,1001\nbob,1002\n")
+    return UserMapping(str(path), ["jira_user"])
+
+
+def test_check_targets_reports_missing(tmp_path):
+    assert user_mapping(tmp_path).check_targets(FakeUserCache(True, ["1001"])) == ["1002"]
+
+
+def test_check_targets_skipped_without_user_list(tmp_path):
+    user_cache = FakeUserCache(False)
+    assert user_mapping(tmp_path).check_targets(user_cache) == []
+    assert user_cache.lookups == 0
+
+
+def test_unmapped_users(tmp_path):
+    unmapped = UnmappedUsers(user_mapping(tmp_path))
+    unmapped.add(["1001", "carol", None])
+    unmapped.add(["dave", "carol"])
+    assert unmapped.report() == ["carol", "dave"]
+
+
+def test_sqlite_iteration_matches_length(tmp_path):
+    path = tmp_path / "user_mapping.db"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE user_mapping (jira_user TEXT, email TEXT, tracker_user TEXT)")
+    connection.executemany("INSERT INTO user_mapping VALUES (?, ?, ?)", [
+        ("alice", "alice@example.com", "1001"), ("bob", None, "1002"), ("carol", "carol@example.com", ""),
+        ("alice", "alice@example.com", "1001")])
+    connection.commit()
+    connection.close()
+    mapping = UserMapping(str(path), ["jira_user", "email"])
+    assert sorted(mapping) == ["alice", "alice@example.com", "bob"]
+    assert len(mapping) == 3
+    mapping.close()
+
+
+def test_report_unmapped_users_before_import(tmp_path):
+    issues = [TrackerIssue(source_key="S-1", queue="Q", summary="", assignee="1001", reporter="carol",
+                           comments=[TrackerComment("dave", "text")])]
+    assert report_unmapped_users(issues, user_mapping(tmp_path)) == ["carol", "dave"]
+    assert precheck_users(issues, user_mapping(tmp_path))
+    assert not precheck_users(iter(issues), user_mapping(tmp_path))